@@ -1,7 +1,49 @@
+import os
 import time
-from wroker import process
+from django.conf import settings
+from wroker import process, process_pipelined
+from sensors import metrics
+from sensors.collector import PollScheduler
+from sensors.jobs import process_jobs
+from sensors.alerts import process_alert_outbox
+
+
+def run_phase(name, fn):
+    # One failing phase (e.g. "database is locked") counts as nothing
+    # handled instead of ending the worker
+    try:
+        return fn()
+    except Exception as e:
+        metrics.inc("iot_errors_total", component=name)
+        print(f"Error in {name}:", e)
+        return 0
+
 
 if __name__ == "__main__":
+    # Stage latencies for this process, e.g. WORKER_METRICS_PORT=9101; set
+    # WORKER_METRICS_HOST to bind beyond loopback on a private network
+    if os.getenv("WORKER_METRICS_PORT"):
+        metrics.serve(int(os.getenv("WORKER_METRICS_PORT")), os.getenv("WORKER_METRICS_HOST", "127.0.0.1"))
+
+    scheduler = PollScheduler(
+        base=settings.COLLECTOR_POLL_BASE,
+        cap=settings.COLLECTOR_POLL_MAX,
+        long_poll=settings.COLLECTOR_LONG_POLL_SECONDS
+    )
+
     while True:
-        process()
-        time.sleep(5)
\ No newline at end of file
+        if settings.COLLECTOR_WORKER_MODE == "pipelined":
+            counts = process_pipelined()
+        else:
+            counts = process()
+
+        # Readings queued by /sensor-data/ in async mode, and alerts the
+        # dispatcher couldn't take or that are due for a retry. Stored
+        # readings that were only re-acked are not progress: while acks
+        # fail the collector keeps returning them, and that must back off.
+        handled = counts["processed"] + (
+            run_phase("inference_jobs", process_jobs) +
+            run_phase("alert_outbox", process_alert_outbox)
+        )
+
+        time.sleep(scheduler.next_delay(handled, counts["poll_seconds"]))
\ No newline at end of file
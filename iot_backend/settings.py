@@ -41,6 +41,137 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
+# Sensor ingestion
+SENSOR_BATCH_MAX_ITEMS = int(os.getenv("SENSOR_BATCH_MAX_ITEMS", 500))
+
+# "sync" runs the CNN inside the request, "async" queues an InferenceJob
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "sync")
+INFERENCE_JOB_MAX_ATTEMPTS = int(os.getenv("INFERENCE_JOB_MAX_ATTEMPTS", 3))
+INFERENCE_JOB_TIMEOUT = int(os.getenv("INFERENCE_JOB_TIMEOUT", 300))
+
+# Collector worker: "sequential" handles one item at a time, "pipelined"
+# overlaps image downloads, inference and DB writes
+COLLECTOR_WORKER_MODE = os.getenv("COLLECTOR_WORKER_MODE", "sequential")
+COLLECTOR_CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY", 4))
+COLLECTOR_INFERENCE_THREADS = int(os.getenv("COLLECTOR_INFERENCE_THREADS", 1))
+
+# Collector service the worker polls (`manage.py fake_collector` runs a local one)
+COLLECTOR_BASE_URL = os.getenv("COLLECTOR_BASE_URL", "https://iot-simulation-jl3f.onrender.com").rstrip("/")
+COLLECTOR_POLL_URL = os.getenv("COLLECTOR_POLL_URL", f"{COLLECTOR_BASE_URL}/get-unprocessed/")
+COLLECTOR_ACK_URL = os.getenv("COLLECTOR_ACK_URL", f"{COLLECTOR_BASE_URL}/update-result/")
+# Batched acks go here; defaults to COLLECTOR_ACK_URL
+COLLECTOR_BATCH_ACK_URL = os.getenv("COLLECTOR_BATCH_ACK_URL", "")
+
+# Collector HTTP client: pooled keep-alive session, per-call timeouts and
+# retries with jittered exponential backoff (0 pool size = concurrency + 2)
+COLLECTOR_POOL_SIZE = int(os.getenv("COLLECTOR_POOL_SIZE", 0))
+COLLECTOR_CONNECT_TIMEOUT = float(os.getenv("COLLECTOR_CONNECT_TIMEOUT", 5))
+COLLECTOR_READ_TIMEOUT = float(os.getenv("COLLECTOR_READ_TIMEOUT", 30))
+COLLECTOR_RETRIES = int(os.getenv("COLLECTOR_RETRIES", 3))
+COLLECTOR_BACKOFF = float(os.getenv("COLLECTOR_BACKOFF", 0.5))
+COLLECTOR_BACKOFF_JITTER = float(os.getenv("COLLECTOR_BACKOFF_JITTER", 0.5))
+COLLECTOR_BACKOFF_MAX = float(os.getenv("COLLECTOR_BACKOFF_MAX", 10))
+
+# Acks to update-result are sent in batches of up to COLLECTOR_ACK_BATCH_SIZE
+# (1 = one call per reading) or after COLLECTOR_ACK_FLUSH_SECONDS; unsent
+# acks survive restarts in COLLECTOR_ACK_JOURNAL
+COLLECTOR_ACK_BATCH_SIZE = int(os.getenv("COLLECTOR_ACK_BATCH_SIZE", 50))
+COLLECTOR_ACK_FLUSH_SECONDS = float(os.getenv("COLLECTOR_ACK_FLUSH_SECONDS", 5))
+COLLECTOR_ACK_JOURNAL = os.getenv("COLLECTOR_ACK_JOURNAL", str(BASE_DIR / "collector_acks.journal"))
+
+# ai_worker polls again at once while there is work and backs off from
+# COLLECTOR_POLL_BASE up to COLLECTOR_POLL_MAX seconds when idle.
+# COLLECTOR_LONG_POLL_SECONDS > 0 sends ?wait=N to collectors that support it
+COLLECTOR_POLL_BASE = float(os.getenv("COLLECTOR_POLL_BASE", 1))
+COLLECTOR_POLL_MAX = float(os.getenv("COLLECTOR_POLL_MAX", 60))
+COLLECTOR_LONG_POLL_SECONDS = int(os.getenv("COLLECTOR_LONG_POLL_SECONDS", 0))
+
+# How long a worker holds a claimed reading without renewing it (it renews
+# before starting each reading, and while the pipeline runs); expired
+# leases of a crashed worker are taken over by the others
+COLLECTOR_LEASE_SECONDS = int(os.getenv("COLLECTOR_LEASE_SECONDS", 600))
+# Readings one worker claims per poll (0 = the whole page), so the workers
+# share a page instead of the first poller taking all of it
+COLLECTOR_CLAIM_LIMIT = int(os.getenv("COLLECTOR_CLAIM_LIMIT", 20))
+
+# A reading that fails is retried after COLLECTOR_RETRY_BASE * 2^(n-1)
+# seconds (capped at COLLECTOR_RETRY_MAX) and dead-lettered after
+# COLLECTOR_MAX_ATTEMPTS attempts
+COLLECTOR_MAX_ATTEMPTS = int(os.getenv("COLLECTOR_MAX_ATTEMPTS", 5))
+COLLECTOR_RETRY_BASE = float(os.getenv("COLLECTOR_RETRY_BASE", 30))
+COLLECTOR_RETRY_MAX = float(os.getenv("COLLECTOR_RETRY_MAX", 3600))
+
+# Alerts go to an outbox table and are sent by ALERT_WORKERS threads in
+# each web process (0 = leave everything to ai_worker). When the queue of
+# ALERT_QUEUE_SIZE is full ALERT_BACKPRESSURE picks "defer" (sent by a
+# later sweep), "block" (wait up to ALERT_BLOCK_SECONDS, then defer) or
+# "drop". Every ALERT_SWEEP_SECONDS the senders pick up deferred rows,
+# due retries and sends a crashed process left behind, so alerts go out
+# without ai_worker running.
+ALERT_EMAIL_ENABLED = os.getenv("ALERT_EMAIL_ENABLED", "0") == "1"
+ALERT_SMS_ENABLED = os.getenv("ALERT_SMS_ENABLED", "0") == "1"
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", 2))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", 1000))
+ALERT_BACKPRESSURE = os.getenv("ALERT_BACKPRESSURE", "defer")
+ALERT_BLOCK_SECONDS = float(os.getenv("ALERT_BLOCK_SECONDS", 1))
+ALERT_SWEEP_SECONDS = float(os.getenv("ALERT_SWEEP_SECONDS", 30))
+# Failed sends are retried after ALERT_RETRY_BASE * 2^(n-1) seconds and
+# given up after ALERT_MAX_ATTEMPTS; a send stuck for ALERT_SEND_TIMEOUT
+# seconds (crashed process) is picked up again
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", 5))
+ALERT_RETRY_BASE = float(os.getenv("ALERT_RETRY_BASE", 60))
+ALERT_SEND_TIMEOUT = int(os.getenv("ALERT_SEND_TIMEOUT", 300))
+# Repeats of the same device/disease/stress within ALERT_SUPPRESS_SECONDS
+# are folded into the first alert (0 = alert every reading). Each user gets
+# at most ALERT_RATE_LIMIT messages per channel per ALERT_RATE_WINDOW
+# seconds (0 = no limit). ALERT_DIGEST_SIZE > 0 batches emails into one
+# digest of that many alerts, or fewer after ALERT_DIGEST_SECONDS.
+ALERT_SUPPRESS_SECONDS = int(os.getenv("ALERT_SUPPRESS_SECONDS", 900))
+ALERT_RATE_LIMIT = int(os.getenv("ALERT_RATE_LIMIT", 10))
+ALERT_RATE_WINDOW = int(os.getenv("ALERT_RATE_WINDOW", 3600))
+ALERT_DIGEST_SIZE = int(os.getenv("ALERT_DIGEST_SIZE", 0))
+ALERT_DIGEST_SECONDS = int(os.getenv("ALERT_DIGEST_SECONDS", 900))
+
+# Micro-batching for the MobileNetV2 model (0 = disabled, batch size 1)
+AI_BATCH_WINDOW_MS = float(os.getenv("AI_BATCH_WINDOW_MS", 0))
+AI_BATCH_MAX_SIZE = int(os.getenv("AI_BATCH_MAX_SIZE", 16))
+
+# MobileNetV2 execution backend: "eager", "torchscript", "onnx" or "int8"
+AI_BACKEND = os.getenv("AI_BACKEND", "eager")
+
+# Decode JPEG leaf photos at reduced scale (~224px) instead of full resolution
+AI_JPEG_DRAFT = os.getenv("AI_JPEG_DRAFT", "1") == "1"
+
+# Prediction cache in front of predict_disease. AI_CACHE_BACKEND is "local"
+# or the alias of a CACHES entry shared by all workers. Set
+# AI_CACHE_PHASH_DISTANCE (e.g. 4) to also match near-identical photos.
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 1024))
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", 3600))
+AI_CACHE_PHASH_DISTANCE = int(os.getenv("AI_CACHE_PHASH_DISTANCE")) if os.getenv("AI_CACHE_PHASH_DISTANCE") else None
+AI_CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "local")
+
+# Unix socket of the per-host inference server; empty = run models in-process
+AI_INFERENCE_SOCKET = os.getenv("AI_INFERENCE_SOCKET", "")
+AI_INFERENCE_AUTHKEY = os.getenv("AI_INFERENCE_AUTHKEY", "")
+
+# Keras fallback for low-confidence predictions: "sequential", "speculative" or "off"
+AI_FALLBACK_STRATEGY = os.getenv("AI_FALLBACK_STRATEGY", "sequential")
+AI_FALLBACK_THRESHOLD = float(os.getenv("AI_FALLBACK_THRESHOLD", 70))
+AI_FALLBACK_BUDGET_MS = float(os.getenv("AI_FALLBACK_BUDGET_MS", 0))
+AI_FALLBACK_WORKERS = int(os.getenv("AI_FALLBACK_WORKERS", 2))
+# Keras runs queued or running at once; more low-confidence predictions
+# keep the PyTorch result instead of queueing behind timed-out runs
+AI_FALLBACK_MAX_PENDING = int(os.getenv("AI_FALLBACK_MAX_PENDING", 4))
+
+# Per-stage latency metrics, scraped from /metrics in Prometheus text format.
+# /metrics is off until METRICS_TOKEN is set; Prometheus then sends it as
+# "Authorization: Bearer <token>" (bearer_token in the scrape config)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Samples kept per summary for the p50/p95/p99 quantiles
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 1000))
+
 # Application definition
 
 INSTALLED_APPS = [
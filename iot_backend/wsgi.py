@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iot_backend.settings')
 
 application = get_wsgi_application()
+
+# Start the alert senders now rather than on the first alert, so alerts
+# left pending by an earlier process are swept and sent after a restart
+from sensors.alerts import get_dispatcher  # noqa: E402
+
+if get_dispatcher() is not None:
+    get_dispatcher().start()
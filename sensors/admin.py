@@ -1,7 +1,10 @@
 from django.contrib import admin
-from .models import UserProfile, Device, SensorReading, CropRecommendation
+from .models import UserProfile, Device, SensorReading, CropRecommendation, InferenceJob, CollectorLease, AlertDelivery
 # Register your models here.
 admin.site.register(UserProfile)
 admin.site.register(Device)
 admin.site.register(SensorReading)
-admin.site.register(CropRecommendation)
\ No newline at end of file
+admin.site.register(CropRecommendation)
+admin.site.register(InferenceJob)
+admin.site.register(CollectorLease)
+admin.site.register(AlertDelivery)
\ No newline at end of file
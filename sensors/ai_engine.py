@@ -1,19 +1,23 @@
+import io
 import os
 import json
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 import numpy as np
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image
 
-# ===== TensorFlow (Backup Model) =====
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.resnet50 import preprocess_input
+from . import metrics
+from .prediction_cache import PredictionCache
 
-# ===== PyTorch (Main Model) =====
-import torch
-import torch.nn as nn
-from torchvision import transforms, models
-from PIL import Image
+# ===== ML STACK =====
+# torch / torchvision / tensorflow are imported on the inference path only,
+# so web workers that never run a model don't pay for them at startup.
+# TensorFlow is only loaded when the Keras fallback actually fires.
 
 # ===== PATHS =====
 MODEL_DIR = os.path.join(settings.BASE_DIR, "model")
@@ -21,9 +25,6 @@ MODEL_DIR = os.path.join(settings.BASE_DIR, "model")
 KERAS_MODEL_PATH = os.path.join(MODEL_DIR, "agrotech_resnet50.h5")
 PTH_MODEL_PATH = os.path.join(MODEL_DIR, "crop_model_v2.pth")
 
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-torch.set_num_threads(1)
-
 # ===== LOAD CLASS MAP =====
 with open(os.path.join(MODEL_DIR, "class_indices.json")) as f:
     class_map = json.load(f)
@@ -95,11 +96,24 @@ CLASS_MAP = {
 
 keras_model = None
 pth_model = None
+device = None
+
+
+def get_device():
+    global device
+    if device is None:
+        import torch
+
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        torch.set_num_threads(1)
+    return device
 
 
 def get_keras_model():
     global keras_model
     if keras_model is None:
+        from tensorflow.keras.models import load_model
+
         keras_model = load_model(KERAS_MODEL_PATH)
     return keras_model
 
@@ -108,6 +122,10 @@ def get_pth_model():
     global pth_model
 
     if pth_model is None:
+        import torch
+        import torch.nn as nn
+        from torchvision import models
+
         # ✅ Use MobileNetV2 instead of ResNet
         model = models.mobilenet_v2(weights=None)
 
@@ -117,8 +135,8 @@ def get_pth_model():
             len(PTH_CLASS_NAMES)
         )
 
-        model.load_state_dict(torch.load(PTH_MODEL_PATH, map_location=DEVICE))
-        model.to(DEVICE)
+        model.load_state_dict(torch.load(PTH_MODEL_PATH, map_location=get_device()))
+        model.to(get_device())
         model.eval()
 
         pth_model = model
@@ -127,50 +145,370 @@ def get_pth_model():
 
 
 # =========================================================
-# 🔹 PREPROCESSING
+# 🔹 EXECUTION BACKENDS
 # =========================================================
 
-pth_transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
+# AI_BACKEND picks how the MobileNetV2 graph is executed:
+#   "eager"       - torchvision module, as trained
+#   "torchscript" - traced + frozen graph cached next to the .pth
+#   "onnx"        - ONNX export run through ONNX Runtime on CPU
+#   "int8"        - post-training quantized model, only if it passed the
+#                   accuracy gate in `manage.py quantize_model`
+PTH_BACKENDS = ("eager", "torchscript", "onnx", "int8")
+
+TORCHSCRIPT_MODEL_PATH = os.path.join(MODEL_DIR, "crop_model_v2.ts")
+ONNX_MODEL_PATH = os.path.join(MODEL_DIR, "crop_model_v2.onnx")
+QUANTIZED_MODEL_PATH = os.path.join(MODEL_DIR, "crop_model_v2_int8.ts")
+QUANTIZED_MANIFEST_PATH = os.path.join(MODEL_DIR, "crop_model_v2_int8.json")
+
+pth_runners = {}
+
+
+def artifact_is_fresh(path):
+    # Re-export whenever the weights are newer than the cached artifact
+    return (
+        os.path.exists(path) and
+        os.path.getmtime(path) >= os.path.getmtime(PTH_MODEL_PATH)
     )
-])
+
+
+def example_input(batch_size=1):
+    import torch
+
+    return torch.randn(batch_size, 3, 224, 224, device=get_device())
+
+
+def write_artifact(path, write):
+    # Write-then-rename so a process loading the model never sees a
+    # half-written file; the temp name is per process as several may export
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def export_torchscript(force=False):
+    import torch
+
+    if force or not artifact_is_fresh(TORCHSCRIPT_MODEL_PATH):
+        with torch.no_grad():
+            traced = torch.jit.trace(get_pth_model(), example_input())
+            traced = torch.jit.freeze(traced)
+        write_artifact(TORCHSCRIPT_MODEL_PATH, traced.save)
+
+    return TORCHSCRIPT_MODEL_PATH
+
+
+def export_onnx(force=False):
+    import torch
+
+    if force or not artifact_is_fresh(ONNX_MODEL_PATH):
+        def export(path):
+            with torch.no_grad():
+                torch.onnx.export(
+                    get_pth_model(),
+                    example_input(),
+                    path,
+                    input_names=["input"],
+                    output_names=["logits"],
+                    dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                    opset_version=17,
+                    dynamo=False
+                )
+
+        write_artifact(ONNX_MODEL_PATH, export)
+
+    return ONNX_MODEL_PATH
+
+
+def set_quantized_engine():
+    import torch
+
+    engines = torch.backends.quantized.supported_engines
+    torch.backends.quantized.engine = "x86" if "x86" in engines else "qnnpack"
+
+
+def quantize_pth_model(mode="static", calibration=()):
+    # Static INT8 quantizes the whole conv stack using activation ranges
+    # observed on `calibration` batches; dynamic only quantizes the Linear
+    # classifier and needs no calibration data
+    import copy
+    import torch
+    import torch.nn as nn
+    from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    set_quantized_engine()
+    model = copy.deepcopy(get_pth_model()).cpu().eval()
+
+    if mode == "dynamic":
+        return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    if mode != "static":
+        raise ValueError(f"Unknown quantization mode {mode!r}")
+
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(model, qconfig_mapping, example_inputs=(example_input().cpu(),))
+
+    with torch.no_grad():
+        for batch in calibration:
+            prepared(batch)
+
+    return convert_fx(prepared)
+
+
+def save_quantized_model(model, manifest):
+    import torch
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input().cpu())
+    write_artifact(QUANTIZED_MODEL_PATH, traced.save)
+
+    def write_manifest(path):
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    write_artifact(QUANTIZED_MANIFEST_PATH, write_manifest)
+
+
+def load_quantized_manifest():
+    if not os.path.exists(QUANTIZED_MANIFEST_PATH):
+        return None
+    with open(QUANTIZED_MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def load_pth_runner(backend):
+    # Every runner maps a (N, 3, 224, 224) tensor to (N, classes) logits
+    import torch
+
+    if backend == "eager":
+        return get_pth_model()
+
+    if backend == "torchscript":
+        model = torch.jit.load(export_torchscript(), map_location=get_device())
+        model.eval()
+        return model
+
+    if backend == "onnx":
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImproperlyConfigured("AI_BACKEND='onnx' requires the onnxruntime package")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(
+            export_onnx(),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+
+        def run(batch):
+            logits = session.run(None, {"input": batch.cpu().numpy()})[0]
+            return torch.from_numpy(logits)
+
+        return run
+
+    if backend == "int8":
+        manifest = load_quantized_manifest()
+        if not manifest or not manifest.get("enabled"):
+            raise ImproperlyConfigured(
+                "AI_BACKEND='int8' but no quantized model passed the accuracy gate; "
+                "run `manage.py quantize_model`"
+            )
+        if not artifact_is_fresh(QUANTIZED_MODEL_PATH):
+            raise ImproperlyConfigured("Quantized model is older than crop_model_v2.pth; re-run `manage.py quantize_model`")
+
+        # Quantized kernels are CPU-only
+        set_quantized_engine()
+        model = torch.jit.load(QUANTIZED_MODEL_PATH, map_location="cpu")
+        model.eval()
+        return lambda batch: model(batch.cpu())
+
+    raise ImproperlyConfigured(f"Unknown AI_BACKEND {backend!r}, expected one of {PTH_BACKENDS}")
+
+
+def get_pth_runner(backend=None):
+    backend = backend or settings.AI_BACKEND
+    if backend not in pth_runners:
+        pth_runners[backend] = load_pth_runner(backend)
+    return pth_runners[backend]
+
 
 # =========================================================
-# 🔹 PREDICTION FUNCTIONS
+# 🔹 PREPROCESSING
 # =========================================================
 
-def predict_disease_pth(img_path):
-    model = get_pth_model()
+pth_transform = None
 
-    image = Image.open(img_path).convert("RGB")
-    image = pth_transform(image).unsqueeze(0).to(DEVICE)
 
-    with torch.no_grad():
-        outputs = model(image)
-        probs = torch.softmax(outputs, dim=1)[0]
+def get_pth_transform():
+    global pth_transform
+    if pth_transform is None:
+        from torchvision import transforms
+
+        pth_transform = transforms.Compose([
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize(
+                mean=[0.485, 0.456, 0.406],
+                std=[0.229, 0.224, 0.225]
+            )
+        ])
+    return pth_transform
+
+
+MODEL_INPUT_SIZE = (224, 224)
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+preprocess_lock = threading.Lock()
+preprocess_totals = Counter()
+
+
+def record_preprocess(stage, started):
+    elapsed = time.perf_counter() - started
+    with preprocess_lock:
+        preprocess_totals[f"{stage}_ms"] += elapsed * 1000
+        preprocess_totals[f"{stage}_count"] += 1
+    metrics.observe("iot_preprocess_seconds", elapsed, stage=stage)
+
+
+def get_preprocess_stats():
+    with preprocess_lock:
+        totals = dict(preprocess_totals)
+
+    stats = {}
+    for stage in ("decode", "pth", "keras"):
+        count = totals.get(f"{stage}_count", 0)
+        stats[stage] = {
+            "count": count,
+            "mean_ms": round(totals.get(f"{stage}_ms", 0.0) / count, 3) if count else 0.0,
+        }
+    return stats
+
+
+def load_image(source, draft=False):
+    # Accepts a path, raw bytes, a file-like object or a PIL image,
+    # so callers never have to round-trip an upload through disk
+    if isinstance(source, Image.Image):
+        return source if source.mode == "RGB" else source.convert("RGB")
+
+    started = time.perf_counter()
 
-    confidence, class_id = torch.max(probs, 0)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)
 
-    raw_label = PTH_CLASS_NAMES[class_id.item()].strip("_")
+    image = Image.open(source)
+
+    # JPEG draft mode lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding,
+    # so a multi-megapixel photo comes out at the smallest size >= 224px
+    # instead of being fully decoded and then thrown away by the resize
+    if draft and image.format == "JPEG":
+        image.draft("RGB", MODEL_INPUT_SIZE)
+
+    image = image.convert("RGB")
+    record_preprocess("decode", started)
+    return image
+
+
+def preprocess_pth(img, out=None):
+    # Equivalent to pth_transform (bilinear resize, ToTensor, Normalize)
+    # done as one float32 array; writes straight into `out` when given
+    started = time.perf_counter()
+
+    arr = np.asarray(load_image(img).resize(MODEL_INPUT_SIZE, Image.BILINEAR), dtype=np.float32)
+    arr *= 1 / 255
+    arr -= IMAGENET_MEAN
+    arr /= IMAGENET_STD
+
+    if out is None:
+        out = np.empty((3,) + MODEL_INPUT_SIZE, dtype=np.float32)
+    out[...] = arr.transpose(2, 0, 1)
+
+    record_preprocess("pth", started)
+    return out
+
+
+def preprocess_keras(img):
+    # Same resize as image.load_img(target_size=...) + img_to_array
+    started = time.perf_counter()
+    arr = np.asarray(load_image(img).resize(MODEL_INPUT_SIZE, Image.NEAREST), dtype=np.float32)
+    record_preprocess("keras", started)
+    return arr
+
+
+# =========================================================
+# 🔹 PREDICTION FUNCTIONS
+# =========================================================
+
+def pth_label(class_id, confidence):
+    raw_label = PTH_CLASS_NAMES[class_id].strip("_")
     crop = raw_label.split("_", 1)[0]
     disease = CLASS_MAP.get(raw_label, "Unknown disease")
 
-    return crop, disease, round(float(confidence.item()) * 100, 2)
+    return crop, disease, round(confidence * 100, 2)
+
+
+def predict_disease_pth_batch(imgs, backend=None):
+    # One forward pass for the whole batch, preprocessed in place
+    batch = np.empty((len(imgs), 3) + MODEL_INPUT_SIZE, dtype=np.float32)
+    for i, img in enumerate(imgs):
+        preprocess_pth(img, out=batch[i])
+
+    return predict_disease_pth_arrays(batch, backend)
 
 
-def predict_disease_keras(img_path):
-    img = image.load_img(img_path, target_size=(224, 224))
-    img = image.img_to_array(img)
+def predict_disease_pth_arrays(batch, backend=None):
+    import torch
+
+    # batch: preprocess_pth output, one (3, H, W) array per image
+    model = get_pth_runner(backend)
+    if not isinstance(batch, np.ndarray):
+        batch = np.stack(batch)
+
+    batch = torch.from_numpy(batch).to(get_device())
+
+    with torch.no_grad(), metrics.timed("iot_inference_seconds", stage="pth_forward"):
+        outputs = model(batch)
+        probs = torch.softmax(outputs, dim=1)
+
+    confidences, class_ids = torch.max(probs, 1)
+
+    return [
+        pth_label(class_id, confidence)
+        for class_id, confidence in zip(class_ids.tolist(), confidences.tolist())
+    ]
+
+
+def predict_disease_pth(img):
+    batcher = get_batcher()
+    if batcher is not None:
+        # Decoded here, so a corrupt image fails only its own request and
+        # the batcher thread just runs the forward pass
+        return batcher.predict(preprocess_pth(img))
+
+    return predict_disease_pth_batch([img])[0]
+
+
+def predict_disease_keras(img):
+    from tensorflow.keras.applications.resnet50 import preprocess_input
+
+    img = preprocess_keras(img)
 
     img = preprocess_input(img)
     img = np.expand_dims(img, axis=0)
 
     model = get_keras_model()
-    preds = model.predict(img)
+    with metrics.timed("iot_inference_seconds", stage="keras_forward"):
+        preds = model.predict(img)
 
     class_id = int(np.argmax(preds))
     confidence = float(np.max(preds))
@@ -182,22 +520,317 @@ def predict_disease_keras(img_path):
     return crop, disease, round(confidence * 100, 2)
 
 
+# =========================================================
+# 🔹 MICRO-BATCHING
+# =========================================================
+
+class BatchingPredictor:
+    # Collects concurrent requests for window_ms (or until max_batch are
+    # waiting) and runs them through predict_batch in one call
+
+    def __init__(self, predict_batch, window_ms=5, max_batch=16, history=1000):
+        self.predict_batch = predict_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = Counter()
+        self.queue_waits = deque(maxlen=history)
+
+    def start(self):
+        # Started lazily so a pre-forking server gets one thread per worker
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="ai-batcher", daemon=True)
+                self.thread.start()
+
+    def submit(self, img):
+        self.start()
+        future = Future()
+        self.queue.put((time.perf_counter(), img, future))
+        return future
+
+    def predict(self, img, timeout=None):
+        return self.submit(img).result(timeout=timeout)
+
+    def collect(self):
+        first = self.queue.get()
+        batch = [first]
+        deadline = first[0] + self.window
+
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            started = time.perf_counter()
+
+            with self.lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[len(batch)] += 1
+                self.queue_waits.extend((started - queued) * 1000 for queued, _, _ in batch)
+
+            try:
+                results = self.predict_batch([img for _, img, _ in batch])
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self.lock:
+            waits = sorted(self.queue_waits)
+            sizes = dict(sorted(self.batch_sizes.items()))
+            batches, items = self.batches, self.items
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3) if waits else 0.0
+
+        return {
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": round(items / batches, 2) if batches else 0.0,
+            "batch_sizes": sizes,
+            "queue_wait_ms": {
+                "mean": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+            "queued": self.queue.qsize(),
+        }
+
+
+batcher = None
+
+
+def get_batcher():
+    # AI_BATCH_WINDOW_MS = 0 keeps the old one-image-per-call behaviour
+    global batcher
+    if batcher is None and settings.AI_BATCH_WINDOW_MS > 0:
+        batcher = BatchingPredictor(
+            predict_disease_pth_arrays,
+            window_ms=settings.AI_BATCH_WINDOW_MS,
+            max_batch=settings.AI_BATCH_MAX_SIZE
+        )
+    return batcher
+
+
 # =========================================================
 # 🔥 MAIN PREDICTION FUNCTION
 # =========================================================
 
-def predict_disease(img_path):
+prediction_cache = None
+
+
+def get_prediction_cache():
+    global prediction_cache
+    if prediction_cache is None and settings.AI_CACHE_ENABLED:
+        prediction_cache = PredictionCache(
+            max_entries=settings.AI_CACHE_MAX_ENTRIES,
+            ttl=settings.AI_CACHE_TTL,
+            phash_distance=settings.AI_CACHE_PHASH_DISTANCE,
+            backend=settings.AI_CACHE_BACKEND
+        )
+    return prediction_cache
+
+
+# Low-confidence PyTorch results fall back to the Keras ResNet50.
+# AI_FALLBACK_STRATEGY:
+#   "sequential"  - run Keras after PyTorch, only when needed (default)
+#   "speculative" - start Keras alongside PyTorch and keep it only if needed
+#   "off"         - never run Keras
+# AI_FALLBACK_BUDGET_MS caps the whole prediction; when Keras hasn't
+# answered in time the PyTorch result is returned. A Keras run that timed
+# out can't be interrupted, so at most AI_FALLBACK_MAX_PENDING runs are
+# queued or running at once; past that the PyTorch result is returned
+# without trying.
+fallback_executor = None
+fallback_slots = None
+fallback_lock = threading.Lock()
+fallback_counters = Counter()
+
+
+def get_fallback_executor():
+    global fallback_executor, fallback_slots
+    with fallback_lock:
+        if fallback_executor is None:
+            fallback_executor = ThreadPoolExecutor(
+                max_workers=settings.AI_FALLBACK_WORKERS,
+                thread_name_prefix="ai-fallback"
+            )
+            fallback_slots = threading.BoundedSemaphore(
+                max(settings.AI_FALLBACK_WORKERS, settings.AI_FALLBACK_MAX_PENDING)
+            )
+    return fallback_executor
+
+
+def submit_fallback(img):
+    # None when the pool is saturated with earlier (maybe abandoned) runs
+    executor = get_fallback_executor()
+    if not fallback_slots.acquire(blocking=False):
+        count_fallback("saturated")
+        return None
+
+    slots = fallback_slots
+    try:
+        future = executor.submit(predict_disease_keras, img)
+    except Exception:
+        slots.release()
+        raise
+    # Also called when the future is cancelled before it ran
+    future.add_done_callback(lambda f: slots.release())
+    return future
+
+
+def count_fallback(name):
+    with fallback_lock:
+        fallback_counters[name] += 1
+
+
+def get_fallback_stats():
+    with fallback_lock:
+        stats = dict(fallback_counters)
+
+    for name in ("predictions", "fired", "changed", "timeouts", "errors", "saturated", "speculative_discarded"):
+        stats.setdefault(name, 0)
+
+    stats["fallback_rate"] = round(stats["fired"] / stats["predictions"], 4) if stats["predictions"] else 0.0
+    stats["change_rate"] = round(stats["changed"] / stats["fired"], 4) if stats["fired"] else 0.0
+    return stats
+
+
+def run_disease_models(img):
+    strategy = settings.AI_FALLBACK_STRATEGY
+    budget = settings.AI_FALLBACK_BUDGET_MS / 1000 if settings.AI_FALLBACK_BUDGET_MS else None
+    started = time.perf_counter()
+    count_fallback("predictions")
+
+    speculative = None
+    if strategy == "speculative":
+        speculative = submit_fallback(img)
+
     # Primary model (PyTorch)
-    crop, disease, confidence = predict_disease_pth(img_path)
+    try:
+        primary = predict_disease_pth(img)
+    except Exception:
+        if speculative is not None:
+            speculative.cancel()
+        raise
+
+    if strategy == "off" or primary[2] >= settings.AI_FALLBACK_THRESHOLD:
+        if speculative is not None:
+            speculative.cancel()
+            count_fallback("speculative_discarded")
+        return primary
 
     # Fallback logic
-    if confidence < 70:
-        try:
-            return predict_disease_keras(img_path)
-        except:
-            pass
+    count_fallback("fired")
+    future = None
+    try:
+        if strategy != "speculative" and budget is None:
+            fallback = predict_disease_keras(img)
+        else:
+            future = speculative or submit_fallback(img)
+            if future is None:
+                return primary
+            remaining = None if budget is None else max(0.0, budget - (time.perf_counter() - started))
+            fallback = future.result(timeout=remaining)
+    except FutureTimeout:
+        # Drops it if it hasn't started yet; a running one finishes unused
+        future.cancel()
+        count_fallback("timeouts")
+        return primary
+    except Exception as e:
+        if future is not None:
+            future.cancel()
+        count_fallback("errors")
+        print("Keras fallback failed:", e)
+        return primary
+
+    if fallback[:2] != primary[:2]:
+        count_fallback("changed")
+
+    return fallback
+
+
+inference_client = None
+
+
+def get_inference_client():
+    global inference_client
+    if inference_client is None:
+        from .inference_server import InferenceClient, get_authkey
+
+        inference_client = InferenceClient(settings.AI_INFERENCE_SOCKET, get_authkey())
+    return inference_client
+
+
+def predict_disease(img):
+    # With AI_INFERENCE_SOCKET set, the host's shared inference server
+    # (`manage.py inference_server`) runs the models instead of this process
+    if settings.AI_INFERENCE_SOCKET:
+        with metrics.timed("iot_inference_seconds", stage="remote"):
+            return get_inference_client().predict(img)
+
+    return predict_disease_local(img)
+
+
+def predict_disease_local(img):
+    # Decode once and share the image between both models
+    raw = img
+    img = load_image(img, draft=settings.AI_JPEG_DRAFT)
+
+    cache = get_prediction_cache()
+    if cache is None:
+        return run_disease_models(img)
+
+    key = cache.make_key(raw, img)
+    result = cache.get(key)
+    if result is None:
+        result = run_disease_models(img)
+        cache.set(key, result)
+    return result
+
+
+def collect_metrics():
+    # Scrape-time view of the counters the engine already keeps
+    fallback = get_fallback_stats()
+    for name in ("predictions", "fired", "changed", "timeouts", "errors", "saturated", "speculative_discarded"):
+        yield "iot_fallback_total", "counter", "Keras fallback outcomes", fallback[name], {"event": name}
 
-    return crop, disease, confidence
+    if prediction_cache is not None:
+        cache = prediction_cache.stats()
+        for name in ("hits", "perceptual_hits", "shared_hits", "misses", "evictions"):
+            yield "iot_prediction_cache_total", "counter", "Prediction cache lookups", cache[name], {"result": name}
+        yield "iot_prediction_cache_entries", "gauge", "Prediction cache size", cache["size"], {}
+
+    if batcher is not None:
+        stats = batcher.stats()
+        yield "iot_batcher_batches_total", "counter", "Micro-batches run", stats["batches"], {}
+        yield "iot_batcher_items_total", "counter", "Images run through the micro-batcher", stats["items"], {}
+        yield "iot_batcher_queued", "gauge", "Images waiting for the micro-batcher", stats["queued"], {}
+
+
+metrics.register_collector(collect_metrics)
 
 
 # =========================================================
@@ -237,6 +870,66 @@ def predict_stress(crop, temp, humidity, moisture, ph):
         return "HIGH"
 
 
+# ===== VECTORIZED STRESS =====
+# crop_data.json compiled into (crops x factors) min/max arrays so whole
+# columns of readings are scored in one NumPy pass
+
+STRESS_FACTORS = ("temperature", "humidity", "soil_moisture", "soil_pH")
+STRESS_WEIGHTS = np.array([2, 1, 2, 1])
+STRESS_LABELS = np.array(["LOW", "MEDIUM", "HIGH", "UNKNOWN"], dtype=object)
+
+stress_table = None
+
+
+def build_stress_table(profiles):
+    crops = sorted(profiles)
+    crop_index = {crop: i for i, crop in enumerate(crops)}
+    mins = np.array([[profiles[c][f]["min"] for f in STRESS_FACTORS] for c in crops], dtype=float)
+    maxs = np.array([[profiles[c][f]["max"] for f in STRESS_FACTORS] for c in crops], dtype=float)
+    return crop_index, mins, maxs
+
+
+def get_stress_table():
+    global stress_table
+    if stress_table is None:
+        stress_table = build_stress_table(CROP_PROFILES)
+    return stress_table
+
+
+def crop_indices(crops, crop_index):
+    # Normalise each distinct crop name once, then broadcast back
+    names, inverse = np.unique(np.asarray(crops, dtype=str), return_inverse=True)
+    lookup = np.array([crop_index.get(normalize_crop(name), -1) for name in names], dtype=int)
+    return lookup[inverse.reshape(-1)]
+
+
+def predict_stress_batch(crops, temp, humidity, moisture, ph):
+    # Returns (labels, breach) where labels matches predict_stress() per row
+    # and breach is a (n, 4) bool mask in STRESS_FACTORS order
+    values = np.column_stack(np.broadcast_arrays(
+        np.asarray(temp, dtype=float),
+        np.asarray(humidity, dtype=float),
+        np.asarray(moisture, dtype=float),
+        np.asarray(ph, dtype=float)
+    )).reshape(-1, len(STRESS_FACTORS))
+
+    crops = np.broadcast_to(np.asarray(crops, dtype=str), (len(values),))
+    crop_index, mins, maxs = get_stress_table()
+    idx = crop_indices(crops, crop_index)
+    known = idx >= 0
+
+    safe_idx = np.where(known, idx, 0)
+    in_range = (mins[safe_idx] <= values) & (values <= maxs[safe_idx])
+    breach = ~in_range & known[:, None]
+
+    # risk <= 1 → LOW, <= 3 → MEDIUM, else HIGH; unknown crops → UNKNOWN
+    risk = breach @ STRESS_WEIGHTS
+    level = (risk > 1).astype(np.intp) + (risk > 3)
+    level[~known] = 3
+
+    return STRESS_LABELS[level], breach
+
+
 # =========================================================
 # 🔹 FINAL DECISION ENGINE
 # =========================================================
@@ -0,0 +1,530 @@
+import atexit
+import queue
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import AlertDelivery
+
+# Alerts are written to the AlertDelivery outbox, one row per channel, and
+# sent by a fixed pool of ALERT_WORKERS threads fed through a bounded
+# queue. Each thread keeps one SMTP connection and one Twilio client.
+# Whatever the pool doesn't send (queue full, process exit, retry due
+# later) stays pending in the outbox. The dispatcher sweeps the outbox for
+# due rows every ALERT_SWEEP_SECONDS, so web processes deliver them on
+# their own; ai_worker, when it runs, drains the same table.
+#
+# Outbound volume follows incidents, not readings: repeats of the same
+# (device, disease, stress) within ALERT_SUPPRESS_SECONDS are coalesced
+# into the first alert, each user gets at most ALERT_RATE_LIMIT messages
+# per channel per ALERT_RATE_WINDOW, and with ALERT_DIGEST_SIZE set emails
+# are held and sent as one digest.
+
+
+# =========================================================
+# 🔹 MESSAGES
+# =========================================================
+
+def send_alert_email(sensor_data, user, connection=None):
+    subject = "🚨 IoT ALERT DETECTED"
+    html_content = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; background-color: #f4f6f8; padding: 20px;">
+    <div style="max-width: 600px; margin: auto; background: #ffffff; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 10px rgba(0,0,0,0.1);">
+    <!-- Header -->
+    <div style="background-color: #e63946; color: white; padding: 15px; text-align: center;">
+    <h2>🚨 IoT Alert Detected</h2>
+    </div> <!-- Content -->
+    <div style="padding: 20px; color: #333;">
+    <p><strong>Crop:</strong> {sensor_data.get('crop')}</p>
+    <hr>
+    <h3 style="color:#457b9d;">🌡️ Sensor Readings</h3>
+    <p><strong>Temperature:</strong> {sensor_data.get('temperature')} °C</p>
+    <p><strong>Humidity:</strong> {sensor_data.get('humidity')} %</p>
+    <p><strong>Soil Moisture:</strong> {sensor_data.get('soil_moisture')}</p>
+    <p><strong>pH Level:</strong> {sensor_data.get('ph')}</p>
+    <hr>
+    <h3 style="color:#1d3557;">🧪 Analysis</h3>
+    <p><strong>Disease:</strong> {sensor_data.get('disease')}</p>
+    <p><strong>Confidence:</strong> {sensor_data.get("confidence"):.2f}</p>
+    <p><strong>Stress Level:</strong> <span style="color:red; font-weight:bold;"> {sensor_data.get("stress")} </span> </p>
+    <p><strong>Decision:</strong> {sensor_data.get("decision")}</p>
+    <hr>
+    <p><strong>🕒 Time:</strong> {sensor_data.get("timestamp")}</p>
+    </div>
+    <!-- Footer --> <div style="background-color: #f1f1f1; text-align: center; padding: 10px; font-size: 12px; color: #777;"> <p>IoT Crop Monitoring System</p> <p>Please take immediate action if required.</p> </div> </div> </body> </html> """
+    text_content = "Alert detected! Please view this email in an HTML-supported client."
+    email = EmailMultiAlternatives(subject, text_content, settings.EMAIL_HOST_USER, [user.email], connection=connection)
+    email.attach_alternative(html_content, "text/html")
+    email.send()
+
+
+def send_alert_digest(alerts, user, connection=None):
+    subject = f"🚨 {len(alerts)} IoT alerts detected"
+    rows = "".join(
+        f"""<tr>
+        <td style="padding: 6px; border-bottom: 1px solid #eee;">{a.get('timestamp')}</td>
+        <td style="padding: 6px; border-bottom: 1px solid #eee;">{a.get('crop')}</td>
+        <td style="padding: 6px; border-bottom: 1px solid #eee;">{a.get('disease')} ({a.get('confidence', 0):.2f})</td>
+        <td style="padding: 6px; border-bottom: 1px solid #eee; color: red; font-weight: bold;">{a.get('stress')}</td>
+        <td style="padding: 6px; border-bottom: 1px solid #eee;">{a.get('occurrences', 1)}</td>
+        </tr>"""
+        for a in alerts
+    )
+    html_content = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; background-color: #f4f6f8; padding: 20px;">
+    <div style="max-width: 700px; margin: auto; background: #ffffff; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 10px rgba(0,0,0,0.1);">
+    <div style="background-color: #e63946; color: white; padding: 15px; text-align: center;">
+    <h2>🚨 {len(alerts)} IoT Alerts Detected</h2>
+    </div>
+    <div style="padding: 20px; color: #333;">
+    <table style="width: 100%; border-collapse: collapse; font-size: 14px;">
+    <tr style="text-align: left; color: #1d3557;"><th>🕒 Time</th><th>Crop</th><th>Disease</th><th>Stress</th><th>Readings</th></tr>
+    {rows}
+    </table>
+    </div>
+    <div style="background-color: #f1f1f1; text-align: center; padding: 10px; font-size: 12px; color: #777;"> <p>IoT Crop Monitoring System</p> <p>Please take immediate action if required.</p> </div> </div> </body> </html> """
+    text_content = "\n".join(
+        f"{a.get('timestamp')} {a.get('crop')} {a.get('disease')} stress:{a.get('stress')} x{a.get('occurrences', 1)}"
+        for a in alerts
+    )
+    email = EmailMultiAlternatives(subject, text_content, settings.EMAIL_HOST_USER, [user.email], connection=connection)
+    email.attach_alternative(html_content, "text/html")
+    email.send()
+
+
+def user_phone(user):
+    profile = getattr(user, "userprofile", None)
+    return getattr(profile, "phone", None)
+
+
+def send_alert_sms(sensor_data, user, client=None):
+    phone = user_phone(user)
+    if not phone:
+        return
+
+    if client is None:
+        from twilio.rest import Client
+
+        client = Client(
+            settings.TWILIO_ACCOUNT_SID,
+            settings.TWILIO_AUTH_TOKEN
+        )
+
+    client.messages.create(
+        body=(
+            f"ALERT! "
+            f"Crop:{sensor_data.get('crop')} "
+            f"Temp:{sensor_data.get('temperature')} "
+            f"Soil:{sensor_data.get('soil_moisture')} "
+            f"pH:{sensor_data.get('ph')}"
+            f"Time:{sensor_data.get('timestamp')}"
+            f"Disease:{sensor_data.get('disease')} "
+            f"Stress:{sensor_data.get('stress')} "
+            f"Confidence:{sensor_data.get('confidence')} "
+            f"Decision:{sensor_data.get('decision')} "
+        ),
+        from_=settings.TWILIO_PHONE_NUMBER,
+        to=phone if phone.startswith("+") else "+91" + phone
+    )
+
+
+# =========================================================
+# 🔹 DELIVERY
+# =========================================================
+
+channel_state = threading.local()
+
+
+def email_connection():
+    # One SMTP connection per sending thread, reopened after an error
+    conn = getattr(channel_state, "email", None)
+    if conn is None:
+        conn = get_connection()
+        conn.open()
+        channel_state.email = conn
+    return conn
+
+
+def sms_client():
+    client = getattr(channel_state, "sms", None)
+    if client is None:
+        from twilio.rest import Client
+
+        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        channel_state.sms = client
+    return client
+
+
+def reset_channel(channel):
+    if channel == AlertDelivery.EMAIL:
+        conn = getattr(channel_state, "email", None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    setattr(channel_state, channel, None)
+
+
+def close_channels():
+    reset_channel(AlertDelivery.EMAIL)
+    reset_channel(AlertDelivery.SMS)
+
+
+def claim_delivery(delivery_id):
+    # Compare-and-swap so the dispatcher and ai_worker never both send it
+    claimed = AlertDelivery.objects.filter(
+        id=delivery_id,
+        status=AlertDelivery.PENDING,
+        next_attempt_at__lte=timezone.now()
+    ).update(status=AlertDelivery.SENDING, updated_at=timezone.now())
+    if not claimed:
+        return None
+    return AlertDelivery.objects.select_related("user__userprofile").get(id=delivery_id)
+
+
+def deliver(delivery):
+    delivery.attempts += 1
+    try:
+        if delivery.channel == AlertDelivery.EMAIL and "alerts" in delivery.payload:
+            send_alert_digest(delivery.payload["alerts"], delivery.user, connection=email_connection())
+        elif delivery.channel == AlertDelivery.EMAIL:
+            send_alert_email(delivery.payload, delivery.user, connection=email_connection())
+        else:
+            send_alert_sms(delivery.payload, delivery.user, client=sms_client())
+    except Exception as e:
+        reset_channel(delivery.channel)
+        delivery.last_error = str(e)
+        if delivery.attempts >= settings.ALERT_MAX_ATTEMPTS:
+            delivery.status = AlertDelivery.FAILED
+            # The alerts in a digest that never went out failed with it
+            AlertDelivery.objects.filter(
+                id__in=delivery.payload.get("merged", []), status=AlertDelivery.MERGED
+            ).update(status=AlertDelivery.FAILED, last_error=f"Digest {delivery.pk} failed")
+        else:
+            delivery.status = AlertDelivery.PENDING
+            delay = settings.ALERT_RETRY_BASE * 2 ** (delivery.attempts - 1)
+            delivery.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        print(f"Alert {delivery.pk} ({delivery.channel}) failed:", e)
+    else:
+        delivery.status = AlertDelivery.SENT
+        delivery.sent_at = timezone.now()
+        delivery.last_error = ""
+
+    delivery.save(update_fields=["attempts", "status", "last_error", "next_attempt_at", "sent_at", "updated_at"])
+    metrics.inc("iot_alerts_total", channel=delivery.channel, status=delivery.status)
+    return delivery.status
+
+
+def deliver_by_id(delivery_id):
+    delivery = claim_delivery(delivery_id)
+    if delivery is not None:
+        deliver(delivery)
+
+
+def due_deliveries(limit=100):
+    # Pending deliveries that are due, plus ones stuck "sending" on a dead process
+    if settings.ALERT_DIGEST_SIZE:
+        flush_digests()
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.ALERT_SEND_TIMEOUT)
+    AlertDelivery.objects.filter(status=AlertDelivery.SENDING, updated_at__lt=stale).update(
+        status=AlertDelivery.PENDING
+    )
+
+    return list(
+        AlertDelivery.objects
+        .filter(status=AlertDelivery.PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("id", flat=True)[:limit]
+    )
+
+
+def process_alert_outbox(limit=100):
+    ids = due_deliveries(limit)
+    sent = 0
+    try:
+        for delivery_id in ids:
+            delivery = claim_delivery(delivery_id)
+            if delivery is not None:
+                deliver(delivery)
+                sent += 1
+    finally:
+        close_channels()
+    return sent
+
+
+# =========================================================
+# 🔹 DISPATCHER
+# =========================================================
+
+STOP = object()
+
+
+class AlertDispatcher:
+    # Bounded queue of outbox ids in front of a fixed pool of sender threads.
+    # When the queue is full, ALERT_BACKPRESSURE decides:
+    #   "defer" - leave the row pending for the next sweep (default, nothing lost)
+    #   "block" - wait up to ALERT_BLOCK_SECONDS for room, then defer
+    #   "drop"  - mark the row dropped
+    # A sweeper thread queues due outbox rows (deferred, retries, sends of
+    # a crashed process) every sweep_seconds.
+
+    def __init__(self, workers=2, queue_size=1000, policy="defer", block_seconds=1.0, sweep_seconds=30.0):
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.policy = policy
+        self.block_seconds = block_seconds
+        self.sweep_seconds = sweep_seconds
+        self.lock = threading.Lock()
+        self.threads = []
+        self.sweeper = None
+        self.stopping = threading.Event()
+
+    def start(self):
+        with self.lock:
+            self.threads = [t for t in self.threads if t.is_alive()]
+            while len(self.threads) < self.workers:
+                t = threading.Thread(target=self.run, name=f"alert-sender-{len(self.threads)}", daemon=True)
+                t.start()
+                self.threads.append(t)
+
+            if self.workers and self.sweep_seconds and (self.sweeper is None or not self.sweeper.is_alive()):
+                self.stopping.clear()
+                self.sweeper = threading.Thread(target=self.run_sweeper, name="alert-sweeper", daemon=True)
+                self.sweeper.start()
+
+    def submit(self, delivery_id):
+        self.start()
+        try:
+            if self.policy == "block":
+                self.queue.put(delivery_id, timeout=self.block_seconds)
+            else:
+                self.queue.put_nowait(delivery_id)
+            return True
+        except queue.Full:
+            metrics.inc("iot_alerts_backpressure_total", policy=self.policy)
+            if self.policy == "drop":
+                AlertDelivery.objects.filter(id=delivery_id, status=AlertDelivery.PENDING).update(
+                    status=AlertDelivery.DROPPED, last_error="Alert queue full"
+                )
+            return False
+
+    def run(self):
+        try:
+            while True:
+                delivery_id = self.queue.get()
+                if delivery_id is STOP:
+                    return
+                try:
+                    deliver_by_id(delivery_id)
+                except Exception as e:
+                    print("Alert dispatcher error:", e)
+                finally:
+                    close_old_connections()
+        finally:
+            close_channels()
+            close_old_connections()
+
+    def sweep(self):
+        # Rows already queued may be queued twice; claim_delivery sends
+        # each one once. Whatever doesn't fit waits for the next sweep.
+        queued = 0
+        for delivery_id in due_deliveries(limit=self.queue.maxsize or 100):
+            try:
+                self.queue.put_nowait(delivery_id)
+            except queue.Full:
+                break
+            queued += 1
+        return queued
+
+    def run_sweeper(self):
+        try:
+            while not self.stopping.wait(self.sweep_seconds):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print("Alert sweep error:", e)
+                finally:
+                    close_old_connections()
+        finally:
+            close_old_connections()
+
+    def stop(self, timeout=5.0):
+        # Let queued alerts go out on shutdown; the rest stay in the outbox
+        self.stopping.set()
+        if self.sweeper is not None:
+            self.sweeper.join(timeout)
+            self.sweeper = None
+        with self.lock:
+            threads, self.threads = self.threads, []
+        for _ in threads:
+            try:
+                self.queue.put(STOP, timeout=timeout)
+            except queue.Full:
+                break
+        for t in threads:
+            t.join(timeout)
+
+
+dispatcher = None
+
+
+def get_dispatcher():
+    global dispatcher
+    if dispatcher is None and settings.ALERT_WORKERS > 0:
+        dispatcher = AlertDispatcher(
+            workers=settings.ALERT_WORKERS,
+            queue_size=settings.ALERT_QUEUE_SIZE,
+            policy=settings.ALERT_BACKPRESSURE,
+            block_seconds=settings.ALERT_BLOCK_SECONDS,
+            sweep_seconds=settings.ALERT_SWEEP_SECONDS
+        )
+        atexit.register(dispatcher.stop)
+    return dispatcher
+
+
+def collect_metrics():
+    if dispatcher is not None:
+        yield "iot_alert_queue_depth", "gauge", "Alerts waiting for a sender thread", dispatcher.queue.qsize(), {}
+
+
+metrics.register_collector(collect_metrics)
+
+
+# =========================================================
+# 🔹 COALESCING
+# =========================================================
+
+def incident_key(sensor_data, reading=None):
+    device = reading.device_id if reading is not None else ""
+    return f"{device}:{sensor_data.get('disease')}:{sensor_data.get('stress')}"
+
+
+def coalesce(user, channels, key, now):
+    # Channels that already alerted this incident inside the window just
+    # count one more occurrence; returns the channels still to alert.
+    # Alerts that never went out (failed, or dropped by the rate limit or a
+    # full queue) don't silence the repeats.
+    if not settings.ALERT_SUPPRESS_SECONDS:
+        return channels
+
+    recent = AlertDelivery.objects.filter(
+        user=user,
+        channel__in=channels,
+        incident_key=key,
+        created_at__gte=now - timedelta(seconds=settings.ALERT_SUPPRESS_SECONDS)
+    ).exclude(status__in=[AlertDelivery.FAILED, AlertDelivery.DROPPED])
+
+    covered = set(recent.values_list("channel", flat=True))
+    if covered:
+        recent.update(occurrences=F("occurrences") + 1, last_seen_at=now)
+        for channel in covered:
+            metrics.inc("iot_alerts_total", channel=channel, status="coalesced")
+    return [channel for channel in channels if channel not in covered]
+
+
+def rate_limited(user_id, channel, now):
+    if not settings.ALERT_RATE_LIMIT:
+        return False
+    sent = AlertDelivery.objects.filter(
+        user_id=user_id,
+        channel=channel,
+        status__in=[AlertDelivery.PENDING, AlertDelivery.SENDING, AlertDelivery.SENT],
+        created_at__gte=now - timedelta(seconds=settings.ALERT_RATE_WINDOW)
+    ).count()
+    return sent >= settings.ALERT_RATE_LIMIT
+
+
+def flush_digests(user=None):
+    # Merge held emails into one digest per user once ALERT_DIGEST_SIZE
+    # are waiting or the oldest has waited ALERT_DIGEST_SECONDS. A digest
+    # is one message for the rate limit; over it, emails stay held.
+    now = timezone.now()
+    held = AlertDelivery.objects.filter(status=AlertDelivery.HELD, channel=AlertDelivery.EMAIL)
+    if user is not None:
+        held = held.filter(user=user)
+
+    ids = []
+    for user_id in set(held.values_list("user_id", flat=True)):
+        rows = list(held.filter(user_id=user_id).order_by("created_at"))
+        waited = now - rows[0].created_at >= timedelta(seconds=settings.ALERT_DIGEST_SECONDS)
+        if len(rows) < settings.ALERT_DIGEST_SIZE and not waited:
+            continue
+        if rate_limited(user_id, AlertDelivery.EMAIL, now):
+            continue
+
+        with transaction.atomic():
+            merged = AlertDelivery.objects.filter(
+                id__in=[row.id for row in rows], status=AlertDelivery.HELD
+            ).update(status=AlertDelivery.MERGED)
+            if merged != len(rows):
+                # Another process is flushing the same user
+                transaction.set_rollback(True)
+                continue
+            digest = AlertDelivery.objects.create(
+                user_id=user_id,
+                channel=AlertDelivery.EMAIL,
+                incident_key="digest",
+                payload={
+                    "alerts": [dict(row.payload, occurrences=row.occurrences) for row in rows],
+                    "merged": [row.id for row in rows],
+                }
+            )
+        ids.append(digest.id)
+    return ids
+
+
+def dispatch_alert(sensor_data, user, reading=None):
+    # One outbox row per enabled channel the user can receive, unless the
+    # incident was alerted recently
+    channels = []
+    if settings.ALERT_EMAIL_ENABLED and user.email:
+        channels.append(AlertDelivery.EMAIL)
+    if settings.ALERT_SMS_ENABLED and user_phone(user):
+        channels.append(AlertDelivery.SMS)
+    if not channels:
+        return []
+
+    now = timezone.now()
+    key = incident_key(sensor_data, reading)
+    rows = []
+    for channel in coalesce(user, channels, key, now):
+        if channel == AlertDelivery.EMAIL and settings.ALERT_DIGEST_SIZE:
+            status = AlertDelivery.HELD
+        elif rate_limited(user.id, channel, now):
+            status = AlertDelivery.DROPPED
+        else:
+            status = AlertDelivery.PENDING
+        if status != AlertDelivery.PENDING:
+            metrics.inc("iot_alerts_total", channel=channel, status=status)
+
+        rows.append(AlertDelivery(
+            user=user,
+            reading=reading,
+            channel=channel,
+            payload=sensor_data,
+            status=status,
+            incident_key=key,
+            last_error="Rate limited" if status == AlertDelivery.DROPPED else ""
+        ))
+
+    deliveries = AlertDelivery.objects.bulk_create(rows) if rows else []
+    ids = [d.pk for d in deliveries if d.status == AlertDelivery.PENDING]
+    if any(d.status == AlertDelivery.HELD for d in deliveries):
+        ids += flush_digests(user)
+
+    sender = get_dispatcher()
+    if sender is not None and ids:
+        # Only hand rows to the senders once they are visible to them
+        transaction.on_commit(lambda: [sender.submit(delivery_id) for delivery_id in ids])
+    return ids
@@ -0,0 +1,268 @@
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+# HTTP client for the external collector service. One pooled session with
+# keep-alive is shared by every worker thread; each call has a timeout and
+# transient failures are retried with jittered exponential backoff.
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# How long a confirmed ack is remembered, so a page polled before it
+# went out doesn't get it sent again
+ACKED_MEMORY_SECONDS = 60
+# Answers from a collector that has no batch endpoint
+BATCH_UNSUPPORTED = (404, 405)
+# ...and from one that refused this batch (or doesn't take lists on the
+# single-ack URL); batching is tried again after BATCH_RETRY_SECONDS
+BATCH_REJECTED = (400, 415, 422)
+BATCH_RETRY_SECONDS = 600
+
+
+class CountingRetry(Retry):
+    def increment(self, method=None, url=None, *args, **kwargs):
+        metrics.inc("iot_collector_retries_total", method=method or "")
+        return super().increment(method, url, *args, **kwargs)
+
+
+class CollectorClient:
+
+    def __init__(self, poll_url, ack_url, batch_ack_url=None, pool_size=None, timeout=None, retries=None,
+                 backoff=None, jitter=None):
+        self.poll_url = poll_url
+        self.ack_url = ack_url
+        self.batch_ack_url = batch_ack_url or ack_url
+        self.batch_supported = True
+        self.batch_retry_at = 0
+        self.timeout = timeout or (settings.COLLECTOR_CONNECT_TIMEOUT, settings.COLLECTOR_READ_TIMEOUT)
+
+        # Downloads run COLLECTOR_CONCURRENCY at a time, plus the poll and acks
+        pool_size = pool_size or settings.COLLECTOR_POOL_SIZE or settings.COLLECTOR_CONCURRENCY + 2
+
+        retry = CountingRetry(
+            total=settings.COLLECTOR_RETRIES if retries is None else retries,
+            backoff_factor=settings.COLLECTOR_BACKOFF if backoff is None else backoff,
+            backoff_jitter=settings.COLLECTOR_BACKOFF_JITTER if jitter is None else jitter,
+            backoff_max=settings.COLLECTOR_BACKOFF_MAX,
+            status_forcelist=RETRY_STATUSES,
+            # Acks only mark a reading as processed, so repeating one is safe
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, **kwargs):
+        response = self.session.get(url, timeout=kwargs.pop("timeout", self.timeout), **kwargs)
+        response.raise_for_status()
+        return response
+
+    def poll(self, wait=0):
+        # `wait` asks a long-polling collector to hold the request until
+        # readings arrive; collectors that don't know it just ignore it
+        if wait:
+            connect, read = self.timeout
+            body = self.get(self.poll_url, params={"wait": wait}, timeout=(connect, read + wait)).json()
+        else:
+            body = self.get(self.poll_url).json()
+
+        data = body.get("data", [])
+        metrics.inc("iot_collector_polls_total", result="work" if data else "empty")
+        # Collectors that report their queue length give the true backlog
+        metrics.set_gauge("iot_collector_backlog", body.get("remaining", len(data)))
+        return data
+
+    def download(self, url):
+        return self.get(url).content
+
+    def ack(self, reading_id):
+        response = self.session.post(self.ack_url, json={"reading_id": reading_id}, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def ack_many(self, acks):
+        # acks: [(reading_id, result or None)]. One call when the collector
+        # accepts lists; otherwise fall back to single acks, from now on
+        # when there is no batch endpoint, for a while when it refused one
+        if self.batch_supported and len(acks) > 1 and time.monotonic() >= self.batch_retry_at:
+            response = self.session.post(self.batch_ack_url, json={
+                "reading_ids": [reading_id for reading_id, _ in acks],
+                "results": [dict(result or {}, reading_id=reading_id) for reading_id, result in acks],
+            }, timeout=self.timeout)
+            if response.status_code in BATCH_UNSUPPORTED:
+                print("Collector has no batch ack endpoint, acking one by one")
+                self.batch_supported = False
+            elif response.status_code in BATCH_REJECTED:
+                print(f"Collector refused a batch ack ({response.status_code}), acking one by one")
+                self.batch_retry_at = time.monotonic() + BATCH_RETRY_SECONDS
+            else:
+                response.raise_for_status()
+                return
+
+        for reading_id, _ in acks:
+            self.ack(reading_id)
+
+    def close(self):
+        self.session.close()
+
+
+# =========================================================
+# 🔹 POLL SCHEDULING
+# =========================================================
+
+class PollScheduler:
+    # Poll again straight away while there is work; when idle back off
+    # exponentially (with jitter) from `base` up to `cap` seconds. An empty
+    # poll that took at least half of `long_poll` already waited on the
+    # collector's side, so the next one goes out immediately.
+
+    def __init__(self, base=1.0, cap=60.0, long_poll=0):
+        self.base = base
+        self.cap = cap
+        self.long_poll = long_poll
+        self.idle = 0
+
+    def next_delay(self, handled, poll_seconds=0.0):
+        if handled:
+            self.idle = 0
+            delay = 0.0
+        elif self.long_poll and poll_seconds >= self.long_poll / 2:
+            self.idle = 0
+            delay = 0.0
+        else:
+            self.idle += 1
+            delay = min(self.cap, self.base * 2 ** (self.idle - 1))
+            delay *= random.uniform(0.8, 1.0)
+
+        metrics.set_gauge("iot_worker_poll_delay_seconds", round(delay, 3))
+        return delay
+
+
+# =========================================================
+# 🔹 BATCHED ACKS
+# =========================================================
+
+class AckBuffer:
+    # Buffers acks and flushes them as one call once max_items are waiting
+    # or the oldest has waited max_wait seconds. Every ack is appended to a
+    # journal (fsync'd) before it is buffered and dropped from it only after
+    # the collector confirmed it, so a crash never loses an ack.
+
+    def __init__(self, client, journal_path, max_items=50, max_wait=5.0):
+        self.client = client
+        self.journal_path = journal_path
+        self.max_items = max_items
+        self.max_wait = max_wait
+
+        self.lock = threading.RLock()
+        self.pending = {}
+        self.oldest = None
+        self.acked = {}
+        self.recover()
+
+    def recover(self):
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line from a crash mid-write
+                    continue
+                self.pending[entry["reading_id"]] = entry.get("result")
+
+        if self.pending:
+            self.oldest = time.monotonic()
+            print(f"Recovered {len(self.pending)} unsent acks from {self.journal_path}")
+
+    def write_journal(self):
+        tmp = f"{self.journal_path}.tmp"
+        with open(tmp, "w") as f:
+            for reading_id, result in self.pending.items():
+                f.write(json.dumps({"reading_id": reading_id, "result": result}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_path)
+
+    def add(self, reading_id, result=None):
+        with self.lock:
+            if reading_id in self.pending and result is None:
+                return
+
+            if self.journal_path:
+                with open(self.journal_path, "a") as f:
+                    f.write(json.dumps({"reading_id": reading_id, "result": result}) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            self.pending[reading_id] = result
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+
+            if len(self.pending) >= self.max_items or self.due():
+                self.flush()
+
+    def due(self):
+        return self.oldest is not None and time.monotonic() - self.oldest >= self.max_wait
+
+    def is_pending(self, reading_id):
+        with self.lock:
+            return reading_id in self.pending
+
+    def is_acked(self, reading_id):
+        # Buffered, or confirmed by the collector moments ago
+        with self.lock:
+            sent = self.acked.get(reading_id)
+            return reading_id in self.pending or (
+                sent is not None and time.monotonic() - sent < ACKED_MEMORY_SECONDS
+            )
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return 0
+
+            acks = list(self.pending.items())
+            try:
+                with metrics.timed("iot_worker_stage_seconds", stage="ack"):
+                    self.client.ack_many(acks)
+            except requests.RequestException as e:
+                # Kept in the journal; retried after another max_wait
+                metrics.inc("iot_errors_total", component="collector_ack")
+                print("Ack flush failed:", e)
+                self.oldest = time.monotonic()
+                return 0
+
+            self.pending.clear()
+            self.oldest = None
+            now = time.monotonic()
+            self.acked = {
+                reading_id: sent for reading_id, sent in self.acked.items()
+                if now - sent < ACKED_MEMORY_SECONDS
+            }
+            self.acked.update((reading_id, now) for reading_id, _ in acks)
+            if self.journal_path:
+                self.write_journal()
+
+            metrics.inc("iot_collector_acks_total", len(acks))
+            return len(acks)
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.due():
+                return self.flush()
+        return 0
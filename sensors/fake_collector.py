@@ -0,0 +1,162 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from .synthetic import synthetic_leaf, synthetic_readings
+
+# Local stand-in for the collector service: serves N synthetic readings
+# with generated leaf photos, adds latency and random 503s, and records
+# every download and ack so a load test can spot duplicate processing.
+
+
+class FakeCollector:
+
+    def __init__(self, readings=100, latency_ms=0, error_rate=0.0, page_size=100, batch_acks=True,
+                 device_id="loadtest-device", images=16, seed=0):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.batch_acks = batch_acks
+        self.random = random.Random(seed)
+
+        rng = np.random.default_rng(seed)
+        self.images = [synthetic_leaf(rng) for _ in range(max(1, images))]
+        values = synthetic_readings(rng, readings)
+        self.readings = [
+            {
+                "reading_id": f"load-{i}",
+                "device_id": device_id,
+                "temperature": round(float(values["temperature"][i]), 2),
+                "humidity": round(float(values["humidity"][i]), 2),
+                "soil_moisture": int(values["soil_moisture"][i]),
+                "ph": round(float(values["ph"][i]), 2),
+                "timestamp": "2025-01-01T10:00:00Z",
+            }
+            for i in range(readings)
+        ]
+
+        self.lock = threading.Lock()
+        self.acks = Counter()
+        self.downloads = Counter()
+        self.counters = Counter()
+        self.server = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def unprocessed(self):
+        with self.lock:
+            pending = [r for r in self.readings if r["reading_id"] not in self.acks]
+        return [
+            dict(r, image_url=f"{self.base_url}/images/{r['reading_id']}.jpg")
+            for r in pending[:self.page_size]
+        ]
+
+    def done(self):
+        with self.lock:
+            return all(r["reading_id"] in self.acks for r in self.readings)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "readings": len(self.readings),
+                "acked": len(self.acks),
+                "duplicate_acks": sum(n - 1 for n in self.acks.values() if n > 1),
+                "duplicate_downloads": sum(n - 1 for n in self.downloads.values() if n > 1),
+                **self.counters,
+            }
+
+    # =========================================================
+    # 🔹 HTTP
+    # =========================================================
+
+    def handler(self):
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def reply(self, status, body=b"{}", content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def injected_failure(self, name):
+                if collector.latency:
+                    time.sleep(collector.latency)
+                with collector.lock:
+                    collector.counters[f"{name}_requests"] += 1
+                    failed = collector.random.random() < collector.error_rate
+                    if failed:
+                        collector.counters[f"{name}_errors"] += 1
+                if failed:
+                    self.reply(503)
+                return failed
+
+            def do_GET(self):
+                url = urlparse(self.path)
+
+                if url.path == "/get-unprocessed/":
+                    if self.injected_failure("poll"):
+                        return
+                    data = collector.unprocessed()
+                    wait = float(parse_qs(url.query).get("wait", [0])[0])
+                    deadline = time.monotonic() + wait
+                    while not data and time.monotonic() < deadline and not collector.done():
+                        time.sleep(0.05)
+                        data = collector.unprocessed()
+                    return self.reply(200, json.dumps({"data": data}).encode())
+
+                if url.path.startswith("/images/"):
+                    if self.injected_failure("download"):
+                        return
+                    reading_id = url.path.rsplit("/", 1)[-1].removesuffix(".jpg")
+                    index = int(reading_id.rsplit("-", 1)[-1]) if reading_id.startswith("load-") else 0
+                    with collector.lock:
+                        collector.downloads[reading_id] += 1
+                    return self.reply(200, collector.images[index % len(collector.images)], "image/jpeg")
+
+                if url.path == "/stats/":
+                    return self.reply(200, json.dumps(collector.stats()).encode())
+
+                self.reply(404)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if urlparse(self.path).path != "/update-result/":
+                    return self.reply(404)
+
+                if "reading_ids" in body and not collector.batch_acks:
+                    return self.reply(404)
+                if self.injected_failure("ack"):
+                    return
+
+                with collector.lock:
+                    for reading_id in body.get("reading_ids") or [body.get("reading_id")]:
+                        collector.acks[reading_id] += 1
+                self.reply(200)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        threading.Thread(target=self.server.serve_forever, name="fake-collector", daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,181 @@
+import io
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+# One process per host holds MobileNetV2 and the ResNet50 fallback; every
+# gunicorn worker and collector worker sends it images over a Unix socket
+# instead of loading its own copy of the models.
+
+
+def get_authkey():
+    return (settings.AI_INFERENCE_AUTHKEY or settings.SECRET_KEY).encode()
+
+
+def encode_image(img):
+    # Send the compressed bytes when we have them; decoded images are
+    # re-encoded losslessly so the server sees exactly the same pixels
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        return bytes(img)
+
+    if isinstance(img, (str, os.PathLike)):
+        with open(img, "rb") as f:
+            return f.read()
+
+    if hasattr(img, "read"):
+        if hasattr(img, "seek"):
+            img.seek(0)
+        return img.read()
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+# =========================================================
+# 🔹 CLIENT
+# =========================================================
+
+class InferenceClient:
+    # One persistent connection per thread, reopened after a failure
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self.local.conn = conn
+        return conn
+
+    def call(self, *message):
+        for attempt in range(2):
+            try:
+                conn = self.connection()
+                conn.send(message)
+                status, payload = conn.recv()
+                break
+            except (OSError, EOFError):
+                self.close()
+                if attempt:
+                    raise
+
+        if status == "error":
+            raise RuntimeError(f"Inference server error: {payload}")
+        return payload
+
+    def predict(self, img):
+        return tuple(self.call("predict", encode_image(img)))
+
+    def stats(self):
+        return self.call("stats")
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+            self.local.conn = None
+
+
+# =========================================================
+# 🔹 SERVER
+# =========================================================
+
+def pin_threads(threads, cores=None):
+    import torch
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    threads = threads or len(cores or []) or os.cpu_count() or 1
+    torch.set_num_threads(threads)
+    return threads
+
+
+def handle_connection(conn, predict, stats):
+    with conn:
+        while True:
+            try:
+                command, *args = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                if command == "predict":
+                    conn.send(("ok", predict(args[0])))
+                elif command == "stats":
+                    conn.send(("ok", stats()))
+                else:
+                    conn.send(("error", f"unknown command {command!r}"))
+            except (EOFError, OSError):
+                return
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+
+def serve(address, threads=None, cores=None, preload=True, ready=None):
+    from . import ai_engine
+
+    if os.path.exists(address):
+        os.remove(address)
+
+    # get_device() defaults torch to one thread; pin afterwards
+    ai_engine.get_device()
+    threads = pin_threads(threads, cores)
+
+    # Load both models before accepting connections
+    if preload:
+        ai_engine.get_pth_model()
+        try:
+            ai_engine.get_keras_model()
+        except Exception as e:
+            # The fallback is optional; predict_disease carries on without it
+            print("Inference server: Keras fallback unavailable:", e)
+
+    served = {"requests": 0}
+    lock = threading.Lock()
+
+    def predict(data):
+        with lock:
+            served["requests"] += 1
+        return ai_engine.predict_disease_local(data)
+
+    def stats():
+        with lock:
+            data = {"pid": os.getpid(), "threads": threads, **served}
+        batcher = ai_engine.get_batcher()
+        if batcher is not None:
+            data["batching"] = batcher.stats()
+        cache = ai_engine.get_prediction_cache()
+        if cache is not None:
+            data["cache"] = cache.stats()
+        return data
+
+    with Listener(address, family="AF_UNIX", authkey=get_authkey()) as listener:
+        os.chmod(address, 0o660)
+        print(f"Inference server listening on {address} ({threads} threads, pid {os.getpid()})")
+        if ready is not None:
+            ready.set()
+
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, AuthenticationError) as e:
+                # Bad authkey or a client that hung up mid-handshake
+                print("Inference server: rejected connection:", e)
+                continue
+
+            threading.Thread(
+                target=handle_connection,
+                args=(conn, predict, stats),
+                daemon=True
+            ).start()
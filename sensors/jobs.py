@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import metrics
+from .models import InferenceJob
+from .views import analyse_reading, start_alert
+
+
+# =========================================================
+# 🔹 CLAIMING
+# =========================================================
+
+def claim_job(exclude=()):
+    # Pending jobs first, then jobs stuck "running" on a dead worker
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.INFERENCE_JOB_TIMEOUT)
+
+    # A job that keeps crashing or hanging its worker is given up on
+    # instead of taking a consumer down with it on every retry
+    given_up = InferenceJob.objects.filter(
+        status=InferenceJob.RUNNING,
+        updated_at__lt=stale,
+        attempts__gte=settings.INFERENCE_JOB_MAX_ATTEMPTS
+    ).update(status=InferenceJob.FAILED, error="Worker died while processing", updated_at=now)
+    if given_up:
+        metrics.inc("iot_inference_jobs_total", given_up, status=InferenceJob.FAILED)
+
+    candidates = (
+        InferenceJob.objects
+        .filter(
+            Q(status=InferenceJob.PENDING) |
+            Q(status=InferenceJob.RUNNING, updated_at__lt=stale,
+              attempts__lt=settings.INFERENCE_JOB_MAX_ATTEMPTS)
+        )
+        .exclude(id__in=exclude)
+        .order_by("created_at")
+        .values_list("id", "status", "updated_at")[:10]
+    )
+
+    for job_id, status, updated_at in candidates:
+        # Compare-and-swap so two consumers never take the same job
+        claimed = InferenceJob.objects.filter(
+            id=job_id, status=status, updated_at=updated_at
+        ).update(
+            status=InferenceJob.RUNNING,
+            attempts=F("attempts") + 1,
+            updated_at=timezone.now()
+        )
+        if claimed:
+            return InferenceJob.objects.select_related("reading__device__owner").get(id=job_id)
+
+    return None
+
+
+# =========================================================
+# 🔹 RUNNING
+# =========================================================
+
+def run_job(job):
+    reading = job.reading
+
+    try:
+        if not reading.image:
+            raise ValueError("Reading has no leaf image")
+
+        with reading.image.open("rb") as f:
+            content = f.read()
+
+        analysis = analyse_reading(
+            content,
+            reading.temperature,
+            reading.humidity,
+            reading.soil_moisture,
+            reading.ph
+        )
+    except Exception as e:
+        print("Inference job failed:", job.id, e)
+        job.error = str(e)
+        if job.attempts >= settings.INFERENCE_JOB_MAX_ATTEMPTS:
+            job.status = InferenceJob.FAILED
+        else:
+            job.status = InferenceJob.PENDING
+        job.save(update_fields=["status", "error", "updated_at"])
+        metrics.inc("iot_inference_jobs_total", status=job.status)
+        return False
+
+    with transaction.atomic():
+        reading.crop = analysis["crop"]
+        reading.disease = analysis["disease"]
+        reading.stress_level = analysis["stress"]
+        reading.decision = analysis["decision"]
+        reading.alert = analysis["alert"]
+        reading.save(update_fields=["crop", "disease", "stress_level", "decision", "alert"])
+
+        job.status = InferenceJob.DONE
+        job.confidence = analysis["confidence"]
+        job.error = ""
+        job.save(update_fields=["status", "confidence", "error", "updated_at"])
+
+    metrics.inc("iot_inference_jobs_total", status=InferenceJob.DONE)
+    metrics.inc("iot_readings_total", source="async", alert=str(analysis["alert"]).lower())
+
+    if analysis["alert"] and reading.device:
+        start_alert(analysis, reading)
+
+    return True
+
+
+def process_jobs(limit=50):
+    # A job that fails is requeued, but not retried within the same pass
+    seen = []
+    for _ in range(limit):
+        job = claim_job(exclude=seen)
+        if job is None:
+            break
+        seen.append(job.id)
+        run_job(job)
+
+    if metrics.enabled():
+        metrics.set_gauge(
+            "iot_inference_jobs_backlog",
+            InferenceJob.objects.filter(status=InferenceJob.PENDING).count()
+        )
+    return len(seen)
@@ -0,0 +1,125 @@
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import CollectorLease
+
+# Lets several collector workers (on one or more hosts) poll the same
+# collector: each reading is leased to one worker before it is downloaded
+# and run through the CNN. A worker that dies holds its leases only until
+# they expire, after which any other worker can take them over.
+#
+# The same rows are the retry queue: a reading that fails waits with
+# exponential backoff, and after COLLECTOR_MAX_ATTEMPTS it is kept as a
+# dead letter that workers skip without downloading it again.
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claimable(reading_ids, owner, now):
+    # Readings nobody holds: no lease yet, a crashed worker's lease, a due
+    # retry, or already ours. Page order is kept.
+    taken = set(
+        CollectorLease.objects
+        .filter(reading_id__in=reading_ids)
+        .exclude(status=CollectorLease.LEASED, expires_at__lt=now)
+        .exclude(status=CollectorLease.RETRY, expires_at__lte=now)
+        .exclude(status=CollectorLease.LEASED, owner=owner)
+        .values_list("reading_id", flat=True)
+    )
+    return [reading_id for reading_id in reading_ids if reading_id not in taken]
+
+
+def claim_readings(reading_ids, owner=WORKER_ID, ttl=None, limit=None):
+    # At most `limit` readings per call, so workers polling the same page
+    # split it instead of the first one taking all of it
+    now = timezone.now()
+    limit = settings.COLLECTOR_CLAIM_LIMIT if limit is None else limit
+    if limit:
+        reading_ids = claimable(reading_ids, owner, now)[:limit]
+    if not reading_ids:
+        return set()
+
+    expires_at = now + timedelta(seconds=ttl or settings.COLLECTOR_LEASE_SECONDS)
+    leases = CollectorLease.objects.filter(reading_id__in=reading_ids)
+
+    # Take over leases whose worker died (that counts as a failed attempt)
+    # and retries that are due; the WHERE clauses make both atomic
+    leases.filter(status=CollectorLease.LEASED, expires_at__lt=now).update(
+        owner=owner, expires_at=expires_at, attempts=F("attempts") + 1
+    )
+    leases.filter(status=CollectorLease.RETRY, expires_at__lte=now).update(
+        owner=owner, status=CollectorLease.LEASED, expires_at=expires_at
+    )
+
+    # A reading that keeps killing its worker ends up dead-lettered too
+    leases.filter(
+        owner=owner,
+        status=CollectorLease.LEASED,
+        attempts__gte=settings.COLLECTOR_MAX_ATTEMPTS
+    ).update(status=CollectorLease.DEAD, owner="", last_error="Worker died while processing")
+
+    # The unique reading_id decides who wins a fresh reading
+    CollectorLease.objects.bulk_create(
+        [CollectorLease(reading_id=reading_id, owner=owner, expires_at=expires_at) for reading_id in reading_ids],
+        ignore_conflicts=True
+    )
+
+    return set(
+        leases
+        .filter(owner=owner, status=CollectorLease.LEASED)
+        .values_list("reading_id", flat=True)
+    )
+
+
+def renew_leases(reading_ids, owner=WORKER_ID, ttl=None):
+    # Pushes expiry out again while a poll's readings are still being
+    # worked on; returns the ones still held (another worker may have
+    # taken over one whose lease ran out)
+    if not reading_ids:
+        return set()
+    leases = CollectorLease.objects.filter(reading_id__in=reading_ids, owner=owner, status=CollectorLease.LEASED)
+    leases.update(expires_at=timezone.now() + timedelta(seconds=ttl or settings.COLLECTOR_LEASE_SECONDS))
+    return set(leases.values_list("reading_id", flat=True))
+
+
+def release_readings(reading_ids, owner=WORKER_ID):
+    # Done with these; failed readings were already handed back as retries
+    if reading_ids:
+        CollectorLease.objects.filter(
+            reading_id__in=reading_ids, owner=owner, status=CollectorLease.LEASED
+        ).delete()
+
+
+def retry_delay(attempts):
+    return min(settings.COLLECTOR_RETRY_MAX, settings.COLLECTOR_RETRY_BASE * 2 ** (attempts - 1))
+
+
+def fail_reading(item, error, owner=WORKER_ID):
+    lease = CollectorLease.objects.filter(
+        reading_id=item["reading_id"], owner=owner, status=CollectorLease.LEASED
+    ).first()
+    if lease is None:
+        return None
+
+    lease.attempts += 1
+    lease.owner = ""
+    lease.last_error = str(error)
+    lease.payload = item
+
+    if lease.attempts >= settings.COLLECTOR_MAX_ATTEMPTS:
+        lease.status = CollectorLease.DEAD
+        print(f"Dead-lettered {item['reading_id']} after {lease.attempts} attempts: {error}")
+    else:
+        lease.status = CollectorLease.RETRY
+        lease.expires_at = timezone.now() + timedelta(seconds=retry_delay(lease.attempts))
+
+    lease.save(update_fields=["attempts", "owner", "last_error", "payload", "status", "expires_at"])
+    metrics.inc("iot_collector_failures_total", outcome=lease.status)
+    return lease.status
@@ -0,0 +1,149 @@
+import re
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from sensors.synthetic import synthetic_readings
+
+# Plan lines that mean SensorReading is read row by row
+FULL_SCAN = {
+    "sqlite": re.compile(r"\bSCAN sensors_sensorreading\b(?! USING)"),
+    "postgresql": re.compile(r"Seq Scan on sensors_sensorreading\b"),
+}
+# ...and that the rows are sorted after the fact instead of read in order
+EXTRA_SORT = {
+    "sqlite": re.compile(r"USE TEMP B-TREE FOR ORDER BY"),
+    "postgresql": re.compile(r"^\s*(->\s*)?Sort\b", re.M),
+}
+
+
+def hot_queries(user, device):
+    # The SensorReading querysets of the views and the collector worker
+    from sensors.models import SensorReading
+
+    readings = SensorReading.objects.filter(owner=user).order_by("-created_at")
+
+    return {
+        "dashboard": readings[:5],
+        "latest_readings": readings[:5],
+        "all_readings": readings,
+        "sensors_tiles_view": readings[:1],
+        "device_detail_view": SensorReading.objects.filter(device=device).order_by("-created_at"),
+        "get_alert_objects": SensorReading.objects.filter(alert=True, device__owner=user),
+        "profile_view (readings)": SensorReading.objects.filter(device__owner=user),
+        "profile_view (alerts)": SensorReading.objects.filter(device__owner=user, alert=True),
+        "sensor_graph_api": SensorReading.objects.filter(owner=user).order_by("created_at"),
+        "wroker reading_id lookup": (
+            SensorReading.objects
+            .filter(reading_id__in=[f"audit-{i}" for i in range(0, 1000, 10)])
+            .values_list("reading_id", flat=True)
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed SensorReading rows and EXPLAIN every hot query, flagging full "
+        "table scans and sorts the indexes should have avoided"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000)
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--devices-per-user", type=int, default=3)
+        parser.add_argument("--alert-rate", type=float, default=0.1)
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the full plan of every query")
+        parser.add_argument("--fail-on-scan", action="store_true",
+                            help="Exit non-zero when a query scans the table or sorts in memory")
+        parser.add_argument("--use-current-db", action="store_true",
+                            help="Seed into the configured database instead of a throwaway test database")
+
+    def handle(self, *args, **options):
+        if options["use_current_db"]:
+            report = self.run(options)
+        else:
+            setup_test_environment()
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        scans = [name for name, verdict, _ in report if verdict not in ("index", "unchecked")]
+        for name, verdict, plan in report:
+            self.stdout.write(f"{name:<28} {verdict}")
+            if options["verbose_plans"] or verdict != "index":
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if scans and options["fail_on_scan"]:
+            raise CommandError(f"Full table scan or in-memory sort in: {', '.join(scans)}")
+
+    def seed(self, options):
+        from django.contrib.auth.models import User
+        from sensors.models import Device, SensorReading
+
+        users = [
+            User.objects.get_or_create(username=f"audit-{n}")[0]
+            for n in range(options["users"])
+        ]
+        devices = [
+            Device.objects.get_or_create(device_id=f"audit-{n}-{d}", defaults={"owner": user})[0]
+            for n, user in enumerate(users)
+            for d in range(options["devices_per_user"])
+        ]
+
+        rng = np.random.default_rng(0)
+        rows = options["rows"]
+        values = synthetic_readings(rng, rows)
+        owners = rng.integers(0, len(devices), rows)
+        alerts = rng.random(rows) < options["alert_rate"]
+        start = timezone.now() - timedelta(seconds=5 * rows)
+
+        readings = SensorReading.objects.bulk_create([
+            SensorReading(
+                reading_id=f"audit-{i}",
+                device=devices[owners[i]],
+                owner_id=devices[owners[i]].owner_id,
+                temperature=float(values["temperature"][i]),
+                humidity=float(values["humidity"][i]),
+                soil_moisture=int(values["soil_moisture"][i]),
+                ph=float(values["ph"][i]),
+                alert=bool(alerts[i]),
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        # created_at is auto_now_add; spread it like a device posting every 5s
+        for i in range(0, rows, 1000):
+            for n, reading in enumerate(readings[i:i + 1000], start=i):
+                reading.created_at = start + timedelta(seconds=5 * n)
+            SensorReading.objects.bulk_update(readings[i:i + 1000], ["created_at"])
+
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        return users[0], devices[0]
+
+    def run(self, options):
+        user, device = self.seed(options)
+        full_scan = FULL_SCAN.get(connection.vendor)
+        extra_sort = EXTRA_SORT.get(connection.vendor)
+
+        report = []
+        for name, queryset in hot_queries(user, device).items():
+            plan = queryset.explain()
+            if full_scan is None:
+                verdict = "unchecked"
+            elif full_scan.search(plan):
+                verdict = "full scan"
+            elif extra_sort.search(plan):
+                verdict = "index, sorted in memory"
+            else:
+                verdict = "index"
+            report.append((name, verdict, plan))
+        return report
@@ -0,0 +1,319 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from sensors import ai_engine
+from sensors.synthetic import synthetic_leaf, synthetic_readings
+
+SUITES = ("disease", "stress", "http")
+
+
+# =========================================================
+# 🔹 TIMING
+# =========================================================
+
+def measure(fn, runs, items=1, warmup=1):
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    mean = statistics.mean(latencies)
+    return {
+        "runs": runs,
+        "latency_ms_mean": round(mean, 3),
+        "latency_ms_p50": round(latencies[len(latencies) // 2], 3),
+        "latency_ms_p95": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+        "throughput_per_s": round(items * 1000 / mean, 2) if mean else 0.0,
+    }
+
+
+def result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark predict_disease, scalar vs vectorized predict_stress and the "
+        "/sensor-data/ and /latest/ endpoints on synthetic data; results are saved as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suites", default=",".join(SUITES))
+        parser.add_argument("--output", default=None, help="JSON file (default: benchmarks/<commit>.json)")
+        parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+        parser.add_argument("--tolerance", type=float, default=0.10,
+                            help="Throughput drop vs --compare reported as a regression")
+        parser.add_argument("--fail-on-regression", action="store_true")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--images", type=int, default=32, help="Synthetic leaf images to generate")
+        parser.add_argument("--batch-sizes", default="1,4,16")
+        parser.add_argument("--threads", default="1,2,4")
+        parser.add_argument("--rows", type=int, default=100000, help="Readings for the stress benchmark")
+        parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+        parser.add_argument("--seed-readings", type=int, default=1000, help="Rows in the DB for /latest/")
+        parser.add_argument("--use-current-db", action="store_true",
+                            help="Run the HTTP suite against the configured DB instead of a throwaway test DB")
+
+    def handle(self, *args, **options):
+        suites = [s.strip() for s in options["suites"].split(",") if s.strip()]
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            raise CommandError(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+        rng = np.random.default_rng(options["seed"])
+        images = [synthetic_leaf(rng) for _ in range(options["images"])]
+
+        results = []
+        for suite in suites:
+            try:
+                results.extend(getattr(self, f"bench_{suite}")(options, images, rng))
+            except Exception as e:
+                # A missing model shouldn't lose the other suites' numbers
+                self.stderr.write(f"{suite}: skipped ({e})")
+                results.append({"suite": suite, "name": "skipped", "params": {}, "error": str(e)})
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "seed": options["seed"],
+                "backend": settings.AI_BACKEND,
+            },
+            "results": results,
+        }
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR, "benchmarks", f"{report['meta']['commit'] or 'results'}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        for r in results:
+            if "throughput_per_s" in r:
+                params = " ".join(f"{k}={v}" for k, v in r["params"].items())
+                self.stdout.write(
+                    f"{r['suite']:<8} {r['name']:<22} {params:<28} "
+                    f"mean {r['latency_ms_mean']:>9.3f} ms  p95 {r['latency_ms_p95']:>9.3f} ms  "
+                    f"{r['throughput_per_s']:>11.2f}/s"
+                )
+        self.stdout.write(f"Saved {output}")
+
+        if options["compare"]:
+            self.compare(options["compare"], results, options)
+
+    # =========================================================
+    # 🔹 SUITES
+    # =========================================================
+
+    def bench_disease(self, options, images, rng):
+        import torch
+
+        decoded = [ai_engine.load_image(img, draft=settings.AI_JPEG_DRAFT) for img in images]
+        results = []
+        previous_threads = torch.get_num_threads()
+
+        try:
+            for threads in [int(t) for t in options["threads"].split(",")]:
+                torch.set_num_threads(threads)
+
+                for batch_size in [int(b) for b in options["batch_sizes"].split(",")]:
+                    batch = (decoded * batch_size)[:batch_size]
+                    stats = measure(
+                        lambda: ai_engine.predict_disease_pth_batch(batch),
+                        options["runs"],
+                        items=batch_size
+                    )
+                    results.append({
+                        "suite": "disease",
+                        "name": "pth_batch",
+                        "params": {"batch_size": batch_size, "threads": threads},
+                        **stats,
+                    })
+        finally:
+            torch.set_num_threads(previous_threads)
+
+        # Whole predict_disease path (decode, preprocess, model, fallback)
+        # with the prediction cache off so every call does the work
+        previous_cache = ai_engine.prediction_cache
+        ai_engine.prediction_cache = None
+        position = iter(range(10 ** 9))
+        try:
+            with override_settings(AI_CACHE_ENABLED=False, AI_INFERENCE_SOCKET=""):
+                stats = measure(
+                    lambda: ai_engine.predict_disease(images[next(position) % len(images)]),
+                    options["runs"]
+                )
+        finally:
+            ai_engine.prediction_cache = previous_cache
+
+        results.append({
+            "suite": "disease",
+            "name": "predict_disease",
+            "params": {"fallback": settings.AI_FALLBACK_STRATEGY, "draft": settings.AI_JPEG_DRAFT},
+            **stats,
+        })
+        return results
+
+    def bench_stress(self, options, images, rng):
+        rows = options["rows"]
+        data = synthetic_readings(rng, rows)
+        columns = (data["crops"], data["temperature"], data["humidity"], data["soil_moisture"], data["ph"])
+        runs = max(1, options["runs"] // 4)
+
+        def scalar():
+            return [ai_engine.predict_stress(*row) for row in zip(*columns)]
+
+        def vectorized():
+            return ai_engine.predict_stress_batch(*columns)[0]
+
+        if list(vectorized()) != scalar():
+            raise CommandError("predict_stress_batch disagrees with predict_stress")
+
+        return [
+            {"suite": "stress", "name": name, "params": {"rows": rows}, **measure(fn, runs, items=rows)}
+            for name, fn in (("scalar", scalar), ("vectorized", vectorized))
+        ]
+
+    def bench_http(self, options, images, rng):
+        if options["use_current_db"]:
+            return self.run_http(options, images, rng)
+
+        # Throwaway database so seeded rows never reach the real one
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            return self.run_http(options, images, rng)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_http(self, options, images, rng):
+        from django.contrib.auth.models import User
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from sensors.models import Device, SensorReading
+
+        user, _ = User.objects.get_or_create(username="benchmark")
+        device, _ = Device.objects.get_or_create(device_id="benchmark-device", defaults={"owner": user})
+
+        data = synthetic_readings(rng, options["seed_readings"])
+        SensorReading.objects.bulk_create([
+            SensorReading(
+                device=device,
+                owner_id=device.owner_id,
+                crop=crop,
+                temperature=float(t),
+                humidity=float(h),
+                soil_moisture=int(m),
+                ph=float(p)
+            )
+            for crop, t, h, m, p in zip(
+                data["crops"], data["temperature"], data["humidity"], data["soil_moisture"], data["ph"]
+            )
+        ], batch_size=500)
+
+        client = Client()
+        position = iter(range(10 ** 9))
+
+        def post(mode):
+            def send():
+                i = next(position)
+                response = client.post(f"/sensor-data/?mode={mode}", {
+                    "device_id": device.device_id,
+                    "temperature": 25,
+                    "humidity": 60,
+                    "soil_moisture": 40,
+                    "ph": 6.5,
+                    "timestamp": "2025-01-01T10:00:00Z",
+                    "image": SimpleUploadedFile(f"leaf{i}.jpg", images[i % len(images)], content_type="image/jpeg"),
+                })
+                if response.status_code not in (200, 202):
+                    raise CommandError(f"/sensor-data/ returned {response.status_code}: {response.content[:200]}")
+            return send
+
+        def latest():
+            response = client.get("/latest/")
+            if response.status_code != 200:
+                raise CommandError(f"/latest/ returned {response.status_code}")
+
+        results = []
+        media_root = os.path.join(settings.BASE_DIR, "benchmarks", "media")
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                for name, fn in (("sensor_data_async", post("async")), ("sensor_data_sync", post("sync"))):
+                    try:
+                        stats = measure(fn, options["requests"])
+                    except Exception as e:
+                        self.stderr.write(f"{name}: skipped ({e})")
+                        continue
+                    results.append({"suite": "http", "name": name, "params": {}, **stats})
+
+                client.force_login(user)
+                results.append({
+                    "suite": "http",
+                    "name": "latest",
+                    "params": {"rows": options["seed_readings"]},
+                    **measure(latest, options["requests"]),
+                })
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        return results
+
+    # =========================================================
+    # 🔹 COMPARISON
+    # =========================================================
+
+    def compare(self, path, results, options):
+        with open(path) as f:
+            baseline = json.load(f)
+
+        previous = {result_key(r): r for r in baseline["results"] if "throughput_per_s" in r}
+        regressions = []
+
+        self.stdout.write(f"Compared with {path} (commit {baseline['meta'].get('commit')})")
+        for r in results:
+            old = previous.get(result_key(r))
+            if old is None or "throughput_per_s" not in r or not old["throughput_per_s"]:
+                continue
+
+            change = r["throughput_per_s"] / old["throughput_per_s"] - 1
+            flag = ""
+            if change < -options["tolerance"]:
+                flag = "  REGRESSION"
+                regressions.append(r["name"])
+
+            self.stdout.write(f"{r['suite']:<8} {r['name']:<22} {json.dumps(r['params']):<36} {change:+.1%}{flag}")
+
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"Throughput regressed for: {', '.join(regressions)}")
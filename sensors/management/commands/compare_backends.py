@@ -0,0 +1,102 @@
+import glob
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from sensors import ai_engine
+
+
+class Command(BaseCommand):
+    help = "Export the MobileNetV2 model to TorchScript/ONNX and check parity and latency against eager mode"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", default=os.path.join(settings.MEDIA_ROOT, "crop_images"),
+                            help="Directory of leaf images (random tensors are used if empty)")
+        parser.add_argument("--limit", type=int, default=32, help="Max images used for the parity check")
+        parser.add_argument("--batch-size", type=int, default=1)
+        parser.add_argument("--runs", type=int, default=20, help="Timed forward passes per backend")
+        parser.add_argument("--atol", type=float, default=1e-3, help="Max allowed probability difference vs eager")
+        parser.add_argument("--backends", default=",".join(ai_engine.PTH_BACKENDS))
+        parser.add_argument("--force-export", action="store_true", help="Re-export even if cached artifacts are fresh")
+        parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+
+    def load_inputs(self, directory, limit):
+        import torch
+
+        paths = sorted(
+            p for p in glob.glob(os.path.join(directory, "*"))
+            if p.lower().endswith((".jpg", ".jpeg", ".png"))
+        )[:limit]
+
+        if not paths:
+            self.stderr.write(f"No images in {directory}, using random inputs")
+            torch.manual_seed(0)
+            return torch.rand(limit, 3, 224, 224)
+
+        transform = ai_engine.get_pth_transform()
+        return torch.stack([transform(ai_engine.load_image(p)) for p in paths])
+
+    def handle(self, *args, **options):
+        import torch
+
+        backends = [b.strip() for b in options["backends"].split(",") if b.strip()]
+        if "eager" not in backends:
+            backends.insert(0, "eager")
+
+        if options["force_export"]:
+            ai_engine.export_torchscript(force=True)
+            ai_engine.export_onnx(force=True)
+
+        inputs = self.load_inputs(options["images"], options["limit"]).to(ai_engine.get_device())
+        timed_batch = inputs[:options["batch_size"]]
+
+        reference = None
+        results = []
+
+        for backend in backends:
+            try:
+                runner = ai_engine.get_pth_runner(backend)
+            except (ImproperlyConfigured, ImportError) as e:
+                self.stderr.write(f"{backend}: skipped ({e})")
+                continue
+
+            with torch.no_grad():
+                probs = torch.softmax(runner(inputs), dim=1).cpu()
+
+                runner(timed_batch)  # warm-up
+                latencies = []
+                for _ in range(options["runs"]):
+                    started = time.perf_counter()
+                    runner(timed_batch)
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+            if reference is None:
+                reference = probs
+
+            latencies.sort()
+            results.append({
+                "backend": backend,
+                "max_abs_diff": float((probs - reference).abs().max()),
+                "top1_agreement": float((probs.argmax(1) == reference.argmax(1)).float().mean()),
+                "latency_ms_mean": round(statistics.mean(latencies), 3),
+                "latency_ms_p95": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(f"{len(inputs)} inputs, batch size {len(timed_batch)}, {options['runs']} runs")
+            for r in results:
+                self.stdout.write(
+                    f"{r['backend']:<12} mean {r['latency_ms_mean']:>8.2f} ms  p95 {r['latency_ms_p95']:>8.2f} ms  "
+                    f"max|Δp| {r['max_abs_diff']:.2e}  top-1 agreement {r['top1_agreement']:.1%}"
+                )
+
+        failed = [r["backend"] for r in results if r["max_abs_diff"] > options["atol"]]
+        if failed:
+            raise CommandError(f"Parity check failed for: {', '.join(failed)} (atol={options['atol']})")
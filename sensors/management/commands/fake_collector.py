@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sensors.fake_collector import FakeCollector
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the collector service (point COLLECTOR_BASE_URL at it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--readings", type=int, default=1000)
+        parser.add_argument("--latency-ms", type=float, default=0, help="Added to every request")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+        parser.add_argument("--page-size", type=int, default=100, help="Readings returned per poll")
+        parser.add_argument("--single-acks", action="store_true", help="Reject batched acks like the old collector")
+        parser.add_argument("--device-id", default="loadtest-device")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        collector = FakeCollector(
+            readings=options["readings"],
+            latency_ms=options["latency_ms"],
+            error_rate=options["error_rate"],
+            page_size=options["page_size"],
+            batch_acks=not options["single_acks"],
+            device_id=options["device_id"],
+            seed=options["seed"]
+        )
+        url = collector.start(options["host"], options["port"])
+        self.stdout.write(f"Fake collector on {url} ({options['readings']} readings, stats at {url}/stats/)")
+        self.stdout.write(f"Device {options['device_id']!r} must exist in the worker's database")
+
+        try:
+            while not collector.done():
+                time.sleep(1)
+            self.stdout.write(f"All readings acked: {collector.stats()}")
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            collector.stop()
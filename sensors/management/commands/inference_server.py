@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sensors.inference_server import serve
+
+
+def parse_cores(value):
+    # "0-3" or "0,2,4"
+    cores = set()
+    for part in value.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            cores.update(range(int(start), int(end) + 1))
+        elif part:
+            cores.add(int(part))
+    return cores
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the per-host inference server that holds the disease models once. "
+        "Point web and collector workers at it with AI_INFERENCE_SOCKET; "
+        "set AI_BATCH_WINDOW_MS so concurrent clients share forward passes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.AI_INFERENCE_SOCKET or "/tmp/iot-inference.sock")
+        parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads (default: one per pinned core)")
+        parser.add_argument("--cores", default="", help="CPU cores to pin to, e.g. 0-3 or 0,2")
+
+    def handle(self, *args, **options):
+        try:
+            cores = parse_cores(options["cores"])
+        except ValueError:
+            raise CommandError(f"Invalid --cores value {options['cores']!r}")
+
+        try:
+            serve(options["socket"], threads=options["threads"], cores=cores or None)
+        except KeyboardInterrupt:
+            self.stdout.write("Inference server stopped")
@@ -0,0 +1,195 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from sensors import metrics
+from sensors.fake_collector import FakeCollector
+
+
+@contextmanager
+def throwaway_database(tmp):
+    # A file (not :memory:) for SQLite so worker threads can share it
+    if connection.vendor == "sqlite":
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tmp, "loadtest.sqlite3")
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def fixed_inference(latency_ms):
+    def predict(img):
+        time.sleep(latency_ms / 1000)
+        return "Tomato", "Tomato___healthy", 99.0
+    return predict
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the collector worker against a local fake collector and report "
+        "items/sec, per-stage latency and duplicate processing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readings", type=int, default=200)
+        parser.add_argument("--mode", choices=["sequential", "pipelined"], default=settings.COLLECTOR_WORKER_MODE)
+        parser.add_argument("--workers", type=int, default=1, help="Worker loops, each with its own lease owner")
+        parser.add_argument("--concurrency", type=int, default=None, help="Download threads (pipelined mode)")
+        parser.add_argument("--inference-threads", type=int, default=None)
+        parser.add_argument("--latency-ms", type=float, default=20, help="Collector latency per request")
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--claim-limit", type=int, default=settings.COLLECTOR_CLAIM_LIMIT,
+                            help="Readings a worker claims per poll (0 = the whole page)")
+        parser.add_argument("--single-acks", action="store_true")
+        parser.add_argument("--inference-ms", type=float, default=None,
+                            help="Replace the CNN with a fixed-latency answer (default: run the real model)")
+        parser.add_argument("--timeout", type=float, default=300)
+        parser.add_argument("--output", default=None, help="Also write the report as JSON")
+        parser.add_argument("--use-current-db", action="store_true")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            if options["use_current_db"]:
+                report = self.run(options, tmp)
+            else:
+                with throwaway_database(tmp):
+                    report = self.run(options, tmp)
+
+        stages = " ".join(
+            f"{stage}={s['p50_ms']:.1f}/{s['p95_ms']:.1f}ms" for stage, s in report["stages"].items()
+        )
+        self.stdout.write(
+            f"{report['processed']} readings in {report['seconds']:.2f}s = {report['items_per_second']:.1f}/s "
+            f"({options['mode']}, {options['workers']} worker(s))"
+        )
+        self.stdout.write(f"stage p50/p95: {stages}")
+        self.stdout.write(
+            f"duplicates: {report['duplicate_readings']} stored, {report['collector']['duplicate_downloads']} "
+            f"downloads, {report['collector']['duplicate_acks']} acks; "
+            f"{report['collector']['acked']}/{report['collector']['readings']} acked"
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if not report["complete"]:
+            raise CommandError(f"Timed out after {options['timeout']}s with readings still unacked")
+
+    def run(self, options, tmp):
+        from django.contrib.auth.models import User
+        import wroker
+        from sensors.models import Device, SensorReading
+
+        user, _ = User.objects.get_or_create(username="loadtest")
+        Device.objects.get_or_create(device_id="loadtest-device", defaults={"owner": user})
+
+        collector = FakeCollector(
+            readings=options["readings"],
+            latency_ms=options["latency_ms"],
+            error_rate=options["error_rate"],
+            page_size=options["page_size"],
+            batch_acks=not options["single_acks"]
+        )
+        base_url = collector.start()
+
+        overrides = override_settings(
+            COLLECTOR_POLL_URL=f"{base_url}/get-unprocessed/",
+            COLLECTOR_ACK_URL=f"{base_url}/update-result/",
+            COLLECTOR_BATCH_ACK_URL="",
+            COLLECTOR_ACK_JOURNAL=os.path.join(tmp, "acks.journal"),
+            COLLECTOR_LONG_POLL_SECONDS=0,
+            COLLECTOR_CLAIM_LIMIT=options["claim_limit"],
+            COLLECTOR_BACKOFF=0.05,
+            COLLECTOR_RETRY_BASE=0.2,
+            COLLECTOR_RETRY_MAX=2,
+            MEDIA_ROOT=os.path.join(tmp, "media"),
+            METRICS_ENABLED=True
+        )
+        inference = (
+            patch.object(wroker, "predict_disease", fixed_inference(options["inference_ms"]))
+            if options["inference_ms"] is not None else nullcontext()
+        )
+
+        with overrides, inference:
+            wroker.collector = None
+            wroker.acks = None
+            metrics.reset()
+
+            deadline = time.monotonic() + options["timeout"]
+            processed = []
+
+            def worker(n):
+                owner = f"loadtest-{n}"
+                try:
+                    while not collector.done() and time.monotonic() < deadline:
+                        if options["mode"] == "pipelined":
+                            counts = wroker.process_pipelined(options["concurrency"], options["inference_threads"], owner)
+                        else:
+                            counts = wroker.process(owner)
+                        processed.append(counts["processed"])
+                        if not counts["processed"]:
+                            time.sleep(0.05)
+                finally:
+                    connections.close_all()
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(options["workers"])]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+
+            wroker.get_acks().flush()
+            wroker.get_collector().close()
+            wroker.collector = None
+            wroker.acks = None
+            collector.stop()
+
+            stages = {}
+            for (name, labels), (count, total, window) in sorted(metrics.summaries.items()):
+                if name == "iot_worker_stage_seconds":
+                    window = sorted(window)
+                    stages[dict(labels)["stage"]] = {
+                        "count": count,
+                        "mean_ms": round(total / count * 1000, 3),
+                        "p50_ms": round(metrics.quantile(window, 0.5) * 1000, 3),
+                        "p95_ms": round(metrics.quantile(window, 0.95) * 1000, 3),
+                    }
+
+            duplicates = (
+                SensorReading.objects
+                .filter(reading_id__startswith="load-")
+                .values("reading_id")
+                .annotate(n=Count("id"))
+                .filter(n__gt=1)
+            )
+
+            return {
+                "mode": options["mode"],
+                "workers": options["workers"],
+                "readings": options["readings"],
+                "processed": sum(processed),
+                "seconds": round(elapsed, 3),
+                "items_per_second": round(sum(processed) / elapsed, 2) if elapsed else 0.0,
+                "complete": collector.done(),
+                "duplicate_readings": sum(d["n"] - 1 for d in duplicates),
+                "stages": stages,
+                "collector": collector.stats(),
+            }
@@ -0,0 +1,83 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so every measurement starts cold
+PROBE = """
+import importlib, json, os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "iot_backend.settings")
+for name in {preload!r}:
+    importlib.import_module(name)
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": rss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    "ml_modules": [m for m in ("torch", "torchvision", "tensorflow") if m in sys.modules],
+}}))
+"""
+
+ML_STACK = ["torch", "torchvision", "tensorflow"]
+
+SCENARIOS = [
+    # name, modules imported before Django, modules imported after setup
+    ("web worker (lazy ML imports)", [], ["sensors.urls"]),
+    ("web worker (eager ML stack, old behaviour)", ML_STACK, ["sensors.urls"]),
+    ("collector worker (lazy ML imports)", [], ["sensors.ai_engine", "sensors.jobs"]),
+]
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start time and peak RSS of a web worker with lazy vs eager ML imports"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario (median is reported)")
+        parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+
+    def probe(self, preload, modules):
+        code = PROBE.format(preload=preload, modules=modules)
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        results = []
+
+        for name, preload, modules in SCENARIOS:
+            try:
+                runs = [self.probe(preload, modules) for _ in range(options["repeat"])]
+            except CommandError as e:
+                self.stderr.write(f"{name}: skipped ({e})")
+                continue
+
+            results.append({
+                "scenario": name,
+                "seconds": round(statistics.median(r["seconds"] for r in runs), 3),
+                "max_rss_mb": round(statistics.median(r["max_rss_mb"] for r in runs), 1),
+                "ml_modules": runs[-1]["ml_modules"],
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for r in results:
+            loaded = ", ".join(r["ml_modules"]) or "none"
+            self.stdout.write(
+                f"{r['scenario']:<45} {r['seconds']:>7.3f}s {r['max_rss_mb']:>8.1f} MB  ML loaded: {loaded}"
+            )
@@ -0,0 +1,111 @@
+import copy
+import glob
+import os
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sensors import ai_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Build an INT8 copy of the MobileNetV2 model calibrated on stored crop images, "
+        "and enable it only if top-1 agreement with the float model clears the threshold"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+        parser.add_argument("--images", default=os.path.join(settings.MEDIA_ROOT, "crop_images"))
+        parser.add_argument("--calibration", type=int, default=100, help="Images used to calibrate activation ranges")
+        parser.add_argument("--evaluation", type=int, default=500, help="Held-out images used for the accuracy gate")
+        parser.add_argument("--threshold", type=float, default=0.98, help="Min top-1 agreement with the float model")
+        parser.add_argument("--batch-size", type=int, default=16)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def batches(self, paths, batch_size):
+        import torch
+
+        transform = ai_engine.get_pth_transform()
+        for i in range(0, len(paths), batch_size):
+            yield torch.stack([
+                transform(ai_engine.load_image(p)) for p in paths[i:i + batch_size]
+            ])
+
+    def predict(self, runner, paths, batch_size):
+        import torch
+
+        predictions = []
+        started = time.perf_counter()
+        with torch.no_grad():
+            for batch in self.batches(paths, batch_size):
+                predictions.extend(runner(batch).argmax(1).tolist())
+        return predictions, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        paths = sorted(
+            p for p in glob.glob(os.path.join(options["images"], "*"))
+            if p.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        if len(paths) < 2:
+            raise CommandError(f"Need stored leaf images in {options['images']} to calibrate and evaluate")
+
+        # Calibration and evaluation sets never overlap
+        random.Random(options["seed"]).shuffle(paths)
+        calibration = paths[:min(options["calibration"], len(paths) // 2)]
+        evaluation = paths[len(calibration):len(calibration) + options["evaluation"]]
+
+        self.stdout.write(
+            f"Quantizing ({options['mode']}) with {len(calibration)} calibration / {len(evaluation)} evaluation images"
+        )
+        quantized = ai_engine.quantize_pth_model(
+            options["mode"],
+            self.batches(calibration, options["batch_size"]) if options["mode"] == "static" else ()
+        )
+
+        # A copy: .cpu() on the cached model would move it off the GPU for
+        # everything else in this process
+        float_model = copy.deepcopy(ai_engine.get_pth_model()).cpu()
+        reference, float_seconds = self.predict(float_model, evaluation, options["batch_size"])
+        candidate, int8_seconds = self.predict(quantized, evaluation, options["batch_size"])
+
+        # Agreement per class, grouped by what the float model predicted
+        per_class = defaultdict(lambda: [0, 0])
+        for ref, cand in zip(reference, candidate):
+            per_class[ref][0] += int(ref == cand)
+            per_class[ref][1] += 1
+
+        agreement = sum(r == c for r, c in zip(reference, candidate)) / len(reference)
+        enabled = agreement >= options["threshold"]
+
+        for class_id in sorted(per_class):
+            hits, total = per_class[class_id]
+            self.stdout.write(f"  {ai_engine.PTH_CLASS_NAMES[class_id]:<55} {hits:>4}/{total:<4} {hits / total:.1%}")
+
+        self.stdout.write(
+            f"Top-1 agreement {agreement:.2%} (threshold {options['threshold']:.2%}); "
+            f"float {float_seconds:.2f}s vs int8 {int8_seconds:.2f}s on the evaluation set"
+        )
+
+        ai_engine.save_quantized_model(quantized, {
+            "mode": options["mode"],
+            "enabled": enabled,
+            "agreement": round(agreement, 4),
+            "threshold": options["threshold"],
+            "calibration_images": len(calibration),
+            "evaluation_images": len(evaluation),
+            "per_class": {
+                ai_engine.PTH_CLASS_NAMES[class_id]: round(hits / total, 4)
+                for class_id, (hits, total) in sorted(per_class.items())
+            },
+            "float_seconds": round(float_seconds, 3),
+            "int8_seconds": round(int8_seconds, 3),
+        })
+
+        if not enabled:
+            raise CommandError("Quantized model is below the agreement threshold and stays disabled")
+
+        self.stdout.write(self.style.SUCCESS("Quantized model enabled; set AI_BACKEND=int8 to use it"))
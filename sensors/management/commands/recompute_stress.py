@@ -0,0 +1,200 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from sensors.ai_engine import agrotech_decision, predict_stress_batch
+from sensors.models import InferenceJob, SensorReading
+
+FIELDS = ("id", "crop", "disease", "temperature", "humidity", "soil_moisture", "ph", "stress_level", "decision", "alert")
+
+
+def read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def write_checkpoint(path, data):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute stress_level, decision and alert for stored readings after "
+        "crop_data.json or agrotech_decision changes. Streams the table in id order."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--start-id", type=int, default=None)
+        parser.add_argument("--end-id", type=int, default=None)
+        parser.add_argument("--checkpoint", default=None, help="JSON file used to resume an interrupted run")
+        parser.add_argument("--workers", type=int, default=1, help="Split the id range across this many processes")
+        parser.add_argument("--dry-run", action="store_true", help="Count changes without writing them")
+
+    def handle(self, *args, **options):
+        if options["workers"] > 1:
+            return self.run_workers(options)
+
+        checkpoint = read_checkpoint(options["checkpoint"])
+        end_id = options["end_id"]
+        # A checkpoint from a run over another id range would skip rows
+        for key in ("start_id", "end_id"):
+            if key in checkpoint and checkpoint[key] != options[key]:
+                raise CommandError(
+                    f"{options['checkpoint']} was written for {key} {checkpoint[key]}, not {options[key]}; "
+                    "delete it or pass the same range"
+                )
+        last_id = checkpoint.get("last_id", (options["start_id"] or 1) - 1)
+        scanned = checkpoint.get("scanned", 0)
+        updated = checkpoint.get("updated", 0)
+        decisions = {}
+        started = time.perf_counter()
+
+        while True:
+            qs = (
+                SensorReading.objects
+                .filter(id__gt=last_id)
+                # Readings still waiting on the CNN are finished by the job worker
+                .exclude(inference_job__status__in=[InferenceJob.PENDING, InferenceJob.RUNNING])
+                .order_by("id")
+            )
+            if end_id is not None:
+                qs = qs.filter(id__lte=end_id)
+
+            rows = list(qs.values_list(*FIELDS)[:options["chunk_size"]])
+            if not rows:
+                break
+
+            ids, crops, diseases, temps, hums, moists, phs, old_stress, old_decisions, old_alerts = zip(*rows)
+            labels, _ = predict_stress_batch(crops, temps, hums, moists, phs)
+
+            changed = []
+            for i, stress in enumerate(labels):
+                disease = diseases[i]
+
+                if disease == "Unknown":
+                    # No leaf image was analysed: only the environment counts
+                    decision = old_decisions[i]
+                    alert = stress == "HIGH"
+                else:
+                    if (disease, stress) not in decisions:
+                        decisions[disease, stress] = agrotech_decision(disease, stress)
+                    decision = decisions[disease, stress]
+                    alert = "healthy" not in disease.lower() or stress == "HIGH"
+
+                if (stress, decision, alert) != (old_stress[i], old_decisions[i], old_alerts[i]):
+                    changed.append(SensorReading(id=ids[i], stress_level=stress, decision=decision, alert=alert))
+
+            if changed and not options["dry_run"]:
+                SensorReading.objects.bulk_update(changed, ["stress_level", "decision", "alert"])
+
+            last_id = ids[-1]
+            scanned += len(rows)
+            updated += len(changed)
+
+            if options["checkpoint"] and not options["dry_run"]:
+                write_checkpoint(options["checkpoint"], {
+                    "last_id": last_id,
+                    "start_id": options["start_id"],
+                    "end_id": end_id,
+                    "scanned": scanned,
+                    "updated": updated,
+                })
+
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  up to id {last_id}: {scanned} scanned, {updated} changed")
+
+        # Finished: the next run (after the next crop profile change) must
+        # start from the beginning, not from here
+        if options["checkpoint"] and not options["dry_run"] and os.path.exists(options["checkpoint"]):
+            os.remove(options["checkpoint"])
+
+        elapsed = time.perf_counter() - started
+        verb = "would change" if options["dry_run"] else "updated"
+        self.stdout.write(f"{scanned} readings scanned, {updated} {verb} in {elapsed:.1f}s (last id {last_id})")
+
+    def run_workers(self, options):
+        base = options["checkpoint"] or os.path.join(settings.BASE_DIR, "recompute_stress.checkpoint")
+        workers = options["workers"]
+
+        # The partitions are fixed on the first run and kept in a manifest at
+        # `base`, so readings inserted meanwhile don't shift a resumed run's
+        # ranges away from its per-worker checkpoints
+        manifest = read_checkpoint(base)
+        if manifest:
+            for key in ("start_id", "end_id", "workers"):
+                if manifest[key] != options[key]:
+                    raise CommandError(
+                        f"{base} was written for {key} {manifest[key]}, not {options[key]}; "
+                        "delete it or pass the same options"
+                    )
+        else:
+            bounds = SensorReading.objects.aggregate(low=Min("id"), high=Max("id"))
+            if bounds["low"] is None:
+                self.stdout.write("No readings")
+                return
+
+            low = max(bounds["low"], options["start_id"] or bounds["low"])
+            high = min(bounds["high"], options["end_id"] or bounds["high"])
+            if low > high:
+                raise CommandError("Empty id range")
+
+            manifest = {
+                "start_id": options["start_id"],
+                "end_id": options["end_id"],
+                "workers": workers,
+                "low": low,
+                "high": high,
+                "step": (high - low) // workers + 1,
+                "done": [],
+            }
+            if not options["dry_run"]:
+                write_checkpoint(base, manifest)
+
+        low, high, step = manifest["low"], manifest["high"], manifest["step"]
+        processes = {}
+        for n in range(workers):
+            start = low + n * step
+            if start > high:
+                break
+            end = min(high, start + step - 1)
+            if n in manifest["done"]:
+                self.stdout.write(f"worker {n}: ids {start}-{end} already done")
+                continue
+            cmd = [
+                sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "recompute_stress",
+                "--start-id", str(start),
+                "--end-id", str(end),
+                "--chunk-size", str(options["chunk_size"]),
+                "--checkpoint", f"{base}.{n}",
+            ]
+            if options["dry_run"]:
+                cmd.append("--dry-run")
+
+            self.stdout.write(f"worker {n}: ids {start}-{end}")
+            processes[n] = subprocess.Popen(cmd, cwd=settings.BASE_DIR)
+
+        failed = [n for n, p in processes.items() if p.wait() != 0]
+        if failed:
+            if not options["dry_run"]:
+                manifest["done"] += [n for n in processes if n not in failed]
+                write_checkpoint(base, manifest)
+            raise CommandError(f"Workers {failed} failed; re-run with the same --checkpoint to resume")
+
+        # Finished: the next run (after the next crop profile change) must
+        # start from the beginning, not from these
+        for path in [base] + [f"{base}.{n}" for n in range(workers)]:
+            if os.path.exists(path):
+                os.remove(path)
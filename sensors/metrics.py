@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+# Minimal in-process metrics exposed in Prometheus text format on /metrics.
+# Each gunicorn worker keeps its own registry, so scrape every worker (or
+# run one) when exact fleet-wide numbers matter. With METRICS_ENABLED off
+# every call below returns immediately.
+
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+lock = threading.Lock()
+counters = {}
+gauges = {}
+summaries = {}
+help_texts = {
+    "iot_ingest_seconds": "End-to-end latency of ingestion endpoints",
+    "iot_ingest_stage_seconds": "Latency of each stage of /sensor-data/",
+    "iot_ingest_errors_total": "Rejected ingestion requests",
+    "iot_readings_total": "Readings stored",
+    "iot_preprocess_seconds": "Image decode and preprocessing latency",
+    "iot_inference_seconds": "Model forward pass latency",
+    "iot_worker_stage_seconds": "Latency of each stage of the collector worker",
+    "iot_inference_jobs_total": "Async inference jobs by outcome",
+    "iot_errors_total": "Unhandled errors by component",
+    "iot_collector_polls_total": "Collector polls by outcome",
+    "iot_collector_backlog": "Unprocessed readings reported by the last collector poll",
+    "iot_worker_poll_delay_seconds": "Sleep before the next collector poll",
+    "iot_inference_jobs_backlog": "Async inference jobs waiting to run",
+    "iot_collector_failures_total": "Collector readings that failed, by what happens next",
+}
+collectors = []
+
+
+def enabled():
+    return settings.METRICS_ENABLED
+
+
+def key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name, text):
+    help_texts[name] = text
+
+
+def inc(name, amount=1, **labels):
+    if not enabled():
+        return
+    k = key(name, labels)
+    with lock:
+        counters[k] = counters.get(k, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    if not enabled():
+        return
+    with lock:
+        gauges[key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    if not enabled():
+        return
+    k = key(name, labels)
+    with lock:
+        summary = summaries.get(k)
+        if summary is None:
+            summary = summaries[k] = [0, 0.0, deque(maxlen=settings.METRICS_WINDOW)]
+        summary[0] += 1
+        summary[1] += value
+        summary[2].append(value)
+
+
+@contextmanager
+def timed(name, **labels):
+    if not enabled():
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def register_collector(collector):
+    # collector() -> iterable of (name, type, help, value, labels) read at scrape time
+    collectors.append(collector)
+
+
+def reset():
+    with lock:
+        counters.clear()
+        gauges.clear()
+        summaries.clear()
+
+
+# =========================================================
+# 🔹 PROMETHEUS TEXT FORMAT
+# =========================================================
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + pairs + "}"
+
+
+def quantile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def render():
+    with lock:
+        counter_items = sorted(counters.items())
+        gauge_items = sorted(gauges.items())
+        summary_items = sorted(
+            (k, (count, total, sorted(window)))
+            for k, (count, total, window) in summaries.items()
+        )
+
+    lines = []
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            if name in help_texts:
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counter_items:
+        declare(name, "counter")
+        lines.append(f"{name}{format_labels(labels)} {value}")
+
+    for (name, labels), value in gauge_items:
+        declare(name, "gauge")
+        lines.append(f"{name}{format_labels(labels)} {value}")
+
+    for (name, labels), (count, total, window) in summary_items:
+        declare(name, "summary")
+        for q in QUANTILES:
+            if window:
+                lines.append(f"{name}{format_labels(labels + (('quantile', q),))} {quantile(window, q):.6f}")
+        lines.append(f"{name}_sum{format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+    for collector in collectors:
+        for name, kind, text, value, labels in collector():
+            describe(name, text)
+            declare(name, kind)
+            lines.append(f"{name}{format_labels(tuple(sorted(labels.items())))} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+# =========================================================
+# 🔹 STANDALONE EXPORTER
+# =========================================================
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    # Background workers have no Django URLconf; expose their registry
+    # directly, on loopback unless told otherwise (there is no auth here)
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
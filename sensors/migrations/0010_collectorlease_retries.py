@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0009_collectorlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectorlease',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='collectorlease',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='collectorlease',
+            name='payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='collectorlease',
+            name='status',
+            field=models.CharField(choices=[('leased', 'Leased'), ('retry', 'Waiting to retry'), ('dead', 'Dead letter')], default='leased', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='collectorlease',
+            name='owner',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0011_alertdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertdelivery',
+            name='incident_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='alertdelivery',
+            name='last_seen_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='alertdelivery',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='alertdelivery',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('dropped', 'Dropped'), ('held', 'Held for digest'), ('merged', 'Merged into digest')], db_index=True, default='pending', max_length=10),
+        ),
+    ]
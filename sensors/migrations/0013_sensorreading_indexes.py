@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def clear_duplicate_reading_ids(apps, schema_editor):
+    # Keep reading_id on the newest copy of each reading so the unique
+    # constraint can be added; the older copies stay, without the id
+    SensorReading = apps.get_model('sensors', 'SensorReading')
+    duplicates = (
+        SensorReading.objects
+        .exclude(reading_id__isnull=True)
+        .exclude(reading_id='')
+        .values('reading_id')
+        .annotate(n=Count('id'), newest=Max('id'))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates:
+        SensorReading.objects.filter(reading_id=dup['reading_id']).exclude(id=dup['newest']).update(reading_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0012_alertdelivery_coalescing'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_reading_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='reading_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['device', '-created_at'], name='reading_device_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(condition=models.Q(('alert', True)), fields=['device', '-created_at'], name='reading_device_alert_idx'),
+        ),
+        migrations.AlterField(
+            model_name='sensorreading',
+            name='device',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='sensors.device'),
+        ),
+        migrations.AddConstraint(
+            model_name='sensorreading',
+            constraint=models.UniqueConstraint(condition=models.Q(('reading_id__isnull', False), models.Q(('reading_id', ''), _negated=True)), fields=('reading_id',), name='unique_reading_id'),
+        ),
+    ]
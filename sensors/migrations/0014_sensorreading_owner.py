@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_device_owner(apps, schema_editor):
+    SensorReading = apps.get_model('sensors', 'SensorReading')
+    Device = apps.get_model('sensors', 'Device')
+    SensorReading.objects.filter(device__isnull=False).update(
+        owner_id=Subquery(Device.objects.filter(pk=OuterRef('device_id')).values('owner_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensors', '0013_sensorreading_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensorreading',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_device_owner, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sensorreading',
+            index=models.Index(fields=['owner', '-created_at'], name='reading_owner_recent_idx'),
+        ),
+    ]
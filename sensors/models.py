@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -15,9 +17,24 @@ class Device(models.Model):
     def __str__(self):
         return f"{self.device_id} → {self.owner.username}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # Readings keep a copy of the owner (see SensorReading.owner)
+        if not adding:
+            self.sensorreading_set.exclude(owner_id=self.owner_id).update(owner_id=self.owner_id)
+
 class SensorReading(models.Model):
-    device = models.ForeignKey(Device, on_delete=models.CASCADE, null=True, blank=True)
-    reading_id = models.CharField(max_length=100, null=True, blank=True)
+    # Indexed by reading_device_recent_idx below
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+    reading_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
+    # device.owner, copied so a user's readings across all their devices
+    # come newest first off reading_owner_recent_idx without a sort; set by
+    # save() and kept in step by Device.save() (bulk_create must pass it)
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, editable=False,
+        related_name="+", db_index=False
+    )
     # Sensor data
     temperature = models.FloatField(default=0.0)
     humidity = models.FloatField(default=0.0)
@@ -40,11 +57,143 @@ class SensorReading(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Dashboards list a user's devices newest first, alert pages only
+        # the alerts; collector readings arrive at most once per reading_id
+        # (readings posted without one are not checked)
+        indexes = [
+            models.Index(fields=["owner", "-created_at"], name="reading_owner_recent_idx"),
+            models.Index(fields=["device", "-created_at"], name="reading_device_recent_idx"),
+            models.Index(
+                fields=["device", "-created_at"],
+                condition=models.Q(alert=True),
+                name="reading_device_alert_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reading_id"],
+                condition=models.Q(reading_id__isnull=False) & ~models.Q(reading_id=""),
+                name="unique_reading_id"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.device_id is not None and self.owner_id is None:
+            self.owner_id = self.device.owner_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         if self.sensor_timestamp:
             return f"{self.device} @ {self.sensor_timestamp}"
         return f"{self.device} @ {self.created_at}"
 
+class InferenceJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    reading = models.OneToOneField(SensorReading, on_delete=models.CASCADE, related_name="inference_job")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    confidence = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.status}) → {self.reading_id}"
+
+
+class CollectorLease(models.Model):
+    # A collector reading some worker process is working on. Claimed with
+    # an insert (or a takeover once expired) so two workers never run the
+    # CNN on the same reading; deleted when the worker is done with it.
+    # A reading that failed stays here as a retry until expires_at, and is
+    # dead-lettered after COLLECTOR_MAX_ATTEMPTS.
+    LEASED = "leased"
+    RETRY = "retry"
+    DEAD = "dead"
+
+    STATUS_CHOICES = [
+        (LEASED, "Leased"),
+        (RETRY, "Waiting to retry"),
+        (DEAD, "Dead letter"),
+    ]
+
+    reading_id = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=LEASED)
+    expires_at = models.DateTimeField(db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    payload = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.reading_id} ({self.status}) → {self.owner}"
+
+class AlertDelivery(models.Model):
+    # Outbox row for one alert on one channel. Sent by the in-process alert
+    # dispatcher; anything it could not take (full queue, restart, retry
+    # due later) is picked up by ai_worker from this table.
+    #
+    # Repeats of the same incident (device, disease, stress level) within
+    # the suppression window only bump `occurrences`. In digest mode emails
+    # are held and merged into one digest row per user.
+    EMAIL = "email"
+    SMS = "sms"
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    DROPPED = "dropped"
+    HELD = "held"
+    MERGED = "merged"
+
+    CHANNEL_CHOICES = [
+        (EMAIL, "Email"),
+        (SMS, "SMS"),
+    ]
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+        (DROPPED, "Dropped"),
+        (HELD, "Held for digest"),
+        (MERGED, "Merged into digest"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="alert_deliveries")
+    reading = models.ForeignKey(SensorReading, on_delete=models.SET_NULL, null=True, blank=True, related_name="alert_deliveries")
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    incident_key = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(default=timezone.now)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.channel} alert {self.pk} ({self.status}) → {self.user_id}"
+
 class CropRecommendation(models.Model):
     crop = models.CharField(max_length=50)
     disease = models.CharField(max_length=100)
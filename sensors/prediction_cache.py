@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+# Devices often re-send the same (or a near-identical) leaf photo every
+# cycle. Predictions are cached by content hash and, optionally, by a
+# 64-bit perceptual hash so a re-encoded or recompressed photo still hits.
+
+
+def content_hash(raw, image):
+    # Hash the bytes we were given when we have them, otherwise the pixels
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        data = bytes(raw)
+    elif isinstance(raw, (str, os.PathLike)):
+        with open(raw, "rb") as f:
+            data = f.read()
+    else:
+        data = b"%dx%d:" % image.size + image.tobytes()
+
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(image, size=8):
+    # dHash: compare neighbouring pixels of a tiny grayscale thumbnail
+    small = image.convert("L").resize((size + 1, size))
+    pixels = small.tobytes()
+
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class PredictionCache:
+    # In-process LRU with TTL. `backend` may name a Django cache alias
+    # (e.g. a Redis or memcached cache) so every worker shares entries;
+    # near-duplicate matching only scans the local entries.
+
+    def __init__(self, max_entries=1024, ttl=3600, phash_distance=None, backend="local"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.phash_distance = phash_distance
+        self.shared = None if backend == "local" else caches[backend]
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "perceptual_hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    def make_key(self, raw, image):
+        phash = perceptual_hash(image) if self.phash_distance is not None else None
+        return content_hash(raw, image), phash
+
+    def get(self, key):
+        digest, phash = key
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(digest)
+                self.counters["hits"] += 1
+                return entry[2]
+
+            if phash is not None:
+                for other, (expires, other_phash, result) in reversed(self.entries.items()):
+                    if expires > now and hamming(phash, other_phash) <= self.phash_distance:
+                        self.entries.move_to_end(other)
+                        self.counters["perceptual_hits"] += 1
+                        return result
+
+        if self.shared is not None:
+            result = self.shared.get(f"prediction:{digest}")
+            if result is not None:
+                result = tuple(result)
+                self.store(key, result)
+                with self.lock:
+                    self.counters["shared_hits"] += 1
+                return result
+
+        with self.lock:
+            self.counters["misses"] += 1
+        return None
+
+    def store(self, key, result):
+        digest, phash = key
+
+        with self.lock:
+            self.entries[digest] = (time.monotonic() + self.ttl, phash, result)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def set(self, key, result):
+        self.store(key, result)
+        if self.shared is not None:
+            self.shared.set(f"prediction:{key[0]}", list(result), timeout=self.ttl)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, size=len(self.entries))
+
+        lookups = stats["hits"] + stats["perceptual_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
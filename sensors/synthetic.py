@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Seeded fake leaf photos and sensor values for benchmarks and load tests
+
+CROPS = ("tomato", "potato", "corn", "apple", "grape", "rice", "banana")
+
+
+def synthetic_leaf(rng, size=(640, 480)):
+    # Noisy green background with a leaf-shaped blob and a few lesions,
+    # JPEG-encoded like a camera upload
+    pixels = rng.integers(0, 60, (size[1], size[0], 3), dtype=np.uint8)
+    pixels[..., 1] += 80
+    img = Image.fromarray(pixels)
+
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    draw.ellipse((w * 0.2, h * 0.1, w * 0.8, h * 0.9), fill=tuple(int(c) for c in rng.integers(40, 200, 3)))
+    for _ in range(int(rng.integers(3, 12))):
+        x, y = rng.uniform(0.3, 0.7) * w, rng.uniform(0.2, 0.8) * h
+        r = rng.uniform(5, 25)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(110, 70, 30))
+
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def synthetic_readings(rng, n):
+    return {
+        "crops": [CROPS[i] for i in rng.integers(0, len(CROPS), n)],
+        "temperature": rng.uniform(5, 45, n),
+        "humidity": rng.uniform(10, 100, n),
+        "soil_moisture": rng.integers(0, 100, n),
+        "ph": rng.uniform(4, 9, n),
+    }
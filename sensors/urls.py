@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import all_readings, devices_view, device_detail_view,profile_view,get_alert_objects, get_case, sensor_data_api,dashboard,latest_readings,register_view,login_view,logout_view,analysis_page, sensor_graph_api, sensors_tiles_view
+from .views import all_readings, devices_view, device_detail_view,profile_view,get_alert_objects, get_case, sensor_data_api,sensor_batch_api,reading_status_api,metrics_view,dashboard,latest_readings,register_view,login_view,logout_view,analysis_page, sensor_graph_api, sensors_tiles_view
 
 urlpatterns = [
     path('sensor-data/', sensor_data_api),
+    path('sensor-data/batch/', sensor_batch_api),
+    path('sensor-data/status/<int:reading_id>/', reading_status_api),
+    path('metrics', metrics_view, name='metrics'),
     path('', dashboard, name='dashboard'),
     path('latest/', latest_readings),
     path('login/', login_view, name='login'),
@@ -1,8 +1,6 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
-from .models import SensorReading,UserProfile,Device,CropRecommendation
-from django.core.mail import send_mail
-from twilio.rest import Client
+from .models import SensorReading,UserProfile,Device,CropRecommendation,InferenceJob
 from django.conf import settings
 from django.contrib.auth import login, logout
 from django.shortcuts import render, redirect, get_object_or_404
@@ -11,10 +9,14 @@ from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from .forms import CustomUserCreationForm,EmailOrUsernameLoginForm
 from django.core.files.base import ContentFile
-import threading
+from django.db import IntegrityError, transaction
+import hmac
+import json
+from urllib.parse import urlencode
 from .ai_engine import predict_disease, predict_stress, agrotech_decision
+from . import metrics
 from .forms import UserProfileForm
-from django.core.mail import EmailMultiAlternatives
+from .alerts import dispatch_alert
 
 def register_view(request):
     if request.method == "POST":
@@ -50,77 +52,53 @@ def logout_view(request):
     logout(request)
     return redirect('login')
 
-def send_alert_email(sensor_data, user): 
-    subject = "🚨 IoT ALERT DETECTED" 
-    html_content = f""" 
-    <html> 
-    <body style="font-family: Arial, sans-serif; background-color: #f4f6f8; padding: 20px;"> 
-    <div style="max-width: 600px; margin: auto; background: #ffffff; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 10px rgba(0,0,0,0.1);"> 
-    <!-- Header --> 
-    <div style="background-color: #e63946; color: white; padding: 15px; text-align: center;"> 
-    <h2>🚨 IoT Alert Detected</h2> 
-    </div> <!-- Content --> 
-    <div style="padding: 20px; color: #333;"> 
-    <p><strong>Crop:</strong> {sensor_data.get('crop')}</p> 
-    <hr> 
-    <h3 style="color:#457b9d;">🌡️ Sensor Readings</h3> 
-    <p><strong>Temperature:</strong> {sensor_data.get('temperature')} °C</p> 
-    <p><strong>Humidity:</strong> {sensor_data.get('humidity')} %</p> 
-    <p><strong>Soil Moisture:</strong> {sensor_data.get('soil_moisture')}</p> 
-    <p><strong>pH Level:</strong> {sensor_data.get('ph')}</p> 
-    <hr> 
-    <h3 style="color:#1d3557;">🧪 Analysis</h3> 
-    <p><strong>Disease:</strong> {sensor_data.get('disease')}</p> 
-    <p><strong>Confidence:</strong> {sensor_data.get("confidence"):.2f}</p> 
-    <p><strong>Stress Level:</strong> <span style="color:red; font-weight:bold;"> {sensor_data.get("stress")} </span> </p> 
-    <p><strong>Decision:</strong> {sensor_data.get("decision")}</p> 
-    <hr> 
-    <p><strong>🕒 Time:</strong> {sensor_data.get("timestamp")}</p> 
-    </div> 
-    <!-- Footer --> <div style="background-color: #f1f1f1; text-align: center; padding: 10px; font-size: 12px; color: #777;"> <p>IoT Crop Monitoring System</p> <p>Please take immediate action if required.</p> </div> </div> </body> </html> """
-    text_content = "Alert detected! Please view this email in an HTML-supported client." 
-    email = EmailMultiAlternatives( subject, text_content, settings.EMAIL_HOST_USER, [user.email] ) 
-    email.attach_alternative(html_content, "text/html") 
-    email.send()
-
-def send_alert_sms(sensor_data, user):
-    phone = getattr(user.userprofile, "phone", None)
-    if not phone:
-        return
-
-    client = Client(
-        settings.TWILIO_ACCOUNT_SID,
-        settings.TWILIO_AUTH_TOKEN
-    )
+def analyse_reading(img, temperature, humidity, soil_moisture, ph):
+    # === AI FUSION ===
+    with metrics.timed("iot_ingest_stage_seconds", stage="inference"):
+        crop, disease, confidence = predict_disease(img)
+    print(disease, confidence)
 
-    client.messages.create(
-        body=(
-            f"ALERT! "
-            f"Crop:{sensor_data.get('crop')} "
-            f"Temp:{sensor_data.get('temperature')} "
-            f"Soil:{sensor_data.get('soil_moisture')} "
-            f"pH:{sensor_data.get('ph')}"
-            f"Time:{sensor_data.get('timestamp')}"
-            f"Disease:{sensor_data.get('disease')} "
-            f"Stress:{sensor_data.get('stress')} "
-            f"Confidence:{sensor_data.get('confidence')} "
-            f"Decision:{sensor_data.get('decision')} "
-        ),
-        from_=settings.TWILIO_PHONE_NUMBER,
-        to=phone if phone.startswith("+") else "+91" + phone
-    )
+    with metrics.timed("iot_ingest_stage_seconds", stage="stress"):
+        stress = predict_stress(
+            crop,
+            temperature,
+            humidity,
+            soil_moisture,
+            ph
+        )
+
+    decision = agrotech_decision(disease, stress)
+
+    is_healthy = "healthy" in disease.lower()
+    alert_required = (not is_healthy or stress == "HIGH")
+
+    return {
+        "crop": crop,
+        "disease": disease,
+        "confidence": confidence,
+        "stress": stress,
+        "decision": decision,
+        "alert": alert_required,
+    }
+
+
+def start_alert(analysis, reading):
+    dispatch_alert({
+        "crop": analysis["crop"],
+        "temperature": reading.temperature,
+        "humidity": reading.humidity,
+        "soil_moisture": reading.soil_moisture,
+        "ph": reading.ph,
+        "disease": analysis["disease"],
+        "confidence": analysis["confidence"],
+        "stress": analysis["stress"],
+        "decision": analysis["decision"],
+        "timestamp": reading.sensor_timestamp
+    }, reading.device.owner, reading)
 
-def send_alerts_async(sensor_data, user):
-    try:
-        print("Async alert started")
-        #send_alert_email(sensor_data, user)
-        print("Email sent")
-        #send_alert_sms(sensor_data, user)
-        print("SMS sent")
-    except Exception as e:
-        print("Async alert failed:", e)
 
 @csrf_exempt
+@metrics.timed("iot_ingest_seconds", endpoint="sensor-data")
 def sensor_data_api(request):
 
     if request.method != "POST":
@@ -135,7 +113,8 @@ def sensor_data_api(request):
         if not device_id:
             return JsonResponse({"error": "device_id is required"}, status=400)
 
-        device = Device.objects.select_related("owner").get(device_id=device_id)
+        with metrics.timed("iot_ingest_stage_seconds", stage="device_lookup"):
+            device = Device.objects.select_related("owner").get(device_id=device_id)
 
         # Sensor values
         temperature = float(data.get("temperature", 0))
@@ -151,102 +130,339 @@ def sensor_data_api(request):
         if not image:
             return JsonResponse({"error": "Leaf image is required"}, status=400)
 
-        # Save temporary image for CNN
-        temp_path = f"media/temp/{files.get("image")}_leaf.jpg"
-        with open(temp_path, "wb+") as f:
-            for chunk in image.chunks():
-                f.write(chunk)
+        # Async mode: store the reading now, let the job worker run the CNN
+        mode = data.get("mode") or request.GET.get("mode") or settings.INFERENCE_MODE
+        if mode == "async":
+            reading = SensorReading.objects.create(
+                device=device,
+                temperature=temperature,
+                humidity=humidity,
+                soil_moisture=soil_moisture,
+                ph=ph,
+                sensor_timestamp=sensor_timestamp,
+                image=image,
+                decision="Pending AI analysis"
+            )
+            job = InferenceJob.objects.create(reading=reading)
+            metrics.inc("iot_inference_jobs_total", status="queued")
 
-        # === AI FUSION ===
-        crop, disease, confidence = predict_disease(temp_path)
-        print(disease, confidence)
+            return JsonResponse({
+                "status": "queued",
+                "job_id": job.id,
+                "reading": reading.id,
+                "status_url": f"/sensor-data/status/{reading.id}/?{urlencode({'device_id': device.device_id})}",
+                "timestamp": sensor_timestamp
+            }, status=202)
 
-        stress = predict_stress(
-            crop,
-            temperature,
-            humidity,
-            soil_moisture,
-            ph
-        )
-
-        decision = agrotech_decision(disease, stress)
+        # Read the upload once; the same bytes feed the CNN and storage
+        with metrics.timed("iot_ingest_stage_seconds", stage="read_upload"):
+            content = image.read()
 
-        is_healthy = "healthy" in disease.lower()
-        alert_required = (not is_healthy or stress == "HIGH")
+        analysis = analyse_reading(content, temperature, humidity, soil_moisture, ph)
 
         # Store in DB
-        reading = SensorReading.objects.create(
-            device=device,
-            temperature=temperature,
-            humidity=humidity,
-            soil_moisture=soil_moisture,
-            ph=ph,
-            sensor_timestamp=sensor_timestamp,
-            image=image,
-            disease=disease,
-            stress_level=stress,
-            decision=decision,
-            alert=alert_required,
-            crop=crop
-        )
+        with metrics.timed("iot_ingest_stage_seconds", stage="db_write"):
+            reading = SensorReading.objects.create(
+                device=device,
+                temperature=temperature,
+                humidity=humidity,
+                soil_moisture=soil_moisture,
+                ph=ph,
+                sensor_timestamp=sensor_timestamp,
+                image=ContentFile(content, name=image.name),
+                disease=analysis["disease"],
+                stress_level=analysis["stress"],
+                decision=analysis["decision"],
+                alert=analysis["alert"],
+                crop=analysis["crop"]
+            )
+        metrics.inc("iot_readings_total", source="api", alert=str(analysis["alert"]).lower())
 
         # Send alerts
-        if alert_required:
-            threading.Thread(
-                target=send_alerts_async,
-                args=({
-                    "crop": crop,
-                    "temperature": temperature,
-                    "humidity": humidity,
-                    "soil_moisture": soil_moisture,
-                    "ph": ph,
-                    "disease": disease,
-                    "confidence": confidence,
-                    "stress": stress,
-                    "decision": decision,
-                    "timestamp": sensor_timestamp
-                }, device.owner),
-                daemon=True
-            ).start()
+        if analysis["alert"]:
+            start_alert(analysis, reading)
 
         return JsonResponse({
             "status": "success",
-            "disease": disease,
-            "stress_level": stress,
-            "decision": decision,
+            "disease": analysis["disease"],
+            "stress_level": analysis["stress"],
+            "decision": analysis["decision"],
             "timestamp": sensor_timestamp
         }, status=200)
 
     except Device.DoesNotExist:
+        metrics.inc("iot_ingest_errors_total", endpoint="sensor-data", reason="unknown_device")
         return JsonResponse({"error": "Invalid device_id"}, status=404)
 
     except Exception as e:
+        metrics.inc("iot_ingest_errors_total", endpoint="sensor-data", reason=type(e).__name__)
         return JsonResponse({"status": "error", "message": str(e)}, status=400)
 
+
+def reading_status_api(request, reading_id):
+    # Visible to the device owner, or to the device that posted it (by the
+    # same device_id it posts with); anyone else gets a 404
+    readings = SensorReading.objects.select_related("inference_job")
+    if request.user.is_authenticated:
+        readings = readings.filter(device__owner=request.user)
+    elif request.GET.get("device_id"):
+        readings = readings.filter(device__device_id=request.GET["device_id"])
+    else:
+        readings = readings.none()
+
+    try:
+        r = readings.get(id=reading_id)
+    except SensorReading.DoesNotExist:
+        return JsonResponse({"error": "Reading not found"}, status=404)
+
+    job = getattr(r, "inference_job", None)
+    status = job.status if job else InferenceJob.DONE
+
+    data = {
+        "id": r.id,
+        "status": status,
+        "attempts": job.attempts if job else 0,
+    }
+    if status == InferenceJob.DONE:
+        data.update({
+            "crop": r.crop,
+            "disease": r.disease,
+            "confidence": job.confidence if job else None,
+            "stress_level": r.stress_level,
+            "decision": r.decision,
+            "alert": r.alert,
+        })
+    elif status == InferenceJob.FAILED:
+        data["error"] = job.error
+
+    return JsonResponse(data)
+
+
+# ---- Batch ingestion ----
+def parse_batch_payload(request):
+    # JSON array / {"readings": [...]}, NDJSON, or multipart with a
+    # "readings" JSON field plus one file part per image
+    content_type = request.content_type or ""
+
+    if content_type.startswith("multipart/"):
+        items = json.loads(request.POST.get("readings", "[]"))
+        files = request.FILES
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        items = [
+            json.loads(line)
+            for line in request.body.decode("utf-8").splitlines()
+            if line.strip()
+        ]
+        files = {}
+    else:
+        items = json.loads(request.body or b"[]")
+        files = {}
+
+    if isinstance(items, dict):
+        items = items.get("readings", [])
+    if not isinstance(items, list):
+        raise ValueError("readings must be a list")
+
+    return items, files
+
+
+def build_batch_reading(index, item, devices, files):
+    device_id = item.get("device_id")
+    if not device_id:
+        raise ValueError("device_id is required")
+
+    device = devices.get(str(device_id))
+    if device is None:
+        raise LookupError("Invalid device_id")
+
+    temperature = float(item.get("temperature", 0))
+    humidity = float(item.get("humidity", 0))
+    soil_moisture = int(item.get("soil_moisture", 0))
+    ph = float(item.get("ph", 7))
+    sensor_timestamp = parse_datetime(item["timestamp"]) if item.get("timestamp") else None
+
+    # Image part is named by the item, or defaults to image_<index>
+    image = files.get(item.get("image") or f"image_{index}")
+
+    reading = SensorReading(
+        reading_id=item.get("reading_id"),
+        device=device,
+        owner_id=device.owner_id,   # bulk_create skips save()
+        temperature=temperature,
+        humidity=humidity,
+        soil_moisture=soil_moisture,
+        ph=ph,
+        sensor_timestamp=sensor_timestamp,
+    )
+
+    if image:
+        content = image.read()
+        analysis = analyse_reading(content, temperature, humidity, soil_moisture, ph)
+        reading.image = ContentFile(content, name=image.name)
+        reading.disease = analysis["disease"]
+        reading.decision = analysis["decision"]
+    else:
+        # No leaf image: only the environmental side can be scored
+        crop = item.get("crop", "Unknown")
+        stress = predict_stress(crop, temperature, humidity, soil_moisture, ph)
+        analysis = {
+            "crop": crop,
+            "disease": reading.disease,
+            "confidence": 0.0,
+            "stress": stress,
+            "decision": reading.decision,
+            "alert": stress == "HIGH",
+        }
+
+    reading.crop = analysis["crop"]
+    reading.stress_level = analysis["stress"]
+    reading.alert = analysis["alert"]
+
+    return reading, analysis
+
+
+@csrf_exempt
+@metrics.timed("iot_ingest_seconds", endpoint="sensor-data-batch")
+def sensor_batch_api(request):
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    try:
+        items, files = parse_batch_payload(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({"status": "error", "message": f"Invalid batch: {e}"}, status=400)
+
+    if not items:
+        return JsonResponse({"error": "readings are required"}, status=400)
+
+    max_items = getattr(settings, "SENSOR_BATCH_MAX_ITEMS", 500)
+    if len(items) > max_items:
+        return JsonResponse({"error": f"Batch limited to {max_items} readings"}, status=413)
+
+    # Resolve every device in one query
+    device_ids = {
+        str(item.get("device_id"))
+        for item in items
+        if isinstance(item, dict) and item.get("device_id")
+    }
+    devices = {
+        d.device_id: d
+        for d in Device.objects.select_related("owner").filter(device_id__in=device_ids)
+    }
+
+    # reading_id is unique: repeats of a stored reading, or within the
+    # batch, are rejected before the CNN runs on them
+    known = set(
+        SensorReading.objects
+        .filter(reading_id__in=[str(item["reading_id"]) for item in items if isinstance(item, dict) and item.get("reading_id")])
+        .values_list("reading_id", flat=True)
+    )
+
+    results = []
+    pending = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("reading must be an object")
+            if item.get("reading_id") and str(item["reading_id"]) in known:
+                results.append({"index": index, "status": "error", "code": 409, "message": "Duplicate reading_id"})
+                continue
+            reading, analysis = build_batch_reading(index, item, devices, files)
+        except LookupError as e:
+            results.append({"index": index, "status": "error", "code": 404, "message": str(e)})
+            continue
+        except Exception as e:
+            results.append({"index": index, "status": "error", "code": 400, "message": str(e)})
+            continue
+
+        if reading.reading_id:
+            known.add(str(reading.reading_id))
+        pending.append((index, reading, analysis))
+        results.append(None)
+
+    # Store in DB
+    with metrics.timed("iot_ingest_stage_seconds", stage="batch_db_write"):
+        try:
+            with transaction.atomic():
+                SensorReading.objects.bulk_create([reading for _, reading, _ in pending])
+        except IntegrityError:
+            # Another request stored one of these reading_ids after the check
+            # above: save one by one so only the duplicates are refused
+            stored = []
+            for index, reading, analysis in pending:
+                reading.pk = None
+                reading._state.adding = True
+                try:
+                    with transaction.atomic():
+                        reading.save()
+                except IntegrityError:
+                    results[index] = {"index": index, "status": "error", "code": 409, "message": "Duplicate reading_id"}
+                    continue
+                stored.append((index, reading, analysis))
+            pending = stored
+    created = [reading for _, reading, _ in pending]
+    alerts = sum(1 for saved in created if saved.alert)
+    metrics.inc("iot_readings_total", alerts, source="batch", alert="true")
+    metrics.inc("iot_readings_total", len(created) - alerts, source="batch", alert="false")
+    if len(items) > len(created):
+        metrics.inc("iot_ingest_errors_total", len(items) - len(created), endpoint="sensor-data-batch", reason="invalid_item")
+
+    for index, saved, analysis in pending:
+        results[index] = {
+            "index": index,
+            "status": "created",
+            "id": saved.pk,
+            "reading_id": saved.reading_id,
+            "disease": saved.disease,
+            "stress_level": saved.stress_level,
+            "decision": saved.decision,
+            "alert": saved.alert,
+        }
+        if saved.alert:
+            start_alert(analysis, saved)
+
+    return JsonResponse({
+        "status": "success",
+        "created": len(created),
+        "failed": len(items) - len(created),
+        "results": results,
+    }, status=200)
+
+
+def metrics_view(request):
+    # Prometheus scrape target; per process, so scrape each worker. Only
+    # served to callers with METRICS_TOKEN, not to the public
+    if not settings.METRICS_ENABLED or not settings.METRICS_TOKEN:
+        raise Http404
+    expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+        response = HttpResponse("Unauthorized", status=401)
+        response["WWW-Authenticate"] = "Bearer"
+        return response
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @login_required
 def dashboard(request):
-    # get devices owned by logged-in user
-    user_devices = Device.objects.filter(owner=request.user)
-
-    # get latest readings ONLY from user's devices
+    # get latest readings ONLY from user's devices; filtering on the
+    # reading's own owner reads them newest first off one index
     readings = (
-        SensorReading.objects.filter(device__in=user_devices).order_by('-created_at')[:5]
+        SensorReading.objects.filter(owner=request.user).order_by('-created_at')[:5]
     )
 
     return render(request, 'dashboard.html', {'readings': readings})
 def all_readings(request):
-    user_devices = Device.objects.filter(owner=request.user)
     readings = (
-        SensorReading.objects.filter(device__in=user_devices).order_by('-created_at')
+        SensorReading.objects.filter(owner=request.user).order_by('-created_at')
     )
     return render(request, "all_readings.html",{'readings': readings})
 @login_required
 def latest_readings(request):
-    user_devices = Device.objects.filter(owner=request.user)
-
     readings = (
         SensorReading.objects
-        .filter(device__in=user_devices)
+        .select_related("device")
+        .filter(owner=request.user)
         .order_by("-created_at")[:5]
     )
 
@@ -328,14 +544,12 @@ def get_case(request, reading_id):
     except SensorReading.DoesNotExist:
         return JsonResponse({"error": "Case not found"}, status=404)
 def get_alert_objects(request):
-    devices = Device.objects.filter(owner=request.user)
-    readings = SensorReading.objects.filter(alert=True, device__in=devices)
+    readings = SensorReading.objects.filter(alert=True, device__owner=request.user)
     return render(request, 'alerts.html', {'readings': readings})
 
 def sensors_tiles_view(request):
     # Get latest sensor reading
-    devices = Device.objects.filter(owner=request.user)
-    reading = SensorReading.objects.filter(device__in=devices).order_by("-created_at").first()
+    reading = SensorReading.objects.filter(owner=request.user).order_by("-created_at").first()
 
     return render(request, "sensors.html", {"reading": reading})
 
@@ -345,7 +559,7 @@ def sensor_graph_api(request):
 
     qs = (
         SensorReading.objects
-        .filter(device__owner=request.user)
+        .filter(owner=request.user)
         .select_related("device")
         .order_by("created_at")
     )
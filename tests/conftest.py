@@ -19,4 +19,29 @@ def reading(device):
         humidity=60,
         soil_moisture=1,
         ph=7
-    )
\ No newline at end of file
+    )
+
+@pytest.fixture
+def ack_journal(tmp_path, settings, monkeypatch):
+    # Worker tests get their own ack journal, a fresh AckBuffer, and keep
+    # the images they store out of the real MEDIA_ROOT
+    settings.COLLECTOR_ACK_JOURNAL = str(tmp_path / "acks.journal")
+    settings.MEDIA_ROOT = tmp_path
+    monkeypatch.setattr("wroker.acks", None)
+
+@pytest.fixture
+def collector_item():
+    def make(reading_id, **kwargs):
+        item = {
+            "reading_id": reading_id,
+            "device_id": "1",
+            "temperature": 25,
+            "humidity": 60,
+            "soil_moisture": 1,
+            "ph": 7,
+            "timestamp": "2025-01-01T10:00:00Z",
+            "image_url": f"http://fake.com/{reading_id}.jpg"
+        }
+        item.update(kwargs)
+        return item
+    return make
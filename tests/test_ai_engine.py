@@ -0,0 +1,287 @@
+import io
+from pathlib import Path
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+from PIL import Image
+from django.core.exceptions import ImproperlyConfigured
+from sensors.ai_engine import load_image, load_pth_runner, BatchingPredictor
+
+def make_jpeg(size=(64, 48), color=(30, 160, 40)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("wrap", [
+    lambda data, path: data,
+    lambda data, path: io.BytesIO(data),
+    lambda data, path: str(path),
+    lambda data, path: Image.open(io.BytesIO(data)).convert("L"),
+])
+def test_load_image_sources(wrap, tmp_path):
+    data = make_jpeg()
+    path = tmp_path / "leaf.jpg"
+    path.write_bytes(data)
+
+    img = load_image(wrap(data, path))
+
+    assert img.mode == "RGB"
+    assert img.size == (64, 48)
+
+
+def test_load_image_rewinds_file_objects():
+    f = io.BytesIO(make_jpeg())
+    f.read()
+
+    assert load_image(f).size == (64, 48)
+
+
+def test_batching_predictor_groups_concurrent_requests():
+    calls = []
+
+    def predict_batch(items):
+        calls.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = BatchingPredictor(predict_batch, window_ms=50, max_batch=8)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(batcher.predict, range(16)))
+
+    assert results == [i * 2 for i in range(16)]
+    assert sum(calls) == 16
+    assert len(calls) < 16
+    assert max(calls) <= 8
+
+    stats = batcher.stats()
+    assert stats["items"] == 16
+    assert stats["batches"] == len(calls)
+    assert stats["queue_wait_ms"]["max"] >= stats["queue_wait_ms"]["p50"]
+
+
+def test_batching_predictor_propagates_errors():
+    def predict_batch(items):
+        raise RuntimeError("model failed")
+
+    batcher = BatchingPredictor(predict_batch, window_ms=1)
+
+    with pytest.raises(RuntimeError):
+        batcher.predict("leaf", timeout=5)
+
+
+def test_corrupt_image_fails_only_its_own_batched_request(monkeypatch, settings):
+    import torch
+    from sensors import ai_engine
+
+    forward = MagicMock(side_effect=lambda batch: torch.zeros(len(batch), len(ai_engine.PTH_CLASS_NAMES)))
+    monkeypatch.setattr(ai_engine, "get_pth_runner", lambda backend=None: forward)
+    monkeypatch.setattr(ai_engine, "batcher", None)
+    settings.AI_BATCH_WINDOW_MS = 50
+
+    def predict(img):
+        try:
+            return ai_engine.predict_disease_pth(img)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        good, corrupt, other = pool.map(predict, [make_jpeg(), b"not a jpeg", make_jpeg()])
+
+    assert isinstance(corrupt, Exception)
+    assert good == other == ai_engine.pth_label(0, 1 / len(ai_engine.PTH_CLASS_NAMES))
+    assert sum(len(call.args[0]) for call in forward.call_args_list) == 2
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ImproperlyConfigured):
+        load_pth_runner("tensorrt")
+
+
+def test_int8_backend_requires_passing_accuracy_gate(tmp_path, monkeypatch):
+    from sensors import ai_engine
+
+    manifest = tmp_path / "int8.json"
+    monkeypatch.setattr(ai_engine, "QUANTIZED_MANIFEST_PATH", str(manifest))
+
+    with pytest.raises(ImproperlyConfigured):
+        load_pth_runner("int8")
+
+    manifest.write_text('{"enabled": false, "agreement": 0.91}')
+    with pytest.raises(ImproperlyConfigured):
+        load_pth_runner("int8")
+
+
+def test_interrupted_export_keeps_the_previous_artifact(tmp_path):
+    from sensors.ai_engine import write_artifact
+
+    path = tmp_path / "model.ts"
+    path.write_bytes(b"old model")
+
+    def crash(tmp):
+        with open(tmp, "wb") as f:
+            f.write(b"half a model")
+        raise RuntimeError("killed mid-export")
+
+    with pytest.raises(RuntimeError):
+        write_artifact(str(path), crash)
+
+    assert path.read_bytes() == b"old model"
+    assert [p.name for p in tmp_path.iterdir()] == ["model.ts"]
+
+    write_artifact(str(path), lambda tmp: Path(tmp).write_bytes(b"new model"))
+    assert path.read_bytes() == b"new model"
+
+
+@pytest.fixture
+def fallback(monkeypatch):
+    from collections import Counter
+    from sensors import ai_engine
+
+    monkeypatch.setattr(ai_engine, "fallback_counters", Counter())
+    monkeypatch.setattr(ai_engine, "fallback_executor", None)
+    monkeypatch.setattr(ai_engine, "fallback_slots", None)
+    return ai_engine
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "speculative"])
+def test_fallback_replaces_low_confidence_result(fallback, monkeypatch, settings, strategy):
+    settings.AI_FALLBACK_STRATEGY = strategy
+    monkeypatch.setattr(fallback, "predict_disease_pth", lambda img: ("Tomato", "Early blight", 40.0))
+    monkeypatch.setattr(fallback, "predict_disease_keras", lambda img: ("Tomato", "Late blight", 85.0))
+
+    assert fallback.run_disease_models("leaf") == ("Tomato", "Late blight", 85.0)
+
+    stats = fallback.get_fallback_stats()
+    assert stats["fired"] == 1
+    assert stats["changed"] == 1
+
+
+def test_fallback_budget_returns_primary(fallback, monkeypatch, settings):
+    import time
+
+    settings.AI_FALLBACK_STRATEGY = "sequential"
+    settings.AI_FALLBACK_BUDGET_MS = 20
+    monkeypatch.setattr(fallback, "predict_disease_pth", lambda img: ("Tomato", "Early blight", 40.0))
+    monkeypatch.setattr(fallback, "predict_disease_keras", lambda img: time.sleep(0.5) or ("Tomato", "Late blight", 85.0))
+
+    assert fallback.run_disease_models("leaf") == ("Tomato", "Early blight", 40.0)
+    assert fallback.get_fallback_stats()["timeouts"] == 1
+
+
+def test_saturated_fallback_pool_returns_primary(fallback, monkeypatch, settings):
+    import threading
+
+    settings.AI_FALLBACK_STRATEGY = "sequential"
+    settings.AI_FALLBACK_BUDGET_MS = 20
+    settings.AI_FALLBACK_WORKERS = 1
+    settings.AI_FALLBACK_MAX_PENDING = 1
+    release = threading.Event()
+    calls = []
+    monkeypatch.setattr(fallback, "predict_disease_pth", lambda img: ("Tomato", "Early blight", 40.0))
+    monkeypatch.setattr(fallback, "predict_disease_keras", lambda img: calls.append(img) or release.wait(5) and ("Tomato", "Late blight", 85.0))
+
+    try:
+        assert fallback.run_disease_models("a") == ("Tomato", "Early blight", 40.0)
+        # The timed-out run still holds the only slot: nothing else is queued
+        assert fallback.run_disease_models("b") == ("Tomato", "Early blight", 40.0)
+    finally:
+        release.set()
+
+    stats = fallback.get_fallback_stats()
+    assert (stats["timeouts"], stats["saturated"]) == (1, 1)
+    assert calls == ["a"]
+
+
+def test_speculative_fallback_cancelled_when_primary_fails(fallback, monkeypatch, settings):
+    settings.AI_FALLBACK_STRATEGY = "speculative"
+    future = MagicMock()
+    monkeypatch.setattr(fallback, "submit_fallback", lambda img: future)
+
+    def broken(img):
+        raise RuntimeError("bad tensor")
+    monkeypatch.setattr(fallback, "predict_disease_pth", broken)
+
+    with pytest.raises(RuntimeError):
+        fallback.run_disease_models("leaf")
+    future.cancel.assert_called_once()
+
+
+def test_fallback_errors_are_counted(fallback, monkeypatch, settings):
+    settings.AI_FALLBACK_STRATEGY = "sequential"
+
+    def broken(img):
+        raise OSError("model file missing")
+
+    monkeypatch.setattr(fallback, "predict_disease_pth", lambda img: ("Tomato", "Early blight", 40.0))
+    monkeypatch.setattr(fallback, "predict_disease_keras", broken)
+
+    assert fallback.run_disease_models("leaf") == ("Tomato", "Early blight", 40.0)
+    assert fallback.get_fallback_stats()["errors"] == 1
+
+
+def test_confident_primary_skips_fallback(fallback, monkeypatch, settings):
+    settings.AI_FALLBACK_STRATEGY = "sequential"
+    monkeypatch.setattr(fallback, "predict_disease_pth", lambda img: ("Corn", "Common rust", 95.0))
+    monkeypatch.setattr(fallback, "predict_disease_keras", lambda img: pytest.fail("fallback should not run"))
+
+    assert fallback.run_disease_models("leaf") == ("Corn", "Common rust", 95.0)
+    assert fallback.get_fallback_stats()["fallback_rate"] == 0.0
+
+
+def test_predict_stress_batch_matches_scalar():
+    import numpy as np
+    from sensors.ai_engine import predict_stress, predict_stress_batch
+
+    rng = np.random.default_rng(0)
+    n = 2000
+    crops = rng.choice(["Tomato", " apple ", "corn", "grape", "Banana", "Unknown"], n)
+    temp = rng.uniform(5, 45, n)
+    humidity = rng.uniform(20, 100, n)
+    moisture = rng.integers(0, 100, n)
+    ph = rng.uniform(3.5, 9, n)
+
+    labels, breach = predict_stress_batch(crops, temp, humidity, moisture, ph)
+
+    expected = [predict_stress(*row) for row in zip(crops, temp, humidity, moisture, ph)]
+    assert list(labels) == expected
+    assert breach.shape == (n, 4)
+    assert not breach[labels == "UNKNOWN"].any()
+    assert set(expected) == {"LOW", "MEDIUM", "HIGH", "UNKNOWN"}
+
+
+def test_predict_stress_batch_broadcasts_single_crop():
+    from sensors.ai_engine import predict_stress_batch
+
+    # second row: temperature (weight 2) and pH (weight 1) out of range
+    labels, breach = predict_stress_batch("tomato", [25, 60], 70, 60, [6.5, 8.0])
+
+    assert list(labels) == ["LOW", "MEDIUM"]
+    assert breach.tolist() == [[False, False, False, False], [True, False, False, True]]
+
+
+def test_preprocess_pth_matches_torchvision_transform():
+    import numpy as np
+    from sensors.ai_engine import get_pth_transform, preprocess_pth
+
+    # Noise, so resize interpolation and per-channel normalisation are
+    # actually exercised (a flat colour resizes to itself)
+    pixels = np.random.default_rng(0).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG")
+    img = load_image(buf.getvalue())
+
+    expected = get_pth_transform()(img).numpy()
+
+    assert np.allclose(preprocess_pth(img), expected, atol=1e-5)
+
+
+def test_draft_decode_scales_large_jpegs():
+    data = make_jpeg(size=(2000, 1500))
+
+    assert load_image(data).size == (2000, 1500)
+
+    small = load_image(data, draft=True)
+    # 1/4 scale: the smallest DCT scale still >= 224px on both sides
+    assert small.size == (500, 375)
+    assert small.mode == "RGB"
@@ -0,0 +1,230 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+from sensors import alerts
+from sensors.alerts import AlertDispatcher, deliver_by_id, dispatch_alert, flush_digests, process_alert_outbox
+from sensors.models import AlertDelivery, UserProfile
+
+ALERT = {"crop": "Tomato", "disease": "Tomato___Late_blight", "confidence": 91.5, "stress": "HIGH"}
+
+
+@pytest.fixture
+def alert_settings(settings):
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    settings.ALERT_EMAIL_ENABLED = True
+    settings.ALERT_SMS_ENABLED = True
+    settings.ALERT_WORKERS = 0
+    settings.ALERT_MAX_ATTEMPTS = 2
+    settings.ALERT_RETRY_BASE = 0
+    settings.ALERT_SUPPRESS_SECONDS = 0
+    settings.ALERT_RATE_LIMIT = 0
+    settings.ALERT_DIGEST_SIZE = 0
+    return settings
+
+
+@pytest.fixture
+def recipient(user):
+    user.email = "farmer@example.com"
+    user.save()
+    UserProfile.objects.create(user=user, phone="9876543210")
+    return user
+
+
+@pytest.mark.django_db
+def test_no_outbox_rows_when_channels_are_off(settings, recipient):
+    settings.ALERT_EMAIL_ENABLED = False
+    settings.ALERT_SMS_ENABLED = False
+
+    assert dispatch_alert(ALERT, recipient) == []
+    assert not AlertDelivery.objects.exists()
+
+
+@pytest.mark.django_db
+def test_outbox_sends_email_and_sms(alert_settings, recipient, reading):
+    sms = MagicMock()
+    with patch("sensors.alerts.sms_client", return_value=sms):
+        ids = dispatch_alert(ALERT, recipient, reading)
+        assert process_alert_outbox() == 2
+
+    assert len(ids) == 2
+    assert set(AlertDelivery.objects.values_list("status", flat=True)) == {AlertDelivery.SENT}
+    assert mail.outbox[0].to == ["farmer@example.com"]
+    assert sms.messages.create.call_args.kwargs["to"] == "+919876543210"
+
+
+@pytest.mark.django_db
+def test_failed_send_is_retried_then_given_up(alert_settings, recipient):
+    alert_settings.ALERT_SMS_ENABLED = False
+    [delivery_id] = dispatch_alert(ALERT, recipient)
+
+    with patch("sensors.alerts.send_alert_email", side_effect=OSError("smtp down")):
+        deliver_by_id(delivery_id)
+        delivery = AlertDelivery.objects.get(id=delivery_id)
+        assert (delivery.status, delivery.attempts) == (AlertDelivery.PENDING, 1)
+
+        deliver_by_id(delivery_id)
+
+    delivery = AlertDelivery.objects.get(id=delivery_id)
+    assert (delivery.status, delivery.attempts) == (AlertDelivery.FAILED, 2)
+    assert delivery.last_error == "smtp down"
+
+
+@pytest.mark.django_db
+def test_delivery_is_claimed_once(alert_settings, recipient):
+    alert_settings.ALERT_SMS_ENABLED = False
+    [delivery_id] = dispatch_alert(ALERT, recipient)
+
+    deliver_by_id(delivery_id)
+    deliver_by_id(delivery_id)
+
+    assert len(mail.outbox) == 1
+    assert AlertDelivery.objects.get(id=delivery_id).attempts == 1
+
+
+@pytest.mark.django_db
+def test_full_queue_drops_or_defers(alert_settings, recipient):
+    alert_settings.ALERT_SMS_ENABLED = False
+    first, second = dispatch_alert(ALERT, recipient) + dispatch_alert(ALERT, recipient)
+
+    dropping = AlertDispatcher(workers=0, queue_size=1, policy="drop")
+    assert dropping.submit(first) is True
+    assert dropping.submit(second) is False
+    assert AlertDelivery.objects.get(id=second).status == AlertDelivery.DROPPED
+
+    deferring = AlertDispatcher(workers=0, queue_size=1, policy="defer")
+    deferring.submit(second)
+    assert deferring.submit(first) is False
+    assert AlertDelivery.objects.get(id=first).status == AlertDelivery.PENDING
+
+
+@pytest.mark.django_db(transaction=True)
+def test_dispatcher_threads_send_after_commit(alert_settings, recipient):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_WORKERS = 1
+    alerts.dispatcher = None
+    try:
+        # In-memory SQLite can't take writes from two threads at once, so
+        # the sender only starts once both rows are committed
+        with transaction.atomic():
+            ids = dispatch_alert(ALERT, recipient) + dispatch_alert(ALERT, recipient)
+            assert alerts.dispatcher.queue.qsize() == 0
+        alerts.dispatcher.stop()
+    finally:
+        alerts.dispatcher = None
+
+    assert AlertDelivery.objects.filter(id__in=ids, status=AlertDelivery.SENT).count() == 2
+    assert len(mail.outbox) == 2
+
+
+@pytest.mark.django_db
+def test_repeats_of_an_incident_are_coalesced(alert_settings, recipient, reading):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_SUPPRESS_SECONDS = 900
+
+    first = dispatch_alert(ALERT, recipient, reading)
+    for _ in range(4):
+        assert dispatch_alert(ALERT, recipient, reading) == []
+    other = dispatch_alert(dict(ALERT, stress="LOW"), recipient, reading)
+
+    assert len(first) == len(other) == 1
+    assert AlertDelivery.objects.get(id=first[0]).occurrences == 5
+
+    # A new incident once the window has passed
+    AlertDelivery.objects.update(created_at=timezone.now() - timedelta(seconds=901))
+    assert len(dispatch_alert(ALERT, recipient, reading)) == 1
+
+
+@pytest.mark.django_db
+def test_rate_limit_per_user_and_channel(alert_settings, recipient, reading):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_RATE_LIMIT = 2
+
+    sent = [dispatch_alert(dict(ALERT, disease=f"d{i}"), recipient, reading) for i in range(4)]
+
+    assert [len(ids) for ids in sent] == [1, 1, 0, 0]
+    dropped = AlertDelivery.objects.filter(status=AlertDelivery.DROPPED)
+    assert dropped.count() == 2
+    assert {d.last_error for d in dropped} == {"Rate limited"}
+
+
+@pytest.mark.django_db
+def test_undelivered_alerts_do_not_silence_repeats(alert_settings, recipient, reading):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_SUPPRESS_SECONDS = 900
+    alert_settings.ALERT_RATE_LIMIT = 1
+
+    dispatch_alert(dict(ALERT, disease="other"), recipient, reading)
+    assert dispatch_alert(ALERT, recipient, reading) == []
+    assert AlertDelivery.objects.get(payload__disease=ALERT["disease"]).status == AlertDelivery.DROPPED
+
+    # Once the rate limit has room again the incident is alerted after all
+    AlertDelivery.objects.filter(payload__disease="other").update(
+        created_at=timezone.now() - timedelta(seconds=alert_settings.ALERT_RATE_WINDOW + 1)
+    )
+    assert len(dispatch_alert(ALERT, recipient, reading)) == 1
+
+
+@pytest.mark.django_db
+def test_failed_digest_does_not_silence_repeats(alert_settings, recipient, reading):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_SUPPRESS_SECONDS = 900
+    alert_settings.ALERT_DIGEST_SIZE = 1
+
+    [digest_id] = dispatch_alert(ALERT, recipient, reading)
+    with patch("sensors.alerts.send_alert_digest", side_effect=OSError("smtp down")):
+        deliver_by_id(digest_id)
+        deliver_by_id(digest_id)
+
+    assert AlertDelivery.objects.get(incident_key__contains=ALERT["disease"]).status == AlertDelivery.FAILED
+    assert len(dispatch_alert(ALERT, recipient, reading)) == 1
+
+
+@pytest.mark.django_db
+def test_digest_batches_emails(alert_settings, recipient, reading):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_DIGEST_SIZE = 3
+
+    assert dispatch_alert(dict(ALERT, disease="a"), recipient, reading) == []
+    assert dispatch_alert(dict(ALERT, disease="b"), recipient, reading) == []
+    [digest_id] = dispatch_alert(dict(ALERT, disease="c"), recipient, reading)
+
+    assert process_alert_outbox() == 1
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].subject == "🚨 3 IoT alerts detected"
+    assert AlertDelivery.objects.filter(status=AlertDelivery.MERGED).count() == 3
+    assert [a["disease"] for a in AlertDelivery.objects.get(id=digest_id).payload["alerts"]] == ["a", "b", "c"]
+
+
+@pytest.mark.django_db
+def test_small_digest_goes_out_after_waiting(alert_settings, recipient, reading):
+    alert_settings.ALERT_SMS_ENABLED = False
+    alert_settings.ALERT_DIGEST_SIZE = 10
+
+    dispatch_alert(ALERT, recipient, reading)
+    assert flush_digests() == []
+
+    AlertDelivery.objects.update(created_at=timezone.now() - timedelta(seconds=alert_settings.ALERT_DIGEST_SECONDS))
+    assert process_alert_outbox() == 1
+    assert "x1" in mail.outbox[0].body
+
+
+@pytest.mark.django_db
+def test_sweep_queues_deferred_and_due_retries(alert_settings, recipient):
+    alert_settings.ALERT_SMS_ENABLED = False
+    deferred, retry, later = dispatch_alert(ALERT, recipient) + dispatch_alert(ALERT, recipient) + dispatch_alert(ALERT, recipient)
+    AlertDelivery.objects.filter(id=retry).update(attempts=1, next_attempt_at=timezone.now() - timedelta(seconds=1))
+    AlertDelivery.objects.filter(id=later).update(attempts=1, next_attempt_at=timezone.now() + timedelta(minutes=5))
+    # Left "sending" by a process that died mid-send
+    stuck = dispatch_alert(ALERT, recipient)[0]
+    AlertDelivery.objects.filter(id=stuck).update(status=AlertDelivery.SENDING)
+    AlertDelivery.objects.filter(id=stuck).update(updated_at=timezone.now() - timedelta(seconds=alert_settings.ALERT_SEND_TIMEOUT + 1))
+
+    sender = AlertDispatcher(workers=0, queue_size=10)
+    assert sender.sweep() == 3
+    assert sorted(sender.queue.get_nowait() for _ in range(3)) == sorted([deferred, retry, stuck])
+
+    # Nothing is lost when the queue is full; the next sweep takes the rest
+    assert AlertDispatcher(workers=0, queue_size=1).sweep() == 1
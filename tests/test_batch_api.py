@@ -0,0 +1,76 @@
+import json
+import pytest
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from sensors.models import SensorReading
+
+@pytest.mark.django_db
+def test_batch_json_creates_readings(client, device):
+    payload = [
+        {"device_id": "1", "reading_id": "r1", "temperature": 25, "humidity": 60, "soil_moisture": 40, "ph": 6.5, "crop": "tomato"},
+        {"device_id": "1", "reading_id": "r2", "temperature": 26, "humidity": 61, "soil_moisture": 41, "ph": 6.6},
+        {"device_id": "missing", "temperature": 20},
+        {"temperature": 20},
+    ]
+
+    response = client.post("/sensor-data/batch/", data=json.dumps(payload), content_type="application/json")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2
+    assert [r["status"] for r in body["results"]] == ["created", "created", "error", "error"]
+    assert body["results"][2]["code"] == 404
+    assert SensorReading.objects.filter(reading_id__in=["r1", "r2"]).count() == 2
+
+
+@pytest.mark.django_db
+def test_batch_ndjson(client, device):
+    lines = "\n".join(json.dumps({"device_id": "1", "reading_id": f"n{i}"}) for i in range(3))
+
+    response = client.post("/sensor-data/batch/", data=lines, content_type="application/x-ndjson")
+
+    assert response.status_code == 200
+    assert response.json()["created"] == 3
+
+
+@pytest.mark.django_db
+@patch("sensors.views.predict_disease")
+def test_batch_multipart_with_images(mock_disease, client, device, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    mock_disease.return_value = ("Tomato", "Late blight", 91.0)
+
+    response = client.post("/sensor-data/batch/", data={
+        "readings": json.dumps([
+            {"device_id": "1", "reading_id": "m0"},
+            {"device_id": "1", "reading_id": "m1", "image": "leaf"},
+        ]),
+        "image_0": SimpleUploadedFile("a.jpg", b"img", content_type="image/jpeg"),
+        "leaf": SimpleUploadedFile("b.jpg", b"img", content_type="image/jpeg"),
+    })
+
+    assert response.status_code == 200
+    assert response.json()["created"] == 2
+    assert mock_disease.call_count == 2
+    assert SensorReading.objects.get(reading_id="m1").disease == "Late blight"
+
+
+@pytest.mark.django_db
+def test_batch_reading_stored_concurrently_is_a_409(client, device):
+    from sensors import views
+
+    build = views.build_batch_reading
+
+    def build_while_another_request_stores_r2(index, item, devices, files):
+        if index == 0:
+            SensorReading.objects.create(device=device, reading_id="r2")
+        return build(index, item, devices, files)
+
+    payload = [{"device_id": "1", "reading_id": "r1"}, {"device_id": "1", "reading_id": "r2"}]
+    with patch("sensors.views.build_batch_reading", build_while_another_request_stores_r2):
+        response = client.post("/sensor-data/batch/", data=json.dumps(payload), content_type="application/json")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["created"], body["failed"]) == (1, 1)
+    assert [r.get("code") for r in body["results"]] == [None, 409]
+    assert SensorReading.objects.filter(reading_id="r1").exists()
@@ -0,0 +1,41 @@
+import json
+import pytest
+from unittest.mock import patch
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+def run(tmp_path, name, **kwargs):
+    output = tmp_path / name
+    call_command("benchmark", output=str(output), runs=4, **kwargs)
+    return json.loads(output.read_text())
+
+
+def test_stress_suite_writes_json(tmp_path):
+    report = run(tmp_path, "stress.json", suites="stress", rows=500, images=1)
+
+    assert report["meta"]["seed"] == 0
+    names = [r["name"] for r in report["results"]]
+    assert names == ["scalar", "vectorized"]
+    assert all(r["throughput_per_s"] > 0 for r in report["results"])
+
+
+@pytest.mark.django_db
+@patch("sensors.views.predict_disease")
+def test_http_suite(mock_disease, tmp_path, settings):
+    mock_disease.return_value = ("Tomato", "Tomato___healthy", 97.0)
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+
+    report = run(tmp_path, "http.json", suites="http", images=2, requests=3, seed_readings=20, use_current_db=True)
+
+    assert [r["name"] for r in report["results"]] == ["sensor_data_async", "sensor_data_sync", "latest"]
+
+
+def test_compare_flags_regression(tmp_path):
+    baseline = run(tmp_path, "base.json", suites="stress", rows=500, images=1)
+    for r in baseline["results"]:
+        r["throughput_per_s"] *= 1000
+    (tmp_path / "base.json").write_text(json.dumps(baseline))
+
+    with pytest.raises(CommandError, match="regressed"):
+        run(tmp_path, "new.json", suites="stress", rows=500, images=1,
+            compare=str(tmp_path / "base.json"), fail_on_regression=True)
@@ -0,0 +1,204 @@
+import json
+import threading
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sensors.collector import AckBuffer, CollectorClient, PollScheduler
+
+class FlakyCollector(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = 0
+    hits = []
+    peers = set()
+
+    def reply(self, status, body=b"{}"):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        FlakyCollector.hits.append(self.path)
+        FlakyCollector.peers.add(self.client_address)
+        if self.path == "/get-unprocessed/" and FlakyCollector.failures:
+            FlakyCollector.failures -= 1
+            return self.reply(503)
+        if self.path == "/missing.jpg":
+            return self.reply(404)
+        if self.path == "/leaf.jpg":
+            return self.reply(200, b"jpeg-bytes")
+        self.reply(200, json.dumps({"data": [{"reading_id": "r1"}]}).encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        FlakyCollector.hits.append(json.loads(body))
+        self.reply(200)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FlakyCollector.failures = 0
+    FlakyCollector.hits = []
+    FlakyCollector.peers = set()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyCollector)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def client_for(base, **kwargs):
+    return CollectorClient(f"{base}/get-unprocessed/", f"{base}/update-result/", backoff=0, jitter=0, **kwargs)
+
+
+def test_poll_retries_transient_errors(server):
+    FlakyCollector.failures = 2
+    client = client_for(server, retries=3)
+
+    assert client.poll() == [{"reading_id": "r1"}]
+    assert FlakyCollector.hits.count("/get-unprocessed/") == 3
+
+
+def test_gives_up_after_retries(server):
+    FlakyCollector.failures = 5
+    client = client_for(server, retries=1)
+
+    with pytest.raises(requests.HTTPError):
+        client.poll()
+
+
+def test_keep_alive_and_ack(server):
+    client = client_for(server)
+
+    assert client.download(f"{server}/leaf.jpg") == b"jpeg-bytes"
+    client.poll()
+    client.ack("r1")
+
+    # Every call went over the same pooled connection
+    assert len(FlakyCollector.peers) == 1
+    assert FlakyCollector.hits[-1] == {"reading_id": "r1"}
+
+    with pytest.raises(requests.HTTPError):
+        client.download(f"{server}/missing.jpg")
+
+
+class BatchCollector(FlakyCollector):
+    batch = True
+    reject_status = 404
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "reading_ids" in body and not BatchCollector.batch:
+            return self.reply(BatchCollector.reject_status)
+        FlakyCollector.hits.append(body)
+        self.reply(200)
+
+
+@pytest.fixture
+def batch_server():
+    FlakyCollector.hits = []
+    BatchCollector.batch = True
+    BatchCollector.reject_status = 404
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), BatchCollector)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_acks_flush_as_one_batch(batch_server, tmp_path):
+    buffer = AckBuffer(client_for(batch_server), str(tmp_path / "acks"), max_items=3, max_wait=60)
+
+    buffer.add("r1", {"disease": "Healthy"})
+    buffer.add("r2")
+    assert FlakyCollector.hits == []
+
+    buffer.add("r3")
+    assert FlakyCollector.hits == [{
+        "reading_ids": ["r1", "r2", "r3"],
+        "results": [{"disease": "Healthy", "reading_id": "r1"}, {"reading_id": "r2"}, {"reading_id": "r3"}],
+    }]
+    assert (tmp_path / "acks").read_text() == ""
+
+
+def test_acks_fall_back_to_single_calls(batch_server, tmp_path):
+    BatchCollector.batch = False
+    client = client_for(batch_server)
+    buffer = AckBuffer(client, str(tmp_path / "acks"), max_items=10)
+
+    buffer.add("r1")
+    buffer.add("r2")
+    assert buffer.flush() == 2
+
+    assert FlakyCollector.hits == [{"reading_id": "r1"}, {"reading_id": "r2"}]
+    assert client.batch_supported is False
+
+
+def test_refused_batch_is_retried_after_cooldown(batch_server, tmp_path):
+    BatchCollector.batch = False
+    BatchCollector.reject_status = 422
+    client = client_for(batch_server)
+    buffer = AckBuffer(client, str(tmp_path / "acks"), max_items=10)
+
+    buffer.add("r1")
+    buffer.add("r2")
+    assert buffer.flush() == 2
+    assert FlakyCollector.hits == [{"reading_id": "r1"}, {"reading_id": "r2"}]
+    assert client.batch_supported is True
+
+    # Single acks until the cooldown has passed, then batches again
+    BatchCollector.batch = True
+    buffer.add("r3")
+    buffer.add("r4")
+    buffer.flush()
+    assert FlakyCollector.hits[-1] == {"reading_id": "r4"}
+
+    client.batch_retry_at = 0
+    buffer.add("r5")
+    buffer.add("r6")
+    buffer.flush()
+    assert FlakyCollector.hits[-1]["reading_ids"] == ["r5", "r6"]
+
+
+def test_journal_survives_crash(batch_server, tmp_path):
+    journal = tmp_path / "acks"
+    down = CollectorClient("http://127.0.0.1:9/poll", "http://127.0.0.1:9/ack", retries=0)
+    buffer = AckBuffer(down, str(journal), max_items=10)
+
+    buffer.add("r1")
+    buffer.add("r2")
+    assert buffer.flush() == 0
+    journal.write_text(journal.read_text() + '{"reading_id": "r3", "res')   # torn write
+
+    # A new process picks up the unsent acks
+    restarted = AckBuffer(client_for(batch_server), str(journal), max_items=10)
+    assert restarted.is_pending("r1") and restarted.is_pending("r2")
+    assert restarted.flush() == 2
+    assert FlakyCollector.hits[0]["reading_ids"] == ["r1", "r2"]
+
+
+def test_long_poll_sends_wait(server):
+    client = client_for(server)
+
+    assert client.poll(wait=5) == [{"reading_id": "r1"}]
+    assert FlakyCollector.hits == ["/get-unprocessed/?wait=5"]
+
+
+def test_poll_scheduler_backs_off_when_idle(monkeypatch):
+    monkeypatch.setattr("sensors.collector.random.uniform", lambda a, b: 1.0)
+    scheduler = PollScheduler(base=1, cap=5)
+
+    assert [scheduler.next_delay(0) for _ in range(5)] == [1, 2, 4, 5, 5]
+    assert scheduler.next_delay(3) == 0
+    assert scheduler.next_delay(0) == 1
+
+
+def test_poll_scheduler_long_poll():
+    scheduler = PollScheduler(base=1, cap=5, long_poll=20)
+
+    # The collector held the request, so poll again right away
+    assert scheduler.next_delay(0, poll_seconds=19) == 0
+    # It answered instantly: it ignores `wait`, fall back to backing off
+    assert scheduler.next_delay(0, poll_seconds=0.01) > 0
@@ -0,0 +1,76 @@
+import json
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.contrib.auth.models import User
+from sensors.models import SensorReading
+
+@pytest.mark.django_db
+def test_reading_id_is_unique_when_set(device):
+    SensorReading.objects.create(device=device, reading_id="r1")
+    for _ in range(2):
+        SensorReading.objects.create(device=device, reading_id=None)
+        SensorReading.objects.create(device=device, reading_id="")
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        SensorReading.objects.create(device=device, reading_id="r1")
+
+
+@pytest.mark.django_db
+def test_reading_owner_follows_the_device(client, device, user):
+    reading = SensorReading.objects.create(device=device)
+    client.post("/sensor-data/batch/", data=json.dumps([{"device_id": "1", "reading_id": "b1"}]),
+                content_type="application/json")
+    assert set(SensorReading.objects.values_list("owner", flat=True)) == {user.id}
+
+    device.owner = User.objects.create_user(username="buyer")
+    device.save()
+
+    reading.refresh_from_db()
+    assert reading.owner == device.owner
+    assert SensorReading.objects.get(reading_id="b1").owner == device.owner
+
+
+@pytest.mark.django_db
+def test_batch_rejects_duplicate_reading_ids(client, device):
+    SensorReading.objects.create(device=device, reading_id="r1")
+    payload = [
+        {"device_id": "1", "reading_id": "r1"},
+        {"device_id": "1", "reading_id": "r2"},
+        {"device_id": "1", "reading_id": "r2"},
+        {"device_id": "1"},
+    ]
+
+    response = client.post("/sensor-data/batch/", data=json.dumps(payload), content_type="application/json")
+
+    body = response.json()
+    assert body["created"] == 2
+    assert [r.get("code") for r in body["results"]] == [409, None, 409, None]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migration_keeps_reading_id_on_newest_duplicate():
+    executor = MigrationExecutor(connection)
+    executor.migrate([("sensors", "0012_alertdelivery_coalescing")])
+    old_apps = executor.loader.project_state([("sensors", "0012_alertdelivery_coalescing")]).apps
+    OldReading = old_apps.get_model("sensors", "SensorReading")
+    first, second, other = [OldReading.objects.create(reading_id=rid).id for rid in ("dup", "dup", "solo")]
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+    assert SensorReading.objects.get(id=first).reading_id is None
+    assert SensorReading.objects.get(id=second).reading_id == "dup"
+    assert SensorReading.objects.get(id=other).reading_id == "solo"
+
+
+@pytest.mark.django_db
+def test_index_audit_finds_no_full_scans():
+    out = StringIO()
+    call_command("audit_indexes", rows=2000, use_current_db=True, fail_on_scan=True, stdout=out)
+
+    lines = out.getvalue().splitlines()
+    assert any(line.startswith("dashboard") for line in lines)
+    assert any(line.startswith("wroker reading_id lookup") and line.endswith(" index") for line in lines)
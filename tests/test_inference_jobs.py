@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from sensors.models import SensorReading, InferenceJob
+from sensors.jobs import process_jobs
+
+@pytest.mark.django_db
+@patch("sensors.views.predict_disease")
+def test_async_ingest_queues_job(mock_disease, client, device, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    mock_disease.return_value = ("Tomato", "Tomato healthy", 97.0)
+
+    response = client.post("/sensor-data/?mode=async", data={
+        "device_id": "1",
+        "temperature": 25,
+        "humidity": 60,
+        "soil_moisture": 40,
+        "ph": 6.5,
+        "timestamp": "2025-01-01T10:00:00Z",
+        "image": SimpleUploadedFile("leaf.jpg", b"img", content_type="image/jpeg"),
+    })
+
+    assert response.status_code == 202
+    assert mock_disease.call_count == 0
+    reading_id = response.json()["reading"]
+    status_url = response.json()["status_url"]
+
+    status = client.get(status_url).json()
+    assert status["status"] == InferenceJob.PENDING
+
+    assert process_jobs() == 1
+    assert mock_disease.call_count == 1
+
+    status = client.get(status_url).json()
+    assert status["status"] == InferenceJob.DONE
+    assert status["disease"] == "Tomato healthy"
+    assert status["confidence"] == 97.0
+    assert SensorReading.objects.get(id=reading_id).alert is False
+
+
+@pytest.mark.django_db
+def test_reading_status_only_for_owner_or_device(client, reading):
+    from django.contrib.auth.models import User
+
+    url = f"/sensor-data/status/{reading.id}/"
+    assert client.get(url).status_code == 404
+    assert client.get(url, {"device_id": "other"}).status_code == 404
+    assert client.get(url, {"device_id": "1"}).status_code == 200
+
+    User.objects.create_user(username="stranger", password="pass123")
+    client.login(username="stranger", password="pass123")
+    assert client.get(url).status_code == 404
+
+    client.login(username="testuser", password="pass123")
+    assert client.get(url).json()["id"] == reading.id
+
+
+@pytest.mark.django_db
+@patch("sensors.views.predict_disease")
+def test_failed_job_is_retried_then_marked_failed(mock_disease, reading, settings):
+    settings.INFERENCE_JOB_MAX_ATTEMPTS = 2
+    job = InferenceJob.objects.create(reading=reading)
+
+    # reading fixture has no image
+    process_jobs()
+    job.refresh_from_db()
+    assert job.status == InferenceJob.PENDING
+    assert job.attempts == 1
+
+    process_jobs()
+    job.refresh_from_db()
+    assert job.status == InferenceJob.FAILED
+    assert "no leaf image" in job.error
+
+
+@pytest.mark.django_db
+def test_stale_job_over_the_attempt_limit_is_failed(reading, settings):
+    from datetime import timedelta
+    from django.utils import timezone
+    from sensors.jobs import claim_job
+
+    settings.INFERENCE_JOB_MAX_ATTEMPTS = 2
+    job = InferenceJob.objects.create(reading=reading, status=InferenceJob.RUNNING, attempts=2)
+    InferenceJob.objects.filter(id=job.id).update(
+        updated_at=timezone.now() - timedelta(seconds=settings.INFERENCE_JOB_TIMEOUT + 1)
+    )
+
+    assert claim_job() is None
+    job.refresh_from_db()
+    assert (job.status, job.attempts) == (InferenceJob.FAILED, 2)
+
+
+def test_worker_phase_errors_count_as_nothing_handled():
+    from django.db import OperationalError
+    from ai_worker import run_phase
+
+    def locked():
+        raise OperationalError("database is locked")
+
+    assert run_phase("inference_jobs", locked) == 0
+    assert run_phase("inference_jobs", lambda: 3) == 3
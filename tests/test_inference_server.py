@@ -0,0 +1,37 @@
+import threading
+import pytest
+from sensors import ai_engine
+from sensors.inference_server import InferenceClient, serve, get_authkey
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_engine, "predict_disease_local", lambda data: ("Tomato", f"{len(data)} bytes", 90.0))
+
+    address = str(tmp_path / "inference.sock")
+    ready = threading.Event()
+    threading.Thread(
+        target=serve,
+        args=(address,),
+        kwargs={"threads": 1, "preload": False, "ready": ready},
+        daemon=True
+    ).start()
+    assert ready.wait(10)
+    return address
+
+
+def test_client_round_trip(server):
+    client = InferenceClient(server, get_authkey())
+
+    assert client.predict(b"leafbytes") == ("Tomato", "9 bytes", 90.0)
+    assert client.predict(b"leaf") == ("Tomato", "4 bytes", 90.0)
+    assert client.stats()["requests"] == 2
+
+
+def test_predict_disease_routes_to_server(server, settings):
+    settings.AI_INFERENCE_SOCKET = server
+    ai_engine.inference_client = None
+
+    try:
+        assert ai_engine.predict_disease(b"abc") == ("Tomato", "3 bytes", 90.0)
+    finally:
+        ai_engine.inference_client = None
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+from django.conf import settings
+
+def test_web_views_do_not_import_ml_stack():
+    code = (
+        "import os, sys, django\n"
+        "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iot_backend.settings')\n"
+        "django.setup()\n"
+        "import sensors.urls\n"
+        "print(sorted(m for m in ('torch', 'torchvision', 'tensorflow') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=settings.BASE_DIR, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,227 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import ANY, patch
+from django.utils import timezone
+from sensors.leases import claim_readings, fail_reading, release_readings, renew_leases
+from sensors.models import CollectorLease, SensorReading
+
+@pytest.mark.django_db
+def test_workers_split_the_backlog():
+    ids = [f"r{i}" for i in range(10)]
+
+    first = claim_readings(ids[:6], owner="worker-a")
+    second = claim_readings(ids, owner="worker-b")
+
+    assert first == set(ids[:6])
+    assert second == set(ids[6:])
+
+
+@pytest.mark.django_db
+def test_claim_limit_splits_a_page_between_workers():
+    ids = [f"r{i}" for i in range(10)]
+
+    assert claim_readings(ids, owner="worker-a", limit=4) == set(ids[:4])
+    assert claim_readings(ids, owner="worker-b", limit=4) == set(ids[4:8])
+    # Readings a worker already holds count towards its limit
+    assert claim_readings(ids, owner="worker-a", limit=4) == set(ids[:4])
+    assert claim_readings(ids, owner="worker-c", limit=4) == set(ids[8:])
+
+
+@pytest.mark.django_db
+def test_expired_lease_is_taken_over():
+    claim_readings(["r1", "r2"], owner="dead-worker")
+    CollectorLease.objects.filter(reading_id="r1").update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    assert claim_readings(["r1", "r2"], owner="worker-b") == {"r1"}
+    assert CollectorLease.objects.get(reading_id="r1").owner == "worker-b"
+
+
+@pytest.mark.django_db
+def test_release_only_own_leases():
+    claim_readings(["r1"], owner="worker-a")
+    claim_readings(["r2"], owner="worker-b")
+
+    release_readings(["r1", "r2"], owner="worker-a")
+
+    assert list(CollectorLease.objects.values_list("reading_id", flat=True)) == ["r2"]
+
+
+@pytest.mark.django_db
+def test_renew_extends_only_leases_still_held(settings):
+    claim_readings(["r1", "r2"], owner="worker-a", ttl=1)
+    CollectorLease.objects.filter(reading_id="r2").update(owner="worker-b")
+
+    assert renew_leases(["r1", "r2"], owner="worker-a", ttl=600) == {"r1"}
+    assert (CollectorLease.objects.get(reading_id="r1").expires_at - timezone.now()).total_seconds() > 590
+    assert (CollectorLease.objects.get(reading_id="r2").expires_at - timezone.now()).total_seconds() < 2
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_reading_taken_over_during_a_slow_poll_is_skipped(mock_disease, mock_download, mock_collector, device, ack_journal, collector_item):
+    from wroker import process
+
+    mock_collector.return_value.poll.return_value = [collector_item("slow"), collector_item("next")]
+    mock_disease.return_value = ("tomato", "Tomato___healthy", 98.0)
+
+    def slow_download(url):
+        # Our lease on "next" ran out meanwhile and another worker has it
+        CollectorLease.objects.filter(reading_id="next").update(owner="other-worker")
+        return b"img"
+
+    mock_download.side_effect = slow_download
+
+    assert process() == {"processed": 1, "failed": 0, "skipped": 0, "leased": 1, "poll_seconds": ANY}
+    assert mock_download.call_count == 1
+    assert CollectorLease.objects.get(reading_id="next").owner == "other-worker"
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_pipeline_renews_leases_while_waiting(mock_disease, mock_download, mock_collector, device, settings, ack_journal, collector_item):
+    import time
+    from wroker import process_pipelined
+
+    settings.COLLECTOR_LEASE_SECONDS = 0.3
+    mock_collector.return_value.poll.return_value = [collector_item("slow")]
+    mock_download.side_effect = lambda url: time.sleep(0.5) or b"img"
+    mock_disease.return_value = ("tomato", "Tomato___healthy", 98.0)
+
+    renewed = []
+
+    def renew(reading_ids, owner):
+        renewed.append(set(reading_ids))
+        return renew_leases(reading_ids, owner)
+
+    with patch("wroker.renew_leases", renew):
+        assert process_pipelined(concurrency=1, inference_threads=1)["processed"] == 1
+
+    assert renewed and renewed[0] == {"slow"}
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_worker_skips_readings_leased_elsewhere(mock_disease, mock_download, mock_collector, device, ack_journal, collector_item):
+    from wroker import process
+
+    mock_collector.return_value.poll.return_value = [collector_item("mine"), collector_item("theirs")]
+    mock_download.return_value = b"img"
+    mock_disease.return_value = ("tomato", "Tomato___healthy", 98.0)
+    claim_readings(["theirs"], owner="other-worker")
+
+    assert process() == {"processed": 1, "failed": 0, "skipped": 0, "leased": 1, "poll_seconds": ANY}
+    assert list(SensorReading.objects.values_list("reading_id", flat=True)) == ["mine"]
+    # Our lease is released once the reading is stored
+    assert list(CollectorLease.objects.values_list("reading_id", flat=True)) == ["theirs"]
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_reading_stored_while_claiming_is_not_run_again(mock_disease, mock_download, mock_collector, device, ack_journal, collector_item):
+    import wroker
+
+    mock_collector.return_value.poll.return_value = [collector_item("race")]
+
+    def claim_after_other_worker_stored(reading_ids, owner, limit=None):
+        # The other worker stores the reading and drops its lease right
+        # after our "already stored" check
+        SensorReading.objects.create(reading_id="race", device=device)
+        return claim_readings(reading_ids, owner=owner, limit=limit)
+
+    with patch("wroker.claim_readings", claim_after_other_worker_stored):
+        assert wroker.process() == {"processed": 0, "failed": 0, "skipped": 1, "leased": 0, "poll_seconds": ANY}
+
+    mock_download.assert_not_called()
+    assert SensorReading.objects.count() == 1
+    assert not CollectorLease.objects.exists()
+    mock_collector.return_value.ack_many.assert_called_once_with([("race", None)])
+
+
+@pytest.mark.django_db
+def test_failed_reading_backs_off_then_dead_letters(settings):
+    settings.COLLECTOR_MAX_ATTEMPTS = 3
+    settings.COLLECTOR_RETRY_BASE = 10
+    item = {"reading_id": "bad"}
+
+    claim_readings(["bad"], owner="worker-a")
+    assert fail_reading(item, "corrupt JPEG", owner="worker-a") == CollectorLease.RETRY
+
+    lease = CollectorLease.objects.get(reading_id="bad")
+    assert lease.attempts == 1 and lease.owner == ""
+    assert 9 < (lease.expires_at - timezone.now()).total_seconds() <= 10
+
+    # Not due yet: nobody picks it up
+    assert claim_readings(["bad"], owner="worker-b") == set()
+
+    for attempt in (2, 3):
+        CollectorLease.objects.filter(reading_id="bad").update(expires_at=timezone.now())
+        assert claim_readings(["bad"], owner="worker-b") == {"bad"}
+        fail_reading(item, "corrupt JPEG", owner="worker-b")
+
+    lease.refresh_from_db()
+    assert (lease.status, lease.attempts, lease.payload) == (CollectorLease.DEAD, 3, item)
+
+    CollectorLease.objects.filter(reading_id="bad").update(expires_at=timezone.now() - timedelta(days=1))
+    assert claim_readings(["bad"], owner="worker-c") == set()
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_poison_item_does_not_stop_the_poll(mock_disease, mock_download, mock_collector, device, ack_journal, collector_item):
+    from wroker import process
+
+    mock_collector.return_value.poll.return_value = [collector_item(f"r{i}") for i in range(4)]
+    mock_download.return_value = b"img"
+    mock_disease.side_effect = [("tomato", "Tomato___healthy", 98.0), ValueError("cannot identify image file")] * 2
+
+    assert process() == {"processed": 2, "failed": 2, "skipped": 0, "leased": 0, "poll_seconds": ANY}
+    assert set(SensorReading.objects.values_list("reading_id", flat=True)) == {"r0", "r2"}
+    assert set(
+        CollectorLease.objects.filter(status=CollectorLease.RETRY).values_list("reading_id", flat=True)
+    ) == {"r1", "r3"}
+
+    # The next poll leaves the failed readings alone until they are due
+    mock_disease.side_effect = None
+    assert process()["leased"] == 2
+    assert mock_download.call_count == 4
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_dead_letters_are_acked_and_leave_the_page(mock_disease, mock_download, mock_collector, device, settings, ack_journal, collector_item):
+    from wroker import process
+
+    settings.COLLECTOR_MAX_ATTEMPTS = 1
+    # A paged collector: the first 3 unacked readings, poison ones first
+    backlog = [collector_item(f"bad{i}", image_url="http://fake.com/broken.jpg") for i in range(5)]
+    backlog += [collector_item(f"good{i}") for i in range(3)]
+    acked = {}
+    mock_collector.return_value.poll.side_effect = lambda wait: [i for i in backlog if i["reading_id"] not in acked][:3]
+    mock_collector.return_value.ack_many.side_effect = lambda acks: acked.update(acks)
+
+    def download(url):
+        if "broken" in url:
+            raise Exception("Failed to download image")
+        return b"img"
+
+    mock_download.side_effect = download
+    mock_disease.return_value = ("tomato", "Tomato___healthy", 98.0)
+
+    for _ in range(4):
+        process()
+
+    assert set(SensorReading.objects.values_list("reading_id", flat=True)) == {"good0", "good1", "good2"}
+    assert acked["bad0"] == {"status": "failed", "error": "Failed to download image"}
+    assert len(acked) == 8
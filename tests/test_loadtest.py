@@ -0,0 +1,54 @@
+import json
+import pytest
+import requests
+from django.core.management import call_command
+from sensors.fake_collector import FakeCollector
+
+def test_fake_collector_serves_until_acked():
+    collector = FakeCollector(readings=3, page_size=2)
+    base = collector.start()
+    try:
+        data = requests.get(f"{base}/get-unprocessed/").json()["data"]
+        assert [d["reading_id"] for d in data] == ["load-0", "load-1"]
+
+        image = requests.get(data[0]["image_url"])
+        assert image.headers["Content-Type"] == "image/jpeg"
+        assert image.content[:2] == b"\xff\xd8"
+
+        requests.post(f"{base}/update-result/", json={"reading_ids": ["load-0", "load-1"]})
+        requests.post(f"{base}/update-result/", json={"reading_id": "load-1"})
+        assert [d["reading_id"] for d in requests.get(f"{base}/get-unprocessed/").json()["data"]] == ["load-2"]
+
+        stats = requests.get(f"{base}/stats/").json()
+        assert (stats["acked"], stats["duplicate_acks"]) == (2, 1)
+    finally:
+        collector.stop()
+
+
+def test_fake_collector_single_acks_only():
+    collector = FakeCollector(readings=1, batch_acks=False)
+    base = collector.start()
+    try:
+        assert requests.post(f"{base}/update-result/", json={"reading_ids": ["load-0"]}).status_code == 404
+        assert requests.post(f"{base}/update-result/", json={"reading_id": "load-0"}).status_code == 200
+        assert collector.done()
+    finally:
+        collector.stop()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("mode", ["sequential", "pipelined"])
+def test_loadtest_worker(mode, tmp_path):
+    output = tmp_path / "report.json"
+
+    call_command(
+        "loadtest_worker", mode=mode, readings=12, page_size=5, latency_ms=0,
+        inference_ms=1, use_current_db=True, timeout=60, output=str(output)
+    )
+
+    report = json.loads(output.read_text())
+    assert report["complete"]
+    assert report["processed"] == 12
+    assert report["duplicate_readings"] == 0
+    assert report["collector"]["duplicate_downloads"] == 0
+    assert {"poll", "download", "inference", "db_write", "ack"} <= set(report["stages"])
@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from sensors import metrics
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_render_counters_and_summaries():
+    metrics.inc("iot_readings_total", source="api", alert="true")
+    metrics.inc("iot_readings_total", source="api", alert="true")
+    for value in (0.1, 0.2, 0.3, 0.4):
+        metrics.observe("iot_ingest_stage_seconds", value, stage="inference")
+
+    text = metrics.render()
+
+    assert "# TYPE iot_readings_total counter" in text
+    assert 'iot_readings_total{alert="true",source="api"} 2' in text
+    assert "# TYPE iot_ingest_stage_seconds summary" in text
+    assert 'iot_ingest_stage_seconds{stage="inference",quantile="0.5"} 0.300000' in text
+    assert 'iot_ingest_stage_seconds_count{stage="inference"} 4' in text
+    assert 'iot_ingest_stage_seconds_sum{stage="inference"} 1.000000' in text
+
+
+def test_disabled_records_nothing(settings):
+    settings.METRICS_ENABLED = False
+
+    metrics.inc("iot_readings_total")
+    with metrics.timed("iot_ingest_stage_seconds", stage="inference"):
+        pass
+
+    assert metrics.counters == {}
+    assert metrics.summaries == {}
+
+
+@pytest.mark.django_db
+@patch("sensors.views.predict_disease")
+def test_sensor_data_records_stage_latency(mock_disease, client, device, settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    mock_disease.return_value = ("Tomato", "Tomato___healthy", 97.0)
+
+    response = client.post("/sensor-data/", {
+        "device_id": "1",
+        "temperature": 25,
+        "humidity": 60,
+        "soil_moisture": 40,
+        "ph": 6.5,
+        "timestamp": "2025-01-01T10:00:00Z",
+        "image": SimpleUploadedFile("leaf.jpg", b"img", content_type="image/jpeg"),
+    })
+    assert response.status_code == 200
+
+    settings.METRICS_TOKEN = "scrape-secret"
+    response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+
+    text = response.content.decode()
+    for stage in ("device_lookup", "read_upload", "inference", "stress", "db_write"):
+        assert f'iot_ingest_stage_seconds_count{{stage="{stage}"}} 1' in text
+    assert 'iot_ingest_seconds_count{endpoint="sensor-data"} 1' in text
+    assert 'iot_readings_total{alert="false",source="api"} 1' in text
+    assert 'iot_fallback_total{event="predictions"}' in text
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_disabled(client, settings):
+    settings.METRICS_ENABLED = False
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_endpoint_needs_the_token(client, settings):
+    settings.METRICS_TOKEN = ""
+    assert client.get("/metrics").status_code == 404
+
+    settings.METRICS_TOKEN = "scrape-secret"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code == 401
+    assert client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret").status_code == 200
@@ -0,0 +1,69 @@
+import io
+from unittest.mock import patch
+from PIL import Image, ImageDraw
+from sensors import ai_engine
+from sensors.prediction_cache import PredictionCache, perceptual_hash, hamming
+
+def leaf(quality=90):
+    img = Image.linear_gradient("L").resize((128, 128)).convert("RGB")
+    ImageDraw.Draw(img).ellipse((30, 20, 100, 110), fill=(200, 180, 40))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def test_exact_hit_and_miss():
+    cache = PredictionCache()
+    data = leaf()
+    key = cache.make_key(data, ai_engine.load_image(data))
+
+    assert cache.get(key) is None
+    cache.set(key, ("Tomato", "Late blight", 88.0))
+    assert cache.get(key) == ("Tomato", "Late blight", 88.0)
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    cache = PredictionCache(max_entries=2, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr("sensors.prediction_cache.time.monotonic", lambda: now[0])
+
+    for i in range(3):
+        cache.set((f"k{i}", None), ("Crop", "Healthy", float(i)))
+
+    assert cache.get(("k0", None)) is None
+    assert cache.get(("k2", None)) == ("Crop", "Healthy", 2.0)
+    assert cache.stats()["evictions"] == 1
+
+    now[0] += 11
+    assert cache.get(("k2", None)) is None
+
+
+def test_perceptual_match_for_reencoded_photo():
+    original, reencoded = leaf(), leaf(quality=40)
+    assert original != reencoded
+    assert hamming(
+        perceptual_hash(ai_engine.load_image(original)),
+        perceptual_hash(ai_engine.load_image(reencoded))
+    ) <= 4
+
+    cache = PredictionCache(phash_distance=4)
+    cache.set(cache.make_key(original, ai_engine.load_image(original)), ("Corn", "Common rust", 91.0))
+
+    assert cache.get(cache.make_key(reencoded, ai_engine.load_image(reencoded))) == ("Corn", "Common rust", 91.0)
+    assert cache.stats()["perceptual_hits"] == 1
+
+
+@patch("sensors.ai_engine.run_disease_models")
+def test_predict_disease_uses_cache(mock_models, monkeypatch):
+    monkeypatch.setattr(ai_engine, "prediction_cache", PredictionCache())
+    mock_models.return_value = ("Potato", "Early blight", 93.0)
+    data = leaf()
+
+    assert ai_engine.predict_disease(data) == ("Potato", "Early blight", 93.0)
+    assert ai_engine.predict_disease(data) == ("Potato", "Early blight", 93.0)
+    assert mock_models.call_count == 1
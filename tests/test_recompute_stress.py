@@ -0,0 +1,112 @@
+import json
+import pytest
+from unittest.mock import patch
+from django.core.management import CommandError, call_command
+from sensors.models import SensorReading, InferenceJob
+
+def make(device, **kwargs):
+    fields = dict(device=device, crop="Tomato", temperature=25, humidity=70, soil_moisture=60, ph=6.5)
+    fields.update(kwargs)
+    return SensorReading.objects.create(**fields)
+
+
+@pytest.mark.django_db
+def test_recompute_updates_stale_rows(device):
+    stale = make(device, disease="Healthy", stress_level="HIGH", decision="old", alert=True)
+    hot = make(device, disease="Late blight", temperature=40, soil_moisture=10, stress_level="LOW", decision="old")
+    no_image = make(device, temperature=40, soil_moisture=10, stress_level="LOW")
+    pending = make(device, disease="Late blight", stress_level="stale")
+    InferenceJob.objects.create(reading=pending)
+
+    call_command("recompute_stress", chunk_size=2)
+
+    stale.refresh_from_db()
+    assert (stale.stress_level, stale.alert) == ("LOW", False)
+    assert stale.decision.startswith("NORMAL")
+
+    hot.refresh_from_db()
+    assert (hot.stress_level, hot.alert) == ("HIGH", True)
+    assert hot.decision.startswith("CRITICAL")
+
+    no_image.refresh_from_db()
+    assert (no_image.stress_level, no_image.alert) == ("HIGH", True)
+    assert no_image.decision == "No AI analysis available"
+
+    pending.refresh_from_db()
+    assert pending.stress_level == "stale"
+
+
+@pytest.mark.django_db
+def test_recompute_resumes_from_checkpoint(device, tmp_path):
+    first = make(device, disease="Healthy", stress_level="stale")
+    second = make(device, disease="Healthy", stress_level="stale")
+
+    checkpoint = tmp_path / "recompute.json"
+    checkpoint.write_text(json.dumps({"last_id": first.id, "scanned": 1, "updated": 0}))
+
+    call_command("recompute_stress", checkpoint=str(checkpoint))
+
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert first.stress_level == "stale"
+    assert second.stress_level == "LOW"
+    # A finished run leaves nothing for the next one to resume from
+    assert not checkpoint.exists()
+
+
+@pytest.mark.django_db
+def test_recompute_dry_run_writes_nothing(device):
+    reading = make(device, disease="Healthy", stress_level="stale")
+
+    call_command("recompute_stress", dry_run=True)
+
+    reading.refresh_from_db()
+    assert reading.stress_level == "stale"
+
+
+@pytest.mark.django_db
+def test_recompute_refuses_checkpoint_from_another_range(device, tmp_path):
+    make(device, disease="Healthy", stress_level="stale")
+    checkpoint = tmp_path / "recompute.json"
+    checkpoint.write_text(json.dumps({"last_id": 10, "start_id": 1, "end_id": 10, "scanned": 10, "updated": 0}))
+
+    with pytest.raises(CommandError, match="end_id 10"):
+        call_command("recompute_stress", checkpoint=str(checkpoint), start_id=1, end_id=20)
+
+
+@pytest.mark.django_db
+@patch("sensors.management.commands.recompute_stress.subprocess.Popen")
+def test_recompute_workers_remove_checkpoints_when_done(mock_popen, device, tmp_path):
+    for _ in range(4):
+        make(device, disease="Healthy")
+    base = tmp_path / "recompute.checkpoint"
+    for n in range(2):
+        (tmp_path / f"recompute.checkpoint.{n}").write_text("{}")
+    mock_popen.return_value.wait.return_value = 0
+
+    call_command("recompute_stress", workers=2, checkpoint=str(base))
+
+    assert mock_popen.call_count == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.django_db
+@patch("sensors.management.commands.recompute_stress.subprocess.Popen")
+def test_recompute_workers_resume_the_same_ranges(mock_popen, device, tmp_path):
+    for _ in range(4):
+        make(device, disease="Healthy")
+    base = tmp_path / "recompute.checkpoint"
+    mock_popen.return_value.wait.side_effect = [0, 1]
+
+    with pytest.raises(CommandError, match=r"\[1\]"):
+        call_command("recompute_stress", workers=2, checkpoint=str(base))
+    ranges = [call.args[0][4:7:2] for call in mock_popen.call_args_list]
+
+    # New readings don't move the partitions; the finished one isn't re-run
+    make(device, disease="Healthy")
+    mock_popen.reset_mock()
+    mock_popen.return_value.wait.side_effect = [0]
+    call_command("recompute_stress", workers=2, checkpoint=str(base))
+
+    assert [call.args[0][4:7:2] for call in mock_popen.call_args_list] == ranges[1:]
+    assert not base.exists()
@@ -1,11 +1,12 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 from sensors.models import SensorReading
 from wroker import process   # 👈 adjust import
 
+pytestmark = pytest.mark.usefixtures("ack_journal")
+
 @pytest.mark.django_db
-@patch("wroker.requests.get")
-@patch("wroker.requests.post")
+@patch("wroker.get_collector")
 @patch("wroker.download_image")
 @patch("wroker.predict_disease")
 @patch("wroker.predict_stress")
@@ -15,14 +16,12 @@ def test_process_pipeline(
     mock_stress,
     mock_disease,
     mock_download,
-    mock_post,
-    mock_get,
+    mock_collector,
     device
 ):
 
     # Fake collector response
-    mock_get.return_value.json.return_value = {
-        "data": [{
+    mock_collector.return_value.poll.return_value = [{
             "reading_id": "abc123",
             "device_id": "1",
             "temperature": 25,
@@ -32,7 +31,6 @@ def test_process_pipeline(
             "timestamp": "2025-01-01T10:00:00Z",
             "image_url": "http://fake.com/img.jpg"
         }]
-    }
 
     # Mock AI
     mock_disease.return_value = ("tomato", "healthy", 98.0)
@@ -40,10 +38,7 @@ def test_process_pipeline(
     mock_decision.return_value = "No action needed"
 
     # Mock image
-    mock_download.return_value = "temp.jpg"
-
-    with open("temp.jpg", "wb") as f:
-        f.write(b"img")
+    mock_download.return_value = b"img"
 
     process()
 
@@ -51,5 +46,78 @@ def test_process_pipeline(
 
     obj = SensorReading.objects.first()
     assert obj.disease == "healthy"
+    assert obj.image.read() == b"img"
+    mock_disease.assert_called_once_with(b"img")
+
+    mock_collector.return_value.ack_many.assert_called_once_with([("abc123", {
+        "crop": "tomato",
+        "disease": "healthy",
+        "confidence": 98.0,
+        "stress": "LOW",
+        "decision": "No action needed",
+        "alert": False,
+    })])   # update-result called
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_process_pipelined(mock_disease, mock_download, mock_collector, reading, collector_item):
+    from wroker import process_pipelined
+
+    mock_collector.return_value.poll.return_value = [
+        collector_item("abc123"),   # already stored by the fixture
+        collector_item("p1"),
+        collector_item("p2", image_url="http://fake.com/broken.jpg"),
+        collector_item("p3"),
+    ]
+
+    def download(url):
+        if "broken" in url:
+            raise Exception("Failed to download image")
+        return url.encode()
+
+    mock_download.side_effect = download
+    mock_disease.return_value = ("tomato", "Tomato___healthy", 98.0)
+
+    result = process_pipelined(concurrency=2, inference_threads=2)
+
+    assert result == {"processed": 2, "failed": 1, "skipped": 1, "leased": 0, "poll_seconds": ANY}
+    assert set(SensorReading.objects.values_list("reading_id", flat=True)) == {"abc123", "p1", "p3"}
+    assert SensorReading.objects.get(reading_id="p1").image.read() == b"http://fake.com/p1.jpg"
+    # One batched ack: the two new readings plus the one stored earlier
+    (acks,), _ = mock_collector.return_value.ack_many.call_args
+    assert sorted(reading_id for reading_id, _ in acks) == ["abc123", "p1", "p3"]
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+@patch("wroker.predict_disease")
+def test_poll_seconds_times_only_the_poll(mock_disease, mock_download, mock_collector, device, collector_item):
+    import time
+
+    mock_collector.return_value.poll.side_effect = lambda wait: time.sleep(0.05) or [collector_item("slow")]
+    mock_download.return_value = b"img"
+    mock_disease.side_effect = lambda img: time.sleep(0.3) or ("tomato", "Tomato___healthy", 98.0)
+
+    counts = process()
+
+    assert counts["processed"] == 1
+    assert 0.05 <= counts["poll_seconds"] < 0.3
+
+
+@pytest.mark.django_db
+@patch("wroker.get_collector")
+@patch("wroker.download_image")
+def test_process_pipelined_survives_a_malformed_poll(mock_download, mock_collector, device, collector_item):
+    from wroker import process_pipelined
+
+    item = collector_item("x")
+    del item["reading_id"]
+    mock_collector.return_value.poll.return_value = [item]
+
+    result = process_pipelined(concurrency=1, inference_threads=1)
 
-    mock_post.assert_called()   # update-result called
\ No newline at end of file
+    assert result == {"processed": 0, "failed": 1, "skipped": 0, "leased": 0, "poll_seconds": ANY}
+    mock_download.assert_not_called()
@@ -1,119 +1,391 @@
 import requests
-import time
 import os
 from django.utils.dateparse import parse_datetime
-from django.core.files import File
+from django.core.files.base import ContentFile
 import django
 import sys
+import queue
 import threading
+import time
 
 sys.path.append(".")
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "iot_backend.settings")
 django.setup()
 
-from sensors.models import SensorReading, Device
+from django.conf import settings
+from sensors import metrics
+from sensors.collector import AckBuffer, CollectorClient
+from sensors.leases import WORKER_ID, claim_readings, fail_reading, release_readings, renew_leases
+from sensors.models import CollectorLease, SensorReading, Device
 from sensors.ai_engine import predict_disease, predict_stress, agrotech_decision
-from sensors.views import send_alerts_async
+from sensors.alerts import dispatch_alert
+
+
+collector = None
+
+
+def get_collector():
+    global collector
+    if collector is None:
+        # See COLLECTOR_BASE_URL in settings
+        collector = CollectorClient(
+            settings.COLLECTOR_POLL_URL,
+            settings.COLLECTOR_ACK_URL,
+            settings.COLLECTOR_BATCH_ACK_URL
+        )
+    return collector
+
+
+acks = None
+
+
+def get_acks():
+    global acks
+    if acks is None:
+        acks = AckBuffer(
+            get_collector(),
+            settings.COLLECTOR_ACK_JOURNAL,
+            max_items=settings.COLLECTOR_ACK_BATCH_SIZE,
+            max_wait=settings.COLLECTOR_ACK_FLUSH_SECONDS
+        )
+    return acks
+
+
+def download_image(url):
+    with metrics.timed("iot_worker_stage_seconds", stage="download"):
+        try:
+            # Kept in memory: the CNN and the ImageField both read these bytes
+            return get_collector().download(url)
+        except requests.RequestException as e:
+            raise Exception(f"Failed to download image: {url} ({e})")
+
+
+def fetch_items(counts=None):
+    # counts["poll_seconds"]: the HTTP poll alone, for the PollScheduler
+    started = time.monotonic()
+    try:
+        with metrics.timed("iot_worker_stage_seconds", stage="poll"):
+            return get_collector().poll(wait=settings.COLLECTOR_LONG_POLL_SECONDS)
+    finally:
+        if counts is not None:
+            counts["poll_seconds"] = time.monotonic() - started
+
 
+def analyse_item(item, content):
+    # AI
+    with metrics.timed("iot_worker_stage_seconds", stage="inference"):
+        crop, disease, confidence = predict_disease(content)
+    print(f"Predicted: {crop}, {disease} ({confidence}%)")
 
-COLLECTOR_URL = "https://iot-simulation-jl3f.onrender.com/get-unprocessed/"
-UPDATE_URL = "https://iot-simulation-jl3f.onrender.com/update-result/"
+    with metrics.timed("iot_worker_stage_seconds", stage="stress"):
+        stress = predict_stress(
+            crop,
+            float(item["temperature"]),
+            float(item["humidity"]),
+            int(item["soil_moisture"]),
+            float(item["ph"])
+        )
 
+    decision = agrotech_decision(disease, stress)
 
-def download_image(url, reading_id):
-    filename = f"temp_{reading_id}.jpg"
+    is_healthy = "healthy" in disease.lower()
+    return {
+        "crop": crop,
+        "disease": disease,
+        "confidence": confidence,
+        "stress": stress,
+        "decision": decision,
+        "alert": (not is_healthy or stress == "HIGH"),
+    }
 
-    r = requests.get(url)
 
-    if r.status_code != 200:
-        raise Exception(f"Failed to download image: {url}")
+def save_item(item, content, result):
+    # Save locally (optional)
+    with metrics.timed("iot_worker_stage_seconds", stage="db_write"):
+        device, _ = Device.objects.get_or_create(device_id=item["device_id"])
+        reading = SensorReading.objects.create(
+            reading_id=item["reading_id"],
+            device=device,
+            temperature=item["temperature"],
+            humidity=item["humidity"],
+            soil_moisture=item["soil_moisture"],
+            ph=item["ph"],
+            sensor_timestamp=parse_datetime(item["timestamp"]),
+            image=ContentFile(content, name=f"{item['reading_id']}.jpg"),
+            disease=result["disease"],
+            stress_level=result["stress"],
+            decision=result["decision"],
+            alert=result["alert"],
+            crop=result["crop"]
+        )
+    metrics.inc("iot_readings_total", source="collector", alert=str(result["alert"]).lower())
 
-    with open(filename, "wb") as f:
-        f.write(r.content)
+    if result["alert"]:
+        dispatch_alert({
+            "crop": result["crop"],
+            "temperature": item["temperature"],
+            "humidity": item["humidity"],
+            "soil_moisture": item["soil_moisture"],
+            "ph": item["ph"],
+            "disease": result["disease"],
+            "confidence": result["confidence"],
+            "stress": result["stress"],
+            "decision": result["decision"],
+            "timestamp": parse_datetime(item["timestamp"])
+        }, device.owner, reading)
 
-    return filename
 
+def ack_item(item, result=None):
+    # Send back to collector (buffered, see AckBuffer)
+    get_acks().add(item["reading_id"], result)
 
-def process():
+
+def ack_dead_letter(item, error):
+    # Dead letters go back as failed; left unacked they stay at the front
+    # of every page and crowd out the rest of the backlog
+    ack_item(item, {"status": "failed", "error": str(error)})
+
+
+def fail_item(item, error, owner):
+    if fail_reading(item, error, owner) == CollectorLease.DEAD:
+        ack_dead_letter(item, error)
+
+
+def select_items(data, counts, owner=WORKER_ID, limit=None):
+    # One query for the whole poll instead of one per item
+    known = set(
+        SensorReading.objects
+        .filter(reading_id__in=[item["reading_id"] for item in data])
+        .values_list("reading_id", flat=True)
+    )
+    fresh = []
+    for item in data:
+        if item["reading_id"] in known:
+            # Stored earlier but the ack never reached the collector, unless
+            # it is buffered or went out after this page was polled
+            if not get_acks().is_acked(item["reading_id"]):
+                ack_item(item)
+            counts["skipped"] += 1
+        else:
+            known.add(item["reading_id"])
+            fresh.append(item)
+
+    # Dead-lettered earlier (or by a worker that died on it) but not acked
+    dead = dict(
+        CollectorLease.objects
+        .filter(reading_id__in=[item["reading_id"] for item in fresh], status=CollectorLease.DEAD)
+        .values_list("reading_id", "last_error")
+    )
+    if dead:
+        for item in fresh:
+            if item["reading_id"] in dead:
+                if not get_acks().is_acked(item["reading_id"]):
+                    ack_dead_letter(item, dead[item["reading_id"]])
+                counts["skipped"] += 1
+        fresh = [item for item in fresh if item["reading_id"] not in dead]
+
+    # Readings another worker has leased (or beyond COLLECTOR_CLAIM_LIMIT)
+    # are left to the others
+    claimed = claim_readings([item["reading_id"] for item in fresh], owner=owner, limit=limit)
+    counts["leased"] = len(fresh) - len(claimed)
+
+    # Another worker may have stored and released one of these between
+    # the check above and the claim; those are acked, not run again
+    stored = set(
+        SensorReading.objects
+        .filter(reading_id__in=claimed)
+        .values_list("reading_id", flat=True)
+    )
+    if stored:
+        release_readings(stored, owner)
+        for item in fresh:
+            if item["reading_id"] in stored:
+                if not get_acks().is_acked(item["reading_id"]):
+                    ack_item(item)
+                counts["skipped"] += 1
+
+    return [item for item in fresh if item["reading_id"] in claimed - stored]
+
+
+def process(owner=WORKER_ID):
+    counts = {"processed": 0, "failed": 0, "skipped": 0, "leased": 0, "poll_seconds": 0.0}
+    items = []
     try:
-        res = requests.get(COLLECTOR_URL)
-        data = res.json().get("data", [])
+        data = fetch_items(counts)
 
         if not data:
             print("No data")
-            return
+            return counts
 
-        for item in data:
-            if SensorReading.objects.filter(reading_id=item["reading_id"]).exists():
+        items = select_items(data, counts, owner)
+
+        for item in items:
+            # The lease runs from here, however long the items before took
+            if not renew_leases([item["reading_id"]], owner):
+                counts["leased"] += 1
                 continue
             print("Processing:", item["reading_id"])
 
-            # Download image
-            img_path = download_image(item["image_url"], item["reading_id"])
-
-            # AI
-            crop, disease, confidence = predict_disease(img_path)
-            print(f"Predicted: {crop}, {disease} ({confidence}%)")
-
-            stress = predict_stress(
-                crop,
-                float(item["temperature"]),
-                float(item["humidity"]),
-                int(item["soil_moisture"]),
-                float(item["ph"])
-            )
-
-            decision = agrotech_decision(disease, stress)
-
-            # Save locally (optional)
-            device, _ = Device.objects.get_or_create(device_id=item["device_id"])
-            is_healthy = "healthy" in disease.lower()
-            alert_required = (not is_healthy or stress == "HIGH")
-            with open(img_path, "rb") as f:
-                django_file = File(f)
-
-                SensorReading.objects.create(
-                    reading_id=item["reading_id"],
-                    device=device,
-                    temperature=item["temperature"],
-                    humidity=item["humidity"],
-                    soil_moisture=item["soil_moisture"],
-                    ph=item["ph"],
-                    sensor_timestamp=parse_datetime(item["timestamp"]),
-                    image=django_file,   # ✅ THIS IS THE FIX
-                    disease=disease,
-                    stress_level=stress,
-                    decision=decision,
-                    alert=alert_required,
-                    crop=crop
-                )
-                if alert_required:
-                    threading.Thread(
-                        target=send_alerts_async,
-                        args=({
-                            "crop": crop,
-                            "temperature": item["temperature"],
-                            "humidity": item["humidity"],
-                            "soil_moisture": item["soil_moisture"],
-                            "ph": item["ph"],
-                            "disease": disease,
-                            "confidence": confidence,
-                            "stress": stress,
-                            "decision": decision,
-                            "timestamp": parse_datetime(item["timestamp"])
-                        }, device.owner),
-                        daemon=True
-                    ).start()
-
-            # Send back to collector
-            requests.post(
-                UPDATE_URL,
-                json={
-                    "reading_id": item["reading_id"]
-                }
-            )
-
-            os.remove(img_path)
+            # One bad reading must not hold up the rest of the poll
+            try:
+                # Download image
+                content = download_image(item["image_url"])
+
+                result = analyse_item(item, content)
+                save_item(item, content, result)
+                ack_item(item, result)
+                counts["processed"] += 1
+            except Exception as e:
+                metrics.inc("iot_errors_total", component="collector_worker")
+                print("Error:", item["reading_id"], e)
+                fail_item(item, e, owner)
+                counts["failed"] += 1
 
     except Exception as e:
+        metrics.inc("iot_errors_total", component="collector_worker")
         print("Error:", e)
+        counts["failed"] += 1
+
+    finally:
+        get_acks().flush()
+        release_readings([item["reading_id"] for item in items], owner)
+
+    return counts
+
+
+# =========================================================
+# 🔹 PIPELINED MODE
+# =========================================================
+# download (COLLECTOR_CONCURRENCY threads) -> inference
+# (COLLECTOR_INFERENCE_THREADS threads; concurrent calls are coalesced by
+# the micro-batcher when AI_BATCH_WINDOW_MS > 0) -> save + ack on the
+# calling thread, which owns the DB connection. Bounded queues between
+# the stages stop downloads from running far ahead of the CNN.
+
+STOP = object()
+
+
+def run_stage(fn, source, sink, failures):
+    while True:
+        job = source.get()
+        if job is STOP:
+            return
+
+        item = job[0]
+        try:
+            sink.put((item, *fn(*job)))
+        except Exception as e:
+            print("Error:", item.get("reading_id"), e)
+            failures.append((item, e))
+            metrics.inc("iot_errors_total", component="collector_worker")
+
+
+def process_pipelined(concurrency=None, inference_threads=None, owner=WORKER_ID):
+    concurrency = concurrency or settings.COLLECTOR_CONCURRENCY
+    inference_threads = inference_threads or settings.COLLECTOR_INFERENCE_THREADS
+
+    counts = {"processed": 0, "failed": 0, "skipped": 0, "leased": 0, "poll_seconds": 0.0}
+    try:
+        data = fetch_items(counts)
+    except Exception as e:
+        metrics.inc("iot_errors_total", component="collector_worker")
+        print("Error:", e)
+        return counts
+
+    if not data:
+        print("No data")
+        get_acks().flush()
+        return counts
+
+    items = []
+    try:
+        items = select_items(data, counts, owner)
+        return run_pipeline(items, counts, concurrency, inference_threads, owner)
+    except Exception as e:
+        metrics.inc("iot_errors_total", component="collector_worker")
+        print("Error:", e)
+        counts["failed"] += 1
+        get_acks().flush()
+        return counts
+    finally:
+        release_readings([item["reading_id"] for item in items], owner)
+
+
+def run_pipeline(items, counts, concurrency, inference_threads, owner):
+    todo = queue.Queue()
+    downloaded = queue.Queue(maxsize=concurrency * 2)
+    analysed = queue.Queue(maxsize=concurrency * 2)
+    failures = []
+
+    for item in items:
+        todo.put((item,))
+    for _ in range(concurrency):
+        todo.put(STOP)
+
+    def download(item):
+        print("Processing:", item["reading_id"])
+        return (download_image(item["image_url"]),)
+
+    def analyse(item, content):
+        return content, analyse_item(item, content)
+
+    downloaders = [
+        threading.Thread(target=run_stage, args=(download, todo, downloaded, failures), daemon=True)
+        for _ in range(concurrency)
+    ]
+    analysers = [
+        threading.Thread(target=run_stage, args=(analyse, downloaded, analysed, failures), daemon=True)
+        for _ in range(inference_threads)
+    ]
+
+    def close_stages():
+        # Each stage ends once every worker of the stage before it has
+        for t in downloaders:
+            t.join()
+        for _ in analysers:
+            downloaded.put(STOP)
+        for t in analysers:
+            t.join()
+        analysed.put(STOP)
+
+    for t in downloaders + analysers:
+        t.start()
+    threading.Thread(target=close_stages, daemon=True).start()
+
+    # Leases of readings still in the stages are renewed from here while
+    # waiting, so a slow pipeline doesn't let them expire
+    unfinished = {item["reading_id"] for item in items}
+    renew_every = settings.COLLECTOR_LEASE_SECONDS / 3
+    renewed = time.monotonic()
+
+    processed = 0
+    while True:
+        try:
+            job = analysed.get(timeout=renew_every)
+        except queue.Empty:
+            job = None
+        if time.monotonic() - renewed >= renew_every:
+            renew_leases(unfinished, owner)
+            renewed = time.monotonic()
+        if job is None:
+            continue
+        if job is STOP:
+            break
+
+        item, content, result = job
+        unfinished.discard(item["reading_id"])
+        try:
+            save_item(item, content, result)
+            ack_item(item, result)
+            processed += 1
+        except Exception as e:
+            print("Error:", item["reading_id"], e)
+            failures.append((item, e))
+            metrics.inc("iot_errors_total", component="collector_worker")
+
+    # Back into the retry queue (stage threads don't touch the DB)
+    for item, error in failures:
+        fail_item(item, error, owner)
+
+    get_acks().flush()
+    return dict(counts, processed=processed, failed=len(failures))